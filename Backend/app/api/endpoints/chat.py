@@ -1,12 +1,35 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from app.models.schemas import ChatInput, ChatResponse
 from app.models.chat_schemas import ConversationItem
-from app.services import duckling_service, llm_service, reminder_service, emergency_service, health_service, auth_service, weather_service, gnews_service
-from app.services.database import get_db, ConversationHistory, User
+from app.services import admission, emergency_detector, metrics, duckling_service, llm_service, emergency_service, auth_service, weather_service, gnews_service, recurrence
+from app.services.database import get_db, User
+from app.services.chat_writer import writer as chat_writer
+from app.services.conversation_buffer import buffer as conversation_buffer
+from app.services.event_hub import hub
+from app.services.emergency_notifier import notifier
+from app.config import settings
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+ALERTA_ACTIVADA = "¡Alerta de emergencia activada! Ya he notificado a los contactos de emergencia. Mantén la calma."
+
+
+def _overloaded(e: admission.Overloaded) -> HTTPException:
+    detail = (
+        "Has enviado muchos mensajes seguidos. Espera un momento antes de volver a escribir."
+        if e.status == 429 else
+        "El asistente está muy ocupado en este momento. Inténtalo de nuevo en unos segundos."
+    )
+    return HTTPException(status_code=e.status, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat_endpoint(
     input: ChatInput, 
@@ -18,23 +41,61 @@ async def chat_endpoint(
     Analiza el mensaje, extrae fechas, clasifica la intención y genera una respuesta.
     Redirige a servicios específicos según la intención detectada.
     """
+    recibido = time.perf_counter()
+    recibido_en = datetime.utcnow()
+    plazo = time.monotonic() + settings.CHAT_DEADLINE_SECONDS
+    # Se copian los datos del usuario y se devuelve la conexión al pool: la petición no debe
+    # retenerla mientras espera a Duckling o al LLM, y los commits caducan `current_user`
+    # (recargarlo desde el bucle de eventos lo bloquearía esperando una conexión)
+    user_id, city = current_user.username, current_user.city
+    db.commit()
+    # Lo que parece una emergencia no se frena y pasa delante en la cola del LLM
+    deteccion = emergency_detector.detectar(input.message)
+    urgent = deteccion is not None
+    try:
+        admission.limiter.admit(user_id, urgent=urgent)
+    except admission.Overloaded as e:
+        raise _overloaded(e)
+
     try:
+        # 0. Vía rápida: una alerta clara se registra antes de consultar al LLM. Sus SMS esperan
+        # el veredicto (como mucho EMERGENCY_FAST_LANE_HOLD_SECONDS) para no avisar en falso
+        alerta_id = None
+        if deteccion is not None and deteccion.alerta and settings.EMERGENCY_FAST_LANE:
+            with metrics.stage("emergency_fast_lane"):
+                alerta_id = emergency_service.registrar_emergencia(
+                    db=db,
+                    user_id=user_id,
+                    tipo_emergencia="Solicitud de emergencia",
+                    mensaje_opcional=input.message,
+                    timestamp=recibido_en,
+                    hold_seconds=settings.EMERGENCY_FAST_LANE_HOLD_SECONDS,
+                ).id
+            metrics.EMERGENCY_ALERT_LATENCY.observe(time.perf_counter() - recibido, "rapida")
+            logger.info(
+                "Emergencia detectada en el chat, avisos en marcha",
+                extra={"user_id": user_id, "emergency_id": alerta_id, "senal": deteccion.senal},
+            )
+
         # 1. Extraer fechas con Duckling
-        fechas_detectadas = await duckling_service.extract_dates_with_duckling(input.message)
+        with metrics.stage("duckling"):
+            fechas_detectadas = await duckling_service.extract_dates_with_duckling(input.message)
 
         # Usar el historial persistente y optimizado
         llm_output = await llm_service.generate_response(
             input.message,
             fechas_detectadas,
             conversation_history=None,  # Se obtiene automáticamente en llm_service
-            user_id=current_user.username,
-            db=db
+            user_id=user_id,
+            db=db,
+            priority=admission.URGENT if urgent else admission.NORMAL,
+            deadline=plazo,
         )
         intencion = llm_output.get("intencion", "CONVERSACION_GENERAL")
         respuesta_llm = llm_output.get("respuesta", "Lo siento, no pude generar una respuesta.")
         emocion = llm_output.get("emocion", "Neutra") # Extraer la emoción
 
-        print(f"[DEBUG] Intención detectada por LLM: {intencion}, Emoción: {emocion}")
+        logger.debug("Intención detectada: %s", intencion, extra={"emocion": emocion})
 
         # 3. Redirigir acciones según la intención
         if intencion == "RECORDATORIO":
@@ -44,45 +105,57 @@ async def chat_endpoint(
                     from dateutil import parser
                     primera_fecha = parser.parse(primera_fecha_str)
                 except ValueError:
-                    print(f"[DEBUG] No se pudo parsear la fecha: {primera_fecha_str}")
+                    logger.warning("No se pudo interpretar la fecha de Duckling: %s", primera_fecha_str)
                     primera_fecha = None
 
                 if primera_fecha:
-                    reminder_service.add_reminder(
-                        db=db,
-                        user_id=current_user.username,
+                    await chat_writer.add_reminder(
+                        user_id,
                         text=input.message,
-                        reminder_time=primera_fecha
+                        reminder_time=primera_fecha,
+                        rrule=recurrence.detectar_recurrencia(input.message)
                     )
-                print(f"[DEBUG] Recordatorio guardado para {current_user.username} en {primera_fecha}")
+                logger.debug("Recordatorio guardado para %s en %s", user_id, primera_fecha)
             else:
-                print("[DEBUG] Intención RECORDATORIO pero sin fechas detectadas por Duckling.")
+                logger.debug("Intención RECORDATORIO sin fechas detectadas por Duckling")
                 respuesta_llm += " Para guardar un recordatorio, necesito una fecha y hora específicas."
 
         elif intencion == "EMERGENCIA":
-            emergency_service.registrar_emergencia(
-                db=db, 
-                user_id=current_user.username,
-                tipo_emergencia="Solicitud de emergencia",
-                mensaje_opcional=input.message
-            )
-            print(f"[DEBUG] Emergencia registrada para {current_user.username}")
-            respuesta_llm = "¡Alerta de emergencia activada! Ya he notificado a los contactos de emergencia. Mantén la calma."
+            if alerta_id is not None and llm_output.get("fallback"):
+                # Sin LLM (modo degradado) no hay veredicto: la alerta sigue su curso
+                await asyncio.to_thread(notifier.release, alerta_id)
+                metrics.EMERGENCY_FAST_LANE.inc("sin_verificar")
+            elif alerta_id is not None:
+                await asyncio.to_thread(notifier.verify, alerta_id, True)
+                metrics.EMERGENCY_FAST_LANE.inc("confirmada")
+            else:
+                with metrics.stage("emergency_save"):
+                    emergency_service.registrar_emergencia(
+                        db=db, 
+                        user_id=user_id,
+                        tipo_emergencia="Solicitud de emergencia",
+                        mensaje_opcional=input.message,
+                        timestamp=recibido_en,
+                    )
+                metrics.EMERGENCY_ALERT_LATENCY.observe(time.perf_counter() - recibido, "llm")
+                logger.info("Emergencia registrada desde el chat", extra={"user_id": user_id})
+            respuesta_llm = ALERTA_ACTIVADA
 
         elif intencion == "SALUD":
-            health_service.save_health_data(db=db, user_id=current_user.username, parameter="unknown", value=input.message)
-            print(f"[DEBUG] Intención SALUD detectada. Lógica de guardado de salud iría aquí.")
+            await chat_writer.add_health_record(user_id, parameter="unknown", value=input.message)
 
         # INTEGRACIÓN DE WEATHERAPI
         elif intencion == "INFORMACION":
             lower_msg = input.message.lower()
             info_extra = ""
             if any(word in lower_msg for word in ["clima", "tiempo", "temperatura", "weather"]):
-                weather_info = await llm_service.get_weather_info_from_llm(current_user.city or "Chile")
+                with metrics.stage("weather"):
+                    weather_info = await llm_service.get_weather_info_from_llm(city or "Chile")
                 if weather_info:
                     info_extra += f"\n\nInformación del clima para {weather_info['city']}, {weather_info['country']}: {weather_info['temp_c']}°C, {weather_info['condition']}"
             if any(word in lower_msg for word in ["noticia", "noticias", "news"]):
-                news_info = await llm_service.get_news_info_from_llm(input.message)
+                with metrics.stage("news"):
+                    news_info = await llm_service.get_news_info_from_llm(input.message)
                 if news_info and len(news_info) > 0:
                     info_extra += "\n\nÚltimas noticias relevantes:\n"
                     for noticia in news_info[:3]:
@@ -93,16 +166,33 @@ async def chat_endpoint(
             elif info_extra:
                 respuesta_llm += info_extra
 
-        # 4. Guardar el historial de la conversación
-        db.add(ConversationHistory(user_id=current_user.username, role="user", content=input.message))
-        db.add(ConversationHistory(user_id=current_user.username, role="assistant", content=respuesta_llm))
-        db.commit()
+        # La vía rápida saltó pero el LLM no lo ve como emergencia: se cancelan los avisos que
+        # aún no han salido. Si el LLM no pudo responder, la alerta se mantiene
+        if alerta_id is not None and intencion != "EMERGENCIA":
+            if llm_output.get("fallback"):
+                await asyncio.to_thread(notifier.release, alerta_id)
+                metrics.EMERGENCY_FAST_LANE.inc("sin_verificar")
+                respuesta_llm = ALERTA_ACTIVADA
+            else:
+                estado = await asyncio.to_thread(notifier.verify, alerta_id, False) or {}
+                metrics.EMERGENCY_FAST_LANE.inc("descartada")
+                logger.info("Alerta de la vía rápida descartada por el LLM", extra={"user_id": user_id, "emergency_id": alerta_id})
+                if any(c.get("estado") != "cancelado" for c in estado.get("contactos", {}).values()):
+                    respuesta_llm += " Por precaución, ya avisé a tus contactos de emergencia."
+
+        # 4. Guardar el historial de la conversación (se escribe en segundo plano, por lotes)
+        await chat_writer.add_turn(user_id, input.message, respuesta_llm)
+        conversation_buffer.append_turn(user_id, input.message, respuesta_llm)
+        # Para que otros dispositivos del usuario vean la conversación al momento
+        hub.publish(user_id, "chat.reply", {"mensaje": input.message, "respuesta": respuesta_llm, "emocion": emocion})
 
         # 5. Devolver la respuesta al frontend
-        return {"respuesta": respuesta_llm, "fechas_detectadas": fechas_detectadas, "emocion": emocion}
+        return {"respuesta": respuesta_llm, "fechas_detectadas": duckling_service.summarize(fechas_detectadas), "emocion": emocion}
 
+    except admission.Overloaded as e:
+        raise _overloaded(e)
     except Exception as e:
-        print(f"[❌ CHAT_ENDPOINT ERROR] {e}")
+        logger.exception("Error en el chat: %s", e)
         raise HTTPException(
             status_code=500, detail="Ocurrió un error interno en el chat."
         )
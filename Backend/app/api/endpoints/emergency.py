@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import hashlib
+import time
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
-from app.services import emergency_service, auth_service
+from app.services import emergency_service, auth_service, outbox_service, collection_versions
 from app.models.schemas import Emergency, EmergencyCreate
 from app.models.emergency_schemas import EmergencyContactCreate, EmergencyContactUpdate, EmergencyContactResponse, SMSSendRequest
 from app.services.database import get_db, User
 
 router = APIRouter()
 
+_EMERGENCY_LIST = TypeAdapter(List[Emergency])
+_CONTACT_LIST = TypeAdapter(List[EmergencyContactResponse])
+
 
 @router.post("/emergency/", response_model=Emergency)
 async def registrar_emergencia_api(
@@ -29,15 +35,17 @@ async def registrar_emergencia_api(
 
 @router.get("/emergency/", response_model=List[Emergency])
 async def obtener_emergencias_api(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
-    """Obtiene todos los registros de emergencia de un usuario autenticado."""
+    """Obtiene todos los registros de emergencia de un usuario autenticado (304 si no han cambiado)."""
+    etag, not_modified = collection_versions.check_not_modified(request, db, current_user.username, collection_versions.EMERGENCIES)
+    if not_modified:
+        return not_modified
     emergencies = emergency_service.obtener_emergencias(db, current_user.username)
-    if not emergencies:
-        # No lanzar 404 si no hay emergencias, solo devolver una lista vacía
-        return []
-    return emergencies
+    # No lanzar 404 si no hay emergencias, solo devolver una lista vacía
+    return collection_versions.versioned_response(emergencies, _EMERGENCY_LIST, current_user.username, etag)
 
 # --- Emergency Contacts Endpoints ---
 
@@ -52,12 +60,16 @@ async def create_contact(
 
 @router.get("/emergency/contacts/", response_model=List[EmergencyContactResponse])
 async def get_contacts(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
-    """Obtiene todos los contactos de emergencia del usuario autenticado."""
+    """Obtiene todos los contactos de emergencia del usuario autenticado (304 si no han cambiado)."""
+    etag, not_modified = collection_versions.check_not_modified(request, db, current_user.username, collection_versions.EMERGENCY_CONTACTS)
+    if not_modified:
+        return not_modified
     contacts = emergency_service.get_emergency_contacts(db, current_user.username)
-    return contacts
+    return collection_versions.versioned_response(contacts, _CONTACT_LIST, current_user.username, etag)
 
 @router.get("/emergency/contacts/{contact_id}", response_model=EmergencyContactResponse)
 async def get_contact_by_id(
@@ -96,16 +108,27 @@ async def delete_contact(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacto de emergencia no encontrado")
     return {"message": "Contacto eliminado exitosamente"}
 
-@router.post("/emergency/send-sms/", status_code=status.HTTP_200_OK)
+@router.post("/emergency/send-sms/", status_code=status.HTTP_202_ACCEPTED)
 async def send_emergency_sms(
     sms_request: SMSSendRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
-    """Envía un SMS de emergencia a un número específico."""
-    success = emergency_service.send_sms_via_twilio(
-        to_phone_number=sms_request.to_phone_number,
-        message_body=sms_request.message_body
+    """
+    Encola un SMS de emergencia a un número específico. El envío (con reintentos) se hace en
+    segundo plano; repetir la petición con la misma clave de idempotencia no duplica el SMS.
+    """
+    if not idempotency_key:
+        # Sin clave explícita, el mismo SMS repetido dentro del mismo minuto se considera un reintento
+        huella = f"{current_user.username}|{sms_request.to_phone_number}|{sms_request.message_body}|{int(time.time() // 60)}"
+        idempotency_key = hashlib.sha256(huella.encode()).hexdigest()
+    message = outbox_service.enqueue_message(
+        db,
+        channel="sms",
+        recipient=sms_request.to_phone_number,
+        body=sms_request.message_body,
+        idempotency_key=f"sms:{current_user.username}:{idempotency_key}",
+        reference=f"sms:{current_user.username}",
     )
-    if not success:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo enviar el SMS.")
-    return {"message": "SMS enviado exitosamente."}
\ No newline at end of file
+    return {"message": "SMS en cola para envío.", "id": message.id, "estado": message.status}
@@ -0,0 +1,91 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.config import settings
+from app.services import auth_service
+from app.services.database import SessionLocal
+from app.services.event_hub import hub, Subscription
+
+router = APIRouter()
+
+
+class EventStreamResponse(Response):
+    """
+    Respuesta Server-Sent Events conectada al hub de eventos.
+
+    Equivale a un StreamingResponse, pero sin su grupo de tareas por conexión: la propia
+    tarea de la petición envía los eventos y solo se crea una tarea ligera que espera la
+    desconexión del cliente. Con miles de conexiones inactivas la diferencia en memoria cuenta.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, user_id: str, last_event_id: str | None = None):
+        super().__init__(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # Sin cuerpo fijo: Response añadiría "content-length: 0"
+        self.raw_headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"]
+        self.user_id = user_id
+        self.last_event_id = last_event_id
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        subscription = hub.subscribe(self.user_id, self.last_event_id)
+        watcher = asyncio.ensure_future(self._wait_disconnect(receive, subscription))
+        try:
+            hello = f"retry: {settings.EVENTS_RETRY_MS}\n: conectado\n\n".encode()
+            await send({"type": "http.response.body", "body": hello, "more_body": True})
+            while frames := await subscription.next_frames():
+                await send({"type": "http.response.body", "body": b"".join(frames), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            hub.unsubscribe(subscription)
+
+    @staticmethod
+    async def _wait_disconnect(receive: Receive, subscription: Subscription) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        subscription.close()
+
+
+def _authenticate(token: str | None) -> str | None:
+    # Sesión propia y breve: con Depends(get_db) la conexión quedaría ocupada mientras dure el stream
+    db = SessionLocal()
+    try:
+        user = auth_service.get_user_from_token(db, token)
+        return user.username if user else None
+    finally:
+        db.close()
+
+
+@router.get("/stream", response_class=EventStreamResponse)
+async def event_stream(
+    request: Request,
+    token: str | None = Query(default=None, description="Token JWT (EventSource no permite enviar headers)"),
+    last_event_id: str | None = Header(default=None, alias="Last-Event-ID"),
+    last_event_id_param: str | None = Query(default=None, alias="lastEventId"),
+):
+    """
+    Stream de eventos del usuario (Server-Sent Events): cambios en recordatorios, recordatorios
+    vencidos, emergencias y su estado de aviso, registros de salud y respuestas del chat.
+    Envía un latido periódico y, al reconectar con `Last-Event-ID`, reenvía lo que se perdió.
+    """
+    authorization = request.headers.get("Authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    username = await run_in_threadpool(_authenticate, token)
+    if username is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return EventStreamResponse(username, last_event_id or last_event_id_param)
+
+
+@router.get("/stats", dependencies=[Depends(auth_service.require_admin)])
+async def event_stats():
+    """Conexiones abiertas y eventos publicados en este proceso (requiere X-Admin-Key)."""
+    return hub.stats()
@@ -1,37 +1,76 @@
-from fastapi import APIRouter, Query
-from app.services.gnews_service import GNewsService
-from app.services.weather_service import WeatherAPIService
+import asyncio
+import logging
+from fastapi import APIRouter, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from app.services import gnews_service, weather_service
+from app.services.resilience import providers_snapshot, served_fallback
 
-# Las keys se pueden cargar desde variables de entorno o archivos seguros, aquí se usan directamente para pruebas
-GNEWS_API_KEY = "1f7255a0ebcff7789b11a3e6128cf40f"
-WEATHER_API_KEY = "6de1f0c88d044f2284e143213252205"
+# Valores de respaldo usados por el resumen (antes los aplicaba el frontend con peticiones extra)
+FALLBACK_LOCATION = "Chile"
+NEWS_QUERY = "salud"
+FALLBACK_NEWS_QUERY = "noticias"
+SUMMARY_MAX_NEWS = 5
+# Mismo TTL que la caché del frontend (30 minutos); si falta algo o viene de un respaldo, un
+# minuto para no dejar la pantalla de inicio rota en clientes y proxies
+SUMMARY_CACHE_SECONDS = 30 * 60
+SUMMARY_DEGRADED_CACHE_SECONDS = 60
 
-gnews_service = GNewsService(GNEWS_API_KEY)
-weather_service = WeatherAPIService(WEATHER_API_KEY)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+def _clima_valido(result) -> bool:
+    """Comprueba que el clima tenga los campos esenciales."""
+    return bool(result and result.get("city") and result.get("temp_c") is not None)
+
+
+def _filtrar_noticias(result) -> list:
+    """Devuelve solo las noticias con título y url válidos."""
+    if not result:
+        return []
+    return [n for n in result if n.get("title") and n.get("url")]
+
+
+def _clima_con_respaldo(location: str) -> tuple[dict | None, bool]:
+    """
+    Obtiene el clima de la ubicación pedida y, si falla, el de la ubicación por defecto.
+    Devuelve también si es un respaldo (otra ubicación o la caché del proveedor caído).
+    """
+    result = weather_service.get_service().get_weather(location)
+    respaldo = served_fallback()
+    if not _clima_valido(result) and location != FALLBACK_LOCATION:
+        result = weather_service.get_service().get_weather(FALLBACK_LOCATION)
+        respaldo = True
+    return (result, respaldo) if _clima_valido(result) else (None, True)
+
+
+def _noticias_con_respaldo() -> tuple[list, bool]:
+    """Obtiene noticias de salud y, si no hay, noticias generales. Devuelve también si es un respaldo."""
+    noticias = _filtrar_noticias(gnews_service.get_service().get_news(NEWS_QUERY, max_results=SUMMARY_MAX_NEWS))
+    respaldo = served_fallback()
+    if not noticias:
+        noticias = _filtrar_noticias(gnews_service.get_service().get_news(FALLBACK_NEWS_QUERY, max_results=SUMMARY_MAX_NEWS))
+        respaldo = True
+    return noticias[:SUMMARY_MAX_NEWS], respaldo or not noticias
+
+
 @router.get("/gnews")
 def get_news(query: str = Query(..., description="Término de búsqueda de noticias")):
-    result = gnews_service.get_news(query)
     # Filtrar para asegurar que solo se devuelvan noticias con título y url válidos
-    if result:
-        filtered = [n for n in result if n.get("title") and n.get("url")]
-        if filtered:
-            return filtered
+    filtered = _filtrar_noticias(gnews_service.get_service().get_news(query))
+    if filtered:
+        return filtered
     return [{"title": "Sin noticias disponibles", "url": ""}]
 
 @router.get("/weather")
 def get_weather(location: str = Query(..., description="Ciudad o ubicación")):
-    print(f"[Weather] Solicitando clima para: {location}")
-    result = weather_service.get_weather(location)
-    print(f"[Weather] Respuesta filtrada de la API externa: {result}")
+    result = weather_service.get_service().get_weather(location)
     # Validar que existan los campos esenciales
-    if result and result.get("city") and result.get("temp_c") is not None:
-        print(f"[Weather] Devolviendo datos reales: {result}")
+    if _clima_valido(result):
         return result
     else:
-        print(f"[Weather] Fallback activado. Motivo: datos insuficientes o inválidos. Resultado: {result}")
+        logger.info("Clima sin datos válidos para %s, se devuelve el respaldo", location, extra={"result": result})
         return {
             "city": "Sin datos",
             "country": "",
@@ -39,3 +78,25 @@ def get_weather(location: str = Query(..., description="Ciudad o ubicación")):
             "condition": "",
             "icon": ""
         }
+
+@router.get("/summary")
+async def get_summary(
+    response: Response,
+    city: str = Query(FALLBACK_LOCATION, description="Ciudad del usuario"),
+):
+    """
+    Devuelve clima y noticias en una sola respuesta para la pantalla de inicio.
+    Ambas consultas se hacen en paralelo y los respaldos se aplican en el servidor.
+    """
+    (weather, clima_respaldo), (news, noticias_respaldo) = await asyncio.gather(
+        run_in_threadpool(_clima_con_respaldo, city.strip() or FALLBACK_LOCATION),
+        run_in_threadpool(_noticias_con_respaldo),
+    )
+    max_age = SUMMARY_DEGRADED_CACHE_SECONDS if clima_respaldo or noticias_respaldo else SUMMARY_CACHE_SECONDS
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return {"weather": weather, "news": news}
+
+@router.get("/providers")
+def get_providers_status():
+    """Estado del circuit breaker, contadores e histograma de latencias de cada proveedor externo."""
+    return providers_snapshot()
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
-from app.services import health_service, auth_service
+from app.services import health_service, auth_service, collection_versions
 from app.models.schemas import HealthRecord, HealthRecordCreate, HealthRecordUpdate
 from app.services.database import get_db, User
 
 router = APIRouter()
 
+_HEALTH_LIST = TypeAdapter(List[HealthRecord])
+
 @router.get("/health/status")
 def get_health_status():
     """Verifica el estado de la API."""
@@ -24,16 +27,25 @@ def save_health_record_api(record: HealthRecordCreate, db: Session = Depends(get
     )
 
 
+@router.get("/health/etags", dependencies=[Depends(auth_service.require_admin)])
+def get_conditional_stats():
+    """Respuestas 304 de los listados y lo que se han ahorrado (bytes y consultas; requiere X-Admin-Key)."""
+    return collection_versions.stats.snapshot()
+
+
 @router.get("/health/", response_model=List[HealthRecord])
-def get_health_records_api(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
-    """Obtiene todos los registros de salud de un usuario."""
+def get_health_records_api(request: Request, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """Obtiene todos los registros de salud de un usuario (304 si no han cambiado)."""
+    etag, not_modified = collection_versions.check_not_modified(request, db, current_user.username, collection_versions.HEALTH)
+    if not_modified:
+        return not_modified
     records = health_service.get_health_data(db, current_user.username)
     if not records:
         raise HTTPException(
             status_code=404,
             detail="No se encontraron registros de salud para este usuario.",
         )
-    return records
+    return collection_versions.versioned_response(records, _HEALTH_LIST, current_user.username, etag)
 
 @router.put("/health/{record_id}", response_model=HealthRecord)
 def update_health_record_api(record_id: int, record: HealthRecordUpdate, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
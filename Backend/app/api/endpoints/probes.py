@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from app.services.readiness import checker
+from app.services.serialization import FastJSONResponse
+
+router = APIRouter()
+
+
+@router.get("/livez", include_in_schema=False)
+async def liveness():
+    """El proceso está vivo y el bucle de eventos responde."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readiness():
+    """Lista para recibir tráfico: arranque terminado y base de datos accesible (503 si no)."""
+    available, body = await checker.status()
+    return FastJSONResponse(body, status_code=200 if available else 503)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from app.services import profiler
+
+router = APIRouter()
+
+
+def _check_admin(x_profile: str | None) -> None:
+    if not profiler.verify(x_profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Firma de administrador no válida.")
+
+
+@router.get("/")
+async def list_profiles(x_profile: str | None = Header(default=None)):
+    """Perfiles guardados, del más reciente al más antiguo."""
+    _check_admin(x_profile)
+    return await run_in_threadpool(profiler.list_profiles)
+
+
+@router.get("/{request_id}")
+async def get_profile(request_id: str, x_profile: str | None = Header(default=None)):
+    """Perfil de una petición en formato folded (flamegraph.pl, speedscope)."""
+    _check_admin(x_profile)
+    folded = await run_in_threadpool(profiler.load_folded, request_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado.")
+    return Response(content=folded, media_type="text/plain; charset=utf-8")
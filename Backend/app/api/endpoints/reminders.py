@@ -1,44 +1,101 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
-from app.services import reminder_service, auth_service
-from app.models.schemas import Reminder, ReminderCreate, ReminderUpdate
+from typing import List, Optional
+from datetime import datetime, timedelta
+from app.services import reminder_service, auth_service, collection_versions
+from app.models.schemas import Reminder, ReminderCreate, ReminderUpdate, ReminderOccurrenceUpdate
 from app.services.database import get_db, User
 
 router = APIRouter()
 
+# Ventana máxima de expansión de recordatorios recurrentes
+MAX_WINDOW_DAYS = 366
+DEFAULT_WINDOW_DAYS = 30
+
+_REMINDER_LIST = TypeAdapter(List[Reminder])
+
+def _parse_fecha(value: str, campo: str) -> datetime:
+    fecha = reminder_service.parse_due_at(value)
+    if fecha is None:
+        raise HTTPException(status_code=422, detail=f"Fecha inválida en '{campo}'.")
+    return fecha
+
 @router.post("/reminders/", response_model=Reminder)
 def create_reminder_api(reminder: ReminderCreate, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """Crea un nuevo recordatorio."""
-    return reminder_service.add_reminder(
-        db=db, user_id=current_user.username, text=reminder.text, reminder_time=reminder.datetime
-    )
+    try:
+        return reminder_service.add_reminder(
+            db=db, user_id=current_user.username, text=reminder.text, reminder_time=reminder.datetime, rrule=reminder.rrule
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Regla de recurrencia inválida: {e}")
 
 @router.get("/reminders/", response_model=List[Reminder])
-def get_reminders_api(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
-    """Obtiene todos los recordatorios de un usuario."""
-    reminders = reminder_service.get_user_reminders(db=db, user_id=current_user.username)
-    # No es necesario un 404, una lista vacía es una respuesta válida.
-    return reminders
+def get_reminders_api(
+    request: Request,
+    desde: Optional[str] = Query(None, description="Inicio de la ventana (expande las ocurrencias de los recurrentes)"),
+    hasta: Optional[str] = Query(None, description="Fin de la ventana"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Obtiene los recordatorios de un usuario; con `desde`/`hasta` devuelve las ocurrencias de esa ventana.
+    Responde 304 si el `If-None-Match` coincide con la versión actual de sus recordatorios.
+    """
+    if desde is None and hasta is None:
+        etag, not_modified = collection_versions.check_not_modified(request, db, current_user.username, collection_versions.REMINDERS)
+        if not_modified:
+            return not_modified
+        reminders = reminder_service.get_user_reminders(db=db, user_id=current_user.username)
+        # No es necesario un 404, una lista vacía es una respuesta válida.
+        return collection_versions.versioned_response(reminders, _REMINDER_LIST, current_user.username, etag)
+
+    # Sin `desde`, la ventana empieza en el minuto actual (así el ETag se mantiene durante ese minuto)
+    inicio = _parse_fecha(desde, "desde") if desde else datetime.utcnow().replace(second=0, microsecond=0)
+    fin = _parse_fecha(hasta, "hasta") if hasta else inicio + timedelta(days=DEFAULT_WINDOW_DAYS)
+    if fin < inicio or fin - inicio > timedelta(days=MAX_WINDOW_DAYS):
+        raise HTTPException(status_code=422, detail=f"La ventana debe ser positiva y de como máximo {MAX_WINDOW_DAYS} días.")
+    etag, not_modified = collection_versions.check_not_modified(
+        request, db, current_user.username, collection_versions.REMINDERS,
+        variant=f"{inicio.isoformat()}|{fin.isoformat()}",
+        queries=2,  # recordatorios + estados de las ocurrencias
+    )
+    if not_modified:
+        return not_modified
+    occurrences = reminder_service.get_user_reminders(db=db, user_id=current_user.username, desde=inicio, hasta=fin)
+    return collection_versions.versioned_response(occurrences, _REMINDER_LIST, current_user.username, etag)
 
 @router.put("/reminders/{reminder_id}", response_model=Reminder)
 def update_reminder_api(reminder_id: int, reminder_update: ReminderUpdate, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """Actualiza un recordatorio existente."""
-    updated_reminder = reminder_service.update_reminder(
-        db=db, 
-        user_id=current_user.username,
-        reminder_id=reminder_id, 
-        text=reminder_update.text, 
-        reminder_time=reminder_update.datetime
-    )
+    try:
+        updated_reminder = reminder_service.update_reminder(
+            db=db, 
+            user_id=current_user.username,
+            reminder_id=reminder_id, 
+            text=reminder_update.text, 
+            reminder_time=reminder_update.datetime,
+            rrule=reminder_update.rrule
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Regla de recurrencia inválida: {e}")
     if not updated_reminder:
         raise HTTPException(status_code=404, detail="Recordatorio no encontrado.")
     return updated_reminder
 
+@router.put("/reminders/{reminder_id}/occurrences", status_code=204)
+def update_occurrence_api(reminder_id: int, occurrence: ReminderOccurrenceUpdate, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """Marca una ocurrencia de un recordatorio recurrente como completada, omitida o pendiente."""
+    fecha = _parse_fecha(occurrence.occurrence, "occurrence")
+    if not reminder_service.set_occurrence_status(db, current_user.username, reminder_id, fecha, occurrence.status):
+        raise HTTPException(status_code=404, detail="Ocurrencia no encontrada.")
+    return
+
 @router.delete("/reminders/{reminder_id}", status_code=204)
 def delete_reminder_api(reminder_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """Elimina un recordatorio."""
     success = reminder_service.delete_reminder(db=db, user_id=current_user.username, reminder_id=reminder_id)
     if not success:
         raise HTTPException(status_code=404, detail="Recordatorio no encontrado.")
-    return
\ No newline at end of file
+    return
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.services import auth_service, sync_service
+from app.models.sync_schemas import SyncResponse
+from app.services.database import get_db, User
+
+router = APIRouter()
+
+
+@router.get("/sync", response_model=SyncResponse)
+def sync_api(
+    cursor: str | None = Query(default=None, description="Cursor devuelto por la sincronización anterior"),
+    limit: int = Query(default=settings.SYNC_PAGE_SIZE, ge=1, le=settings.SYNC_PAGE_SIZE * 4),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Sincronización incremental: recordatorios, registros de salud, contactos y emergencias
+    creados, modificados o borrados desde `cursor`. Sin cursor (o si el cursor es más antiguo
+    que la retención de borrados) devuelve todo con `reset: true`.
+    """
+    try:
+        changes = sync_service.get_changes(db, current_user.username, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return SyncResponse.model_validate(changes, from_attributes=True)
@@ -0,0 +1,46 @@
+from datetime import date
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from sqlalchemy.orm import Session
+from app.services import auth_service, usage_service
+from app.services.usage_service import accountant
+from app.models.usage_schemas import UsageReport
+from app.services.database import get_db, User
+
+router = APIRouter()
+
+
+async def _report(db: Session, group_by: str, user_id: str | None, since: date | None, until: date | None) -> UsageReport:
+    columns = [name.strip() for name in group_by.split(",") if name.strip()]
+    # Lo aún no volcado también cuenta
+    await accountant.flush()
+    try:
+        rows = usage_service.get_usage(db, columns, user_id=user_id, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return UsageReport(group_by=columns, since=since, until=until, rows=rows)
+
+
+@router.get("/me", response_model=UsageReport, response_model_exclude_none=True)
+async def my_usage(
+    group_by: str = Query(default="day,intent", description="Columnas separadas por comas: intent, day, model"),
+    since: date | None = Query(default=None),
+    until: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """Consumo del LLM del usuario autenticado."""
+    if "user" in group_by.split(","):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No se puede agrupar por: user")
+    return await _report(db, group_by, current_user.username, since, until)
+
+
+@router.get("/", response_model=UsageReport, response_model_exclude_none=True, dependencies=[Depends(auth_service.require_admin)])
+async def usage_report(
+    group_by: str = Query(default="user", description="Columnas separadas por comas: user, intent, day, model"),
+    user_id: str | None = Query(default=None),
+    since: date | None = Query(default=None),
+    until: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """Consumo del LLM de todos los usuarios (requiere X-Admin-Key)."""
+    return await _report(db, group_by, user_id, since, until)
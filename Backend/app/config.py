@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -16,4 +17,151 @@ class Settings:
     TWILIO_AUTH_TOKEN: str = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_PHONE_NUMBER: str = os.getenv("TWILIO_PHONE_NUMBER")
 
+    # URLs base de los proveedores externos (se pueden apuntar a scripts/fake_services.py)
+    OPENAI_BASE_URL: str | None = os.getenv("OPENAI_BASE_URL") or None
+    DUCKLING_BASE_URL: str = os.getenv("DUCKLING_BASE_URL", "http://localhost:8001")
+    WEATHER_API_URL: str = os.getenv("WEATHER_API_URL", "https://api.weatherapi.com/v1")
+    GNEWS_API_URL: str = os.getenv("GNEWS_API_URL", "https://gnews.io/api/v4")
+    TWILIO_API_URL: str | None = os.getenv("TWILIO_API_URL") or None
+    WEATHER_API_KEY: str = os.getenv("WEATHER_API_KEY", "6de1f0c88d044f2284e143213252205")
+    GNEWS_API_KEY: str = os.getenv("GNEWS_API_KEY", "1f7255a0ebcff7789b11a3e6128cf40f")
+
+    # Proveedores externos: plazo máximo por llamada (segundos) y circuit breaker
+    WEATHER_TIMEOUT: float = float(os.getenv("WEATHER_TIMEOUT", "3"))
+    GNEWS_TIMEOUT: float = float(os.getenv("GNEWS_TIMEOUT", "3"))
+    DUCKLING_TIMEOUT: float = float(os.getenv("DUCKLING_TIMEOUT", "1.5"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+    # Planificador de recordatorios
+    DEFAULT_TIMEZONE: str = os.getenv("DEFAULT_TIMEZONE", "America/Santiago")
+    REMINDER_SCHEDULER_ENABLED: bool = os.getenv("REMINDER_SCHEDULER_ENABLED", "true").lower() == "true"
+    REMINDER_WINDOW_MINUTES: int = int(os.getenv("REMINDER_WINDOW_MINUTES", "60"))
+    REMINDER_MAX_LATE_MINUTES: int = int(os.getenv("REMINDER_MAX_LATE_MINUTES", "1440"))
+
+    # Notificación de emergencias por SMS, y vía rápida del chat: una alerta clara se registra
+    # sin esperar al LLM y sus SMS salen cuando el LLM la confirma o, como mucho, pasados
+    # EMERGENCY_FAST_LANE_HOLD_SECONDS (si la descarta antes, no sale ninguno)
+    EMERGENCY_SMS_TIMEOUT: float = float(os.getenv("EMERGENCY_SMS_TIMEOUT", "10"))
+    EMERGENCY_FAST_LANE: bool = os.getenv("EMERGENCY_FAST_LANE", "true").lower() == "true"
+    EMERGENCY_FAST_LANE_HOLD_SECONDS: float = float(os.getenv("EMERGENCY_FAST_LANE_HOLD_SECONDS", "4"))
+
+    # Bandeja de salida (outbox) de mensajes
+    OUTBOX_CONCURRENCY: int = int(os.getenv("OUTBOX_CONCURRENCY", "20"))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    OUTBOX_BACKOFF_BASE_SECONDS: float = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+    OUTBOX_BACKOFF_MAX_SECONDS: float = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "300"))
+    OUTBOX_LEASE_SECONDS: float = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+    OUTBOX_POLL_SECONDS: float = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+    SMS_RATE_PER_SECOND: float = float(os.getenv("SMS_RATE_PER_SECOND", "10"))
+    SMS_RATE_BURST: int = int(os.getenv("SMS_RATE_BURST", "20"))
+
+    # Stream de eventos en tiempo real (SSE)
+    EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    EVENTS_HISTORY_SIZE: int = int(os.getenv("EVENTS_HISTORY_SIZE", "100"))
+    EVENTS_HISTORY_USERS: int = int(os.getenv("EVENTS_HISTORY_USERS", "10000"))
+    EVENTS_MAX_PENDING: int = int(os.getenv("EVENTS_MAX_PENDING", "256"))
+    EVENTS_RETRY_MS: int = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+
+    # Sincronización incremental (GET /sync)
+    SYNC_PAGE_SIZE: int = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+    SYNC_SAFETY_SECONDS: float = float(os.getenv("SYNC_SAFETY_SECONDS", "2"))
+    SYNC_TOMBSTONE_DAYS: int = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+
+    # Métricas Prometheus (GET /metrics)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Logging: nivel global, niveles por módulo ("app.services.gnews_service=WARNING,..."),
+    # formato (json o text), recorte de campos largos y fracción de volcados de datos emitidos
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_MAX_FIELD_CHARS: int = int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Perfilado bajo demanda: secreto para firmar la cabecera X-Profile y fracción muestreada
+    PROFILING_SECRET: str | None = os.getenv("PROFILING_SECRET") or None
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "asistente-perfiles"))
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", "200"))
+
+    # Contabilidad del consumo del LLM: cada cuánto se vuelca a la base de datos y con cuántas
+    # combinaciones (día, usuario, intención, modelo) pendientes se vuelca antes
+    USAGE_FLUSH_SECONDS: float = float(os.getenv("USAGE_FLUSH_SECONDS", "30"))
+    USAGE_FLUSH_MAX_KEYS: int = int(os.getenv("USAGE_FLUSH_MAX_KEYS", "1000"))
+
+    # Arranque: preparar el esquema al arrancar (en producción lo hace `python -m app.migrate`),
+    # conexiones de la base de datos que se abren antes de declararse lista, y comprobaciones
+    # de /readyz (plazo por dependencia y segundos que se reutiliza el resultado)
+    MIGRATE_ON_STARTUP: bool = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+    DB_PREWARM_CONNECTIONS: int = int(os.getenv("DB_PREWARM_CONNECTIONS", "5"))
+    READINESS_TIMEOUT: float = float(os.getenv("READINESS_TIMEOUT", "2"))
+    READINESS_CACHE_SECONDS: float = float(os.getenv("READINESS_CACHE_SECONDS", "10"))
+
+    # Caché compartida: backend (memory, redis o near), prefijo de las claves, tamaño de la
+    # caché en memoria, vida de la copia local en modo near y conexión con Redis
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory").lower()
+    CACHE_PREFIX: str = os.getenv("CACHE_PREFIX", "asistente")
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_NEAR_TTL_SECONDS: float = float(os.getenv("CACHE_NEAR_TTL_SECONDS", "5"))
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_TIMEOUT: float = float(os.getenv("REDIS_TIMEOUT", "0.25"))
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+
+    # Admisión del chat: ritmo por usuario (mensajes por minuto y ráfaga) y global (por segundo),
+    # usuarios recordados, y llamadas al LLM a la vez, en cola y segundos máximos de espera.
+    # Un ritmo 0 desactiva ese límite
+    CHAT_USER_RATE_PER_MINUTE: float = float(os.getenv("CHAT_USER_RATE_PER_MINUTE", "20"))
+    CHAT_USER_BURST: float = float(os.getenv("CHAT_USER_BURST", "5"))
+    CHAT_GLOBAL_RATE_PER_SECOND: float = float(os.getenv("CHAT_GLOBAL_RATE_PER_SECOND", "50"))
+    CHAT_GLOBAL_BURST: float = float(os.getenv("CHAT_GLOBAL_BURST", "100"))
+    CHAT_RATE_MAX_USERS: int = int(os.getenv("CHAT_RATE_MAX_USERS", "10000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_QUEUE_SIZE: int = int(os.getenv("LLM_QUEUE_SIZE", "100"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+
+    # Plazo en segundos de cada mensaje del chat para tener la respuesta del LLM, contando la
+    # espera en la cola; si se agota, responde el modo degradado (reglas locales, sin LLM)
+    CHAT_DEADLINE_SECONDS: float = float(os.getenv("CHAT_DEADLINE_SECONDS", "20"))
+
+    # Escrituras diferidas del chat (historial, y salud y recordatorios detectados en el chat):
+    # activadas, operaciones por lote y milisegundos máximos antes de volcar lo encolado
+    CHAT_WRITE_BEHIND: bool = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"
+    CHAT_WRITE_BATCH_SIZE: int = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+    CHAT_WRITE_FLUSH_MS: float = float(os.getenv("CHAT_WRITE_FLUSH_MS", "100"))
+
+    # Conversación reciente de cada usuario en memoria: límite de memoria (0 la desactiva) y
+    # segundos sin actividad tras los que se olvida un usuario
+    CONVERSATION_BUFFER_MAX_MB: float = float(os.getenv("CONVERSATION_BUFFER_MAX_MB", "64"))
+    CONVERSATION_BUFFER_IDLE_SECONDS: float = float(os.getenv("CONVERSATION_BUFFER_IDLE_SECONDS", "1800"))
+
+    # Datos del usuario en el prompt del LLM: próximos recordatorios y parámetros de salud que
+    # se incluyen, usuarios en memoria y segundos que vale cada resumen
+    CONTEXT_REMINDERS: int = int(os.getenv("CONTEXT_REMINDERS", "5"))
+    CONTEXT_HEALTH_PARAMETERS: int = int(os.getenv("CONTEXT_HEALTH_PARAMETERS", "8"))
+    CONTEXT_SNAPSHOT_MAX_USERS: int = int(os.getenv("CONTEXT_SNAPSHOT_MAX_USERS", "10000"))
+    CONTEXT_SNAPSHOT_TTL_SECONDS: float = float(os.getenv("CONTEXT_SNAPSHOT_TTL_SECONDS", "300"))
+
+    # Enrutado del LLM: fichero JSON con las rutas (vacío: las de app/services/llm_router.py) y
+    # modelo local compatible con la API de OpenAI (Ollama, llama.cpp...) que se prueba como
+    # último recurso si falla la cadena de la ruta, con su propio plazo en segundos
+    LLM_ROUTES_FILE: str | None = os.getenv("LLM_ROUTES_FILE") or None
+    LLM_LOCAL_BASE_URL: str | None = os.getenv("LLM_LOCAL_BASE_URL") or None
+    LLM_LOCAL_MODEL: str = os.getenv("LLM_LOCAL_MODEL", "llama3.1:8b")
+    LLM_LOCAL_API_KEY: str = os.getenv("LLM_LOCAL_API_KEY", "local")
+    LLM_LOCAL_TIMEOUT: float = float(os.getenv("LLM_LOCAL_TIMEOUT", "5"))
+
+    # Compresión gzip de las respuestas (si el cliente la acepta) a partir de cierto tamaño;
+    # nivel 1-9: más alto comprime algo más a cambio de más CPU
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1000"))
+    COMPRESSION_LEVEL: int = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+    # Clave para los endpoints de administración (cabecera X-Admin-Key); sin ella están desactivados
+    ADMIN_API_KEY: str | None = os.getenv("ADMIN_API_KEY") or None
+
 settings = Settings()
\ No newline at end of file
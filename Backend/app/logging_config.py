@@ -0,0 +1,189 @@
+"""
+Logging estructurado y sin bloqueos.
+
+Los módulos usan `logging.getLogger(__name__)`. Los registros se encolan en el hilo que
+los emite (sin formatear ni escribir) y un hilo de fondo los serializa a JSON y los escribe
+en stdout, así la E/S de consola nunca añade latencia a una petición. Si la cola se llena,
+los registros se descartan y se cuentan en vez de bloquear.
+
+Cada línea incluye el identificador de la petición (`request_id`) para correlacionar todo
+lo que ocurre en ella. Los campos largos se truncan y los volcados de datos (`payload`)
+solo se emiten en una fracción de los casos.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.services import metrics
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord: el resto son campos `extra` de la llamada
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def truncate(value, limit: int | None = None):
+    """Recorta textos (y la representación de otros objetos) a `limit` caracteres."""
+    limit = limit or settings.LOG_MAX_FIELD_CHARS
+    if not isinstance(value, (str, int, float, bool, type(None))):
+        value = repr(value)
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}… (+{len(value) - limit} caracteres)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = truncate(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo (LOG_FORMAT=text)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        extras = " ".join(f"{k}={truncate(v)}" for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        request_id = f" [{record.request_id}]" if getattr(record, "request_id", None) else ""
+        line = f"{datetime.fromtimestamp(record.created):%H:%M:%S} {record.levelname:<7} {record.name}{request_id}: {truncate(record.getMessage())}"
+        if extras:
+            line += f" {extras}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class PayloadSampler(logging.Filter):
+    """Deja pasar solo una fracción de los registros con volcado de datos (`extra={"payload": ...}`)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not hasattr(record, "payload") or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que emite (eso lo hace el hilo de fondo) y
+    descarta el registro si la cola está llena en lugar de bloquear o lanzar.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Bibliotecas que registran cada petición HTTP a nivel INFO (se pueden cambiar con LOG_LEVELS)
+_QUIET_LOGGERS = {"httpx": "WARNING", "twilio.http_client": "WARNING"}
+
+_listener: logging.handlers.QueueListener | None = None
+queue_handler: NonBlockingQueueHandler | None = None
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    """'app.services.gnews_service=WARNING,uvicorn.access=ERROR' -> {módulo: nivel}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging() -> None:
+    """Configura el logging del proceso. Es idempotente."""
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(PayloadSampler(settings.LOG_PAYLOAD_SAMPLE_RATE))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in {**_QUIET_LOGGERS, **_parse_levels(settings.LOG_LEVELS)}.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _collect_metrics() -> list[str]:
+    dropped = queue_handler.dropped if queue_handler else 0
+    return metrics.format_family("log_records_dropped_total", "counter", "Registros de log descartados por cola llena.", [("", {}, dropped)])
+
+
+metrics.registry.add_collector(_collect_metrics)
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo de escritura."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    Middleware ASGI que asigna un identificador a cada petición (o reutiliza `X-Request-ID`
+    si llega uno) y lo devuelve en la respuesta. Todo lo que se registre durante la
+    petición, incluidos los hilos del threadpool, lleva ese identificador.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,4 +1,11 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints.chat import router as chat_router
 from app.api.endpoints.reminders import router as reminders_router
@@ -6,18 +13,69 @@ from app.api.endpoints.health import router as health_router
 from app.api.endpoints.emergency import router as emergency_router
 from app.api.endpoints.auth import router as auth_router
 from app.api.endpoints.external import router as external_router
-from app.services.database import create_tables
+from app.api.endpoints.events import router as events_router
+from app.api.endpoints.sync import router as sync_router
+from app.api.endpoints.metrics import router as metrics_router
+from app.api.endpoints.profiles import router as profiles_router
+from app.api.endpoints.usage import router as usage_router
+from app.api.endpoints.probes import router as probes_router
+from app.migrate import migrate
+from app.services.reminder_scheduler import scheduler as reminder_scheduler
+from app.services import cache, duckling_service, llm_service
+from app.services.emergency_notifier import notifier as emergency_notifier
+from app.services.outbox_service import dispatcher as outbox_dispatcher
+from app.services.event_hub import hub as event_hub
+from app.services.usage_service import accountant as usage_accountant
+from app.services.chat_writer import writer as chat_writer
+from app.services.readiness import checker as readiness
+from app.services.metrics import MetricsMiddleware
+from app.services import profiler
+from app.services.serialization import FastJSONResponse, add_compression
+from app.config import settings
+from app.logging_config import configure_logging, shutdown_logging, RequestIdMiddleware
+
+# Antes del arranque: la migración y los servicios ya registran mensajes
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    configure_logging()  # por si se reinicia la app en el mismo proceso (tests, scripts)
+    if settings.MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(migrate)
+    event_hub.start()
+    if settings.REMINDER_SCHEDULER_ENABLED:
+        reminder_scheduler.start()
+    emergency_notifier.start()
+    outbox_dispatcher.start()
+    usage_accountant.start()
+    chat_writer.start()
+    readiness.timings["startup"] = time.perf_counter() - started
+    # Los pools se calientan en segundo plano; /readyz responde 503 hasta que terminen
+    readiness.start()
+    yield
+    await readiness.stop()
+    await chat_writer.stop()  # escribe lo encolado mientras el resto sigue en pie
+    await reminder_scheduler.stop()
+    await outbox_dispatcher.stop()
+    await event_hub.stop()
+    await usage_accountant.stop()  # vuelca el consumo pendiente
+    await duckling_service.close_client()
+    await llm_service.close_client()
+    await cache.close_backend()
+    shutdown_logging()
+
 
 app = FastAPI(
     title="SeniorAssist API",
     description="Asistente virtual para adultos mayores",
     version="1.0.0",
+    lifespan=lifespan,
+    # Como valor por defecto (no explícito), las rutas con response_model siguen serializando con pydantic
+    default_response_class=Default(FastJSONResponse),
 )
 
-@app.on_event("startup")
-def startup_event():
-    create_tables()
-
 # Configuración de CORS
 origins = [
     "*",  # Permitir todos los orígenes (para desarrollo)
@@ -29,11 +87,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos los métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permitir todos los encabezados
+    expose_headers=["ETag", "X-Request-ID"],  # ETag para reenviarlo en If-None-Match; X-Request-ID para reportar errores
 )
 
+# Sin secreto ni muestreo el perfilado no se instala: coste cero
+if profiler.enabled():
+    app.add_middleware(profiler.ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Por dentro de las métricas, que así cuentan también el tiempo de comprimir
+add_compression(app)
+
+# Se añade el último para quedar por fuera y medir también el resto de middlewares
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+app.include_router(probes_router, tags=["Sondas"])
 app.include_router(chat_router, prefix="/chat", tags=["Conversación"])
 app.include_router(reminders_router)
 app.include_router(health_router)
 app.include_router(emergency_router)
 app.include_router(auth_router, prefix="/auth", tags=["Autenticación"])
 app.include_router(external_router, prefix="/external", tags=["APIs Externas"])
+app.include_router(events_router, prefix="/events", tags=["Eventos en tiempo real"])
+app.include_router(sync_router, tags=["Sincronización"])
+app.include_router(usage_router, prefix="/usage", tags=["Consumo del LLM"])
+if profiler.enabled():
+    app.include_router(profiles_router, prefix="/profiles", tags=["Perfilado"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router, tags=["Métricas"])
+
+readiness.timings["import"] = time.perf_counter() - _import_started
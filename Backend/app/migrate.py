@@ -0,0 +1,32 @@
+"""
+Prepara la base de datos antes de arrancar la API: crea las tablas, columnas e índices que
+falten y rellena los campos añadidos a posteriori.
+
+En producción se ejecuta una vez por despliegue (`python -m app.migrate`, ver railway.toml)
+y la API arranca con MIGRATE_ON_STARTUP=false, sin tocar el esquema.
+"""
+import logging
+import time
+
+from app.logging_config import configure_logging, shutdown_logging
+from app.services import reminder_service, sync_service
+from app.services.database import create_tables
+
+logger = logging.getLogger(__name__)
+
+
+def migrate() -> None:
+    started = time.perf_counter()
+    create_tables()
+    reminder_service.backfill_schedule_fields()
+    sync_service.backfill_updated_at()
+    sync_service.prune_tombstones()
+    logger.info("Base de datos preparada", extra={"duration_ms": round((time.perf_counter() - started) * 1000)})
+
+
+if __name__ == "__main__":
+    configure_logging()
+    try:
+        migrate()
+    finally:
+        shutdown_logging()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from .chat_schemas import ConversationItem
 from datetime import datetime
 
@@ -8,9 +8,19 @@ class ChatInput(BaseModel):
     conversation_history: List[ConversationItem] = []
 
 
+class FechaDetectada(BaseModel):
+    """Fecha que Duckling encontró en el mensaje, sin el resto de su respuesta (alternativas, dim...)."""
+    body: str  # el texto del mensaje, ej. "mañana a las 10"
+    start: int
+    end: int
+    value: Optional[str] = None  # ISO 8601; en un intervalo, su comienzo
+    to: Optional[str] = None  # fin del intervalo, si lo es
+    grain: Optional[str] = None  # precisión: "day", "hour", "minute"...
+
+
 class ChatResponse(BaseModel):
     respuesta: str
-    fechas_detectadas: list
+    fechas_detectadas: List[FechaDetectada]
     emocion: str # Nuevo campo para la emoción detectada
 
 
@@ -21,11 +31,13 @@ class ReminderBase(BaseModel):
 
 
 class ReminderCreate(ReminderBase):
-    pass
+    rrule: Optional[str] = None # Regla de recurrencia, ej: "FREQ=DAILY" o "FREQ=WEEKLY;BYDAY=MO,TH"
 
 
 class Reminder(ReminderBase):
     id: int
+    rrule: Optional[str] = None
+    status: Optional[str] = None # Solo en consultas por ventana: 'pendiente', 'completada' u 'omitida'
 
     class Config:
         from_attributes = True
@@ -34,6 +46,12 @@ class Reminder(ReminderBase):
 class ReminderUpdate(BaseModel):
     text: Optional[str] = None
     datetime: Optional[str] = None
+    rrule: Optional[str] = None # "" elimina la recurrencia
+
+
+class ReminderOccurrenceUpdate(BaseModel):
+    occurrence: str # Fecha de la ocurrencia, en el mismo formato que `datetime`
+    status: Literal["completada", "omitida", "pendiente"]
 
 
 # Esquemas para Salud (Health)
@@ -73,6 +91,7 @@ class EmergencyCreate(EmergencyBase):
 class Emergency(EmergencyBase):
     id: int
     timestamp: datetime
+    notification_status: Optional[dict] = None
 
     class Config:
         from_attributes = True
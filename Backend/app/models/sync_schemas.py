@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from typing import List
+from .schemas import Reminder, HealthRecord, Emergency
+from .emergency_schemas import EmergencyContactResponse
+
+
+class ReminderChanges(BaseModel):
+    upserts: List[Reminder] = []
+    deleted: List[int] = []
+
+
+class HealthRecordChanges(BaseModel):
+    upserts: List[HealthRecord] = []
+    deleted: List[int] = []
+
+
+class EmergencyContactChanges(BaseModel):
+    upserts: List[EmergencyContactResponse] = []
+    deleted: List[int] = []
+
+
+class EmergencyChanges(BaseModel):
+    upserts: List[Emergency] = []
+    deleted: List[int] = []
+
+
+class SyncResponse(BaseModel):
+    reset: bool # True: el cliente debe reemplazar todos sus datos locales por esta respuesta
+    has_more: bool # True: quedan cambios, volver a llamar con `cursor`
+    cursor: str
+    reminders: ReminderChanges
+    health: HealthRecordChanges
+    emergency_contacts: EmergencyContactChanges
+    emergencies: EmergencyChanges
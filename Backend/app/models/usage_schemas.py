@@ -0,0 +1,27 @@
+from datetime import date
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class UsageRow(BaseModel):
+    # Solo vienen informadas las columnas por las que se agrupó
+    user: Optional[str] = None
+    intent: Optional[str] = None
+    day: Optional[date] = None
+    model: Optional[str] = None
+    requests: int
+    cache_hits: int
+    errors: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int # parte de prompt_tokens servida desde la caché de prompts de OpenAI
+    total_tokens: int
+    avg_latency_ms: float # media de las llamadas que no salieron de la caché
+    max_latency_ms: float
+
+
+class UsageReport(BaseModel):
+    group_by: List[str]
+    since: Optional[date] = None
+    until: Optional[date] = None
+    rows: List[UsageRow]
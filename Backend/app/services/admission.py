@@ -0,0 +1,175 @@
+"""
+Control de admisión del chat.
+
+Dos barreras delante de `chat_endpoint`:
+
+1. Límite de ritmo (token bucket) por usuario y global. Un usuario que se pasa recibe 429;
+   si se pasa el conjunto de usuarios, 503. Ambos con Retry-After.
+2. Cola con prioridad para las llamadas al LLM: como mucho LLM_MAX_CONCURRENCY a la vez y
+   LLM_QUEUE_SIZE esperando. Los mensajes que parecen una emergencia (`emergency_detector`)
+   pasan delante de los demás y no se rechazan por cola llena ni por límite de ritmo. Si la
+   cola está llena o la espera supera LLM_QUEUE_TIMEOUT, 503 con Retry-After.
+
+Los límites son por proceso: con varios workers, el límite efectivo es el configurado por
+el número de workers.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.services import metrics
+from app.services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Prioridades de la cola del LLM (menor = antes)
+URGENT = 0
+NORMAL = 1
+PRIORITY_NAMES = {URGENT: "urgent", NORMAL: "normal"}
+
+ADMISSION_REJECTIONS = metrics.Counter("chat_admission_rejections_total", "Mensajes del chat rechazados por sobrecarga.", ("reason",))
+LLM_QUEUE_WAIT = metrics.Histogram(
+    "llm_queue_wait_seconds", "Espera en la cola del LLM por prioridad.", ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class Overloaded(Exception):
+    """Petición rechazada; `status` es 429 (el usuario se pasa) o 503 (el servicio está saturado)."""
+
+    def __init__(self, reason: str, status: int, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimiter:
+    """Token bucket por usuario (los `max_users` más recientes) más uno global."""
+
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float, max_users: int):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self.global_bucket = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+                # Olvidar a un usuario inactivo le devuelve el cubo lleno, que es lo que tendría igualmente
+                while len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_id)
+            return bucket
+
+    def admit(self, user_id: str, urgent: bool = False) -> None:
+        """Consume un token del usuario y uno global, o lanza Overloaded. Lo urgente siempre pasa."""
+        if self.user_rate > 0:
+            granted, wait = self._bucket(user_id).try_acquire()
+            if not granted and not urgent:
+                ADMISSION_REJECTIONS.inc("user_rate")
+                raise Overloaded("user_rate", 429, wait)
+        if self.global_bucket is not None:
+            granted, wait = self.global_bucket.try_acquire()
+            if not granted and not urgent:
+                ADMISSION_REJECTIONS.inc("global_rate")
+                raise Overloaded("global_rate", 503, wait)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class PriorityGate:
+    """
+    Semáforo con cola de prioridad: `limit` llamadas a la vez y hasta `max_waiting` en espera,
+    atendidas por prioridad y, dentro de la misma, por orden de llegada.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.inflight = 0
+        self._waiting: list[list] = []  # [prioridad, orden, futuro]
+        self._order = itertools.count()
+        # Media móvil de lo que dura una llamada, para estimar el Retry-After
+        self._avg_hold = 1.0
+
+    def depth(self, priority: int | None = None) -> int:
+        return sum(1 for p, _, _ in self._waiting if priority is None or p == priority)
+
+    def retry_after(self) -> float:
+        return (len(self._waiting) + 1) * self._avg_hold / self.limit
+
+    async def acquire(self, priority: int = NORMAL) -> None:
+        if self.inflight < self.limit and not self._waiting:
+            self.inflight += 1
+            LLM_QUEUE_WAIT.observe(0.0, PRIORITY_NAMES[priority])
+            return
+        if priority != URGENT and len(self._waiting) >= self.max_waiting:
+            ADMISSION_REJECTIONS.inc("queue_full")
+            raise Overloaded("queue_full", 503, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiting, entry)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.timeout if priority != URGENT else None)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self.release()  # el turno llegó justo a la vez que el plazo o la cancelación
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTIONS.inc("queue_timeout")
+                raise Overloaded("queue_timeout", 503, self.retry_after()) from None
+            raise
+        finally:
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started, PRIORITY_NAMES[priority])
+
+    def release(self, held: float | None = None) -> None:
+        if held is not None:
+            self._avg_hold += (held - self._avg_hold) * 0.1
+        # El turno pasa directamente al siguiente en espera, sin liberar la plaza
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+
+limiter = RateLimiter(
+    user_rate=settings.CHAT_USER_RATE_PER_MINUTE / 60,
+    user_burst=settings.CHAT_USER_BURST,
+    global_rate=settings.CHAT_GLOBAL_RATE_PER_SECOND,
+    global_burst=settings.CHAT_GLOBAL_BURST,
+    max_users=settings.CHAT_RATE_MAX_USERS,
+)
+llm_gate = PriorityGate(settings.LLM_MAX_CONCURRENCY, settings.LLM_QUEUE_SIZE, settings.LLM_QUEUE_TIMEOUT)
+
+
+def _collect_metrics() -> list[str]:
+    return metrics.format_family(
+        "llm_queue_depth", "gauge", "Llamadas al LLM esperando turno por prioridad.",
+        [("", {"priority": name}, llm_gate.depth(priority)) for priority, name in PRIORITY_NAMES.items()],
+    ) + metrics.format_family(
+        "llm_inflight", "gauge", "Llamadas al LLM en curso.", [("", {}, llm_gate.inflight)],
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
@@ -0,0 +1,352 @@
+"""
+Caché compartida entre workers y réplicas.
+
+`Cache` es un espacio de nombres con versión sobre un backend intercambiable (CACHE_BACKEND):
+
+- `memory`: en la memoria del proceso (LRU con caducidad). Cada worker tiene la suya.
+- `redis`: un servidor con protocolo Redis (REDIS_URL) compartido por todos los workers.
+- `near`: dos niveles, una copia local de vida corta (CACHE_NEAR_TTL_SECONDS) delante de
+  Redis. Ahorra el viaje de red en las claves más usadas a cambio de que un cambio tarde
+  hasta ese tiempo en verse en los demás workers.
+
+Los valores se guardan como JSON compacto, comprimido con zlib por encima de 1 KB, y las
+claves son un resumen (blake2b) de la clave lógica, así una clave larga (el historial de
+la conversación) no viaja entera. Cada clave lleva la versión del espacio de nombres: subir
+`version` en el código (cambia el formato de los valores) o llamar a `invalidate()` (cambia
+la generación, compartida por todos los workers) deja inaccesibles las entradas anteriores,
+que caducan solas.
+
+Si Redis falla o tarda, la caché responde como un fallo de caché y no guarda: nunca rompe
+la petición. Las llamadas pasan por un circuit breaker (proveedor "redis").
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import ssl
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import unquote, urlsplit
+
+from app.config import settings
+from app.services import metrics
+from app.services.resilience import get_provider
+
+logger = logging.getLogger(__name__)
+
+# Por encima de este tamaño los valores se comprimen
+COMPRESS_MIN_BYTES = 1024
+
+
+def encode(value: Any) -> bytes:
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+    if len(data) > COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data, 1)
+    return b"j" + data
+
+
+def decode(raw: bytes) -> Any:
+    data = zlib.decompress(raw[1:]) if raw[:1] == b"z" else raw[1:]
+    return json.loads(data)
+
+
+# --- Backends ---
+
+class MemoryBackend:
+    """LRU en memoria con caducidad por entrada."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: bytes, ttl: float | None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def incr(self, key: str) -> int | None:
+        with self._lock:
+            current = int(self._entries.get(key, (None, b"0"))[1]) + 1
+            self._entries[key] = (None, str(current).encode())
+            return current
+
+    async def ping(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisError(Exception):
+    pass
+
+
+class _RedisConnection:
+    """Una conexión con un servidor Redis (protocolo RESP2)."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def execute(self, *args) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts += [b"$%d\r\n" % len(data), data, b"\r\n"]
+        self.writer.write(b"".join(parts))
+        await self.writer.drain()
+        return await self._read()
+
+    async def _read(self) -> Any:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Conexión cerrada por el servidor")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [await self._read() for _ in range(length)]
+        raise RedisError(f"Respuesta no válida: {line[:20]!r}")
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RedisBackend:
+    """Cliente asíncrono mínimo de Redis con un pool de conexiones."""
+
+    def __init__(self, url: str, timeout: float, max_connections: int):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.ssl = parts.scheme == "rediss"
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.provider = get_provider("redis", timeout=timeout)
+        self._idle: list[_RedisConnection] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    async def _connect(self) -> _RedisConnection:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context() if self.ssl else None
+        )
+        connection = _RedisConnection(reader, writer)
+        if self.password:
+            await connection.execute("AUTH", self.password)
+        if self.db:
+            await connection.execute("SELECT", self.db)
+        return connection
+
+    async def execute(self, *args) -> Any:
+        """Ejecuta un comando; lanza si Redis falla o no responde a tiempo."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                result = await asyncio.wait_for(connection.execute(*args), self.timeout)
+            except BaseException:
+                # A medio comando la conexión queda en un estado desconocido: se descarta
+                if connection is not None:
+                    connection.close()
+                raise
+            self._idle.append(connection)
+            return result
+
+    async def _call(self, *args) -> Any:
+        return await self.provider.acall(self.execute, *args, fallback=None)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._call("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        if ttl:
+            await self._call("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            await self._call("SET", key, value)
+
+    async def delete(self, key: str) -> None:
+        await self._call("DEL", key)
+
+    async def incr(self, key: str) -> int | None:
+        return await self._call("INCR", key)
+
+    async def ping(self) -> None:
+        await self.execute("PING")
+
+    async def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+        self._slots = None
+
+
+class NearCacheBackend:
+    """Copia local de vida corta delante de un backend remoto."""
+
+    def __init__(self, remote: RedisBackend, local: MemoryBackend, local_ttl: float):
+        self.remote = remote
+        self.local = local
+        self.local_ttl = local_ttl
+        self.local_hits = 0
+        self.remote_hits = 0
+
+    async def get(self, key: str) -> bytes | None:
+        value = await self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        value = await self.remote.get(key)
+        if value is not None:
+            self.remote_hits += 1
+            await self.local.set(key, value, self.local_ttl)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        await self.local.set(key, value, min(ttl, self.local_ttl) if ttl else self.local_ttl)
+        await self.remote.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.local.delete(key)
+        await self.remote.delete(key)
+
+    async def incr(self, key: str) -> int | None:
+        return await self.remote.incr(key)
+
+    async def ping(self) -> None:
+        await self.remote.ping()
+
+    async def close(self) -> None:
+        await self.remote.close()
+
+
+def create_backend(kind: str | None = None):
+    kind = (kind or settings.CACHE_BACKEND).lower()
+    if kind == "memory":
+        return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+    redis = RedisBackend(settings.REDIS_URL, settings.REDIS_TIMEOUT, settings.REDIS_MAX_CONNECTIONS)
+    if kind == "redis":
+        return redis
+    if kind == "near":
+        return NearCacheBackend(redis, MemoryBackend(settings.CACHE_MAX_ENTRIES), settings.CACHE_NEAR_TTL_SECONDS)
+    raise ValueError(f"CACHE_BACKEND no válido: {kind}")
+
+
+_backend = None
+
+
+def get_backend():
+    """Backend compartido por todas las cachés del proceso, creado en el primer uso."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+async def close_backend() -> None:
+    if _backend is not None:
+        await _backend.close()
+
+
+# --- Espacios de nombres ---
+
+class Cache:
+    """
+    Caché de un espacio de nombres. Las claves pueden ser cualquier valor serializable a JSON
+    (tuplas incluidas); los valores, cualquier valor JSON.
+    """
+
+    # Cada cuánto se vuelve a leer la generación compartida (ver `invalidate`)
+    GENERATION_REFRESH_SECONDS = 5.0
+
+    def __init__(self, name: str, version: int = 1, ttl: float | None = None, backend=None):
+        self.name = name
+        self.version = version
+        self.ttl = ttl
+        self._backend = backend
+        self._generation = 0
+        self._generation_read_at = float("-inf")
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else get_backend()
+
+    @property
+    def _generation_key(self) -> str:
+        return f"{settings.CACHE_PREFIX}:{self.name}:v{self.version}:generacion"
+
+    async def _key(self, key: Any) -> str:
+        if time.monotonic() - self._generation_read_at > self.GENERATION_REFRESH_SECONDS:
+            raw = await self.backend.get(self._generation_key)
+            if raw is not None:
+                self._generation = int(raw)
+            self._generation_read_at = time.monotonic()
+        digest = hashlib.blake2b(json.dumps(key, sort_keys=True, ensure_ascii=False).encode(), digest_size=16).hexdigest()
+        return f"{settings.CACHE_PREFIX}:{self.name}:v{self.version}.{self._generation}:{digest}"
+
+    async def get(self, key: Any) -> Any | None:
+        raw = await self.backend.get(await self._key(key))
+        metrics.record_cache(self.name, hit=raw is not None)
+        if raw is None:
+            return None
+        try:
+            return decode(raw)
+        except (ValueError, zlib.error) as e:
+            logger.warning("Entrada de caché ilegible en %s: %s", self.name, e)
+            return None
+
+    async def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        await self.backend.set(await self._key(key), encode(value), ttl or self.ttl)
+
+    async def delete(self, key: Any) -> None:
+        await self.backend.delete(await self._key(key))
+
+    async def invalidate(self) -> None:
+        """Deja inaccesibles todas las entradas del espacio de nombres, en todos los workers."""
+        generation = await self.backend.incr(self._generation_key)
+        if generation is not None:
+            self._generation = generation
+            self._generation_read_at = time.monotonic()
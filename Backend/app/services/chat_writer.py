@@ -0,0 +1,282 @@
+"""
+Escrituras diferidas (write-behind) de lo que deja cada turno del chat.
+
+La respuesta del chat no depende del historial, ni del registro de salud ni del
+recordatorio que crea, así que el endpoint los encola aquí y responde sin esperar a la base
+de datos. Un worker los escribe por lotes que mezclan peticiones de varios usuarios, en una
+sola transacción por lote:
+
+- cuando hay CHAT_WRITE_BATCH_SIZE operaciones pendientes,
+- como mucho CHAT_WRITE_FLUSH_MS después de encolar,
+- y al apagar (`stop`), antes que el resto de workers.
+
+Las operaciones se escriben en el orden en que se encolaron, así que el historial de un
+usuario nunca se desordena. Los avisos (SSE, planificador de recordatorios) salen después
+del commit, como en la escritura directa.
+
+Si un lote falla, se reintenta operación a operación; las de un usuario que fallen (y las
+que vengan detrás del mismo usuario) vuelven a la cola y se reintentan en el siguiente
+volcado, hasta MAX_ATTEMPTS. Con CHAT_WRITE_BEHIND=false, o sin el worker arrancado
+(scripts), se escribe en el momento.
+
+Lo que lee el historial de un usuario llama antes a `barrier(user_id)` para ver sus propios
+turnos; el resto de endpoints los ve como mucho un intervalo de volcado más tarde.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services import health_service, metrics, reminder_service
+from app.services.database import ConversationHistory, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TURN = "turn"
+HEALTH = "health"
+REMINDER = "reminder"
+
+MAX_ATTEMPTS = 3
+# Espera máxima de `barrier`: mejor un historial sin el último turno que un chat colgado
+BARRIER_TIMEOUT = 2.0
+
+WRITTEN_OPS = metrics.Counter(
+    "chat_writer_ops_total", "Operaciones diferidas del chat por resultado.", ("kind", "result")
+)
+FLUSH_SIZE = metrics.Histogram(
+    "chat_writer_batch_ops", "Operaciones escritas por transacción.", (),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+@dataclass
+class _Op:
+    kind: str
+    user_id: str
+    data: dict
+    attempts: int = 0
+
+
+class ChatWriter:
+    """Cola FIFO de escrituras del chat que un worker vuelca por lotes."""
+
+    def __init__(self):
+        self.enabled = settings.CHAT_WRITE_BEHIND
+        self.batch_size = settings.CHAT_WRITE_BATCH_SIZE
+        self.flush_seconds = settings.CHAT_WRITE_FLUSH_MS / 1000
+        self._pending: deque[_Op] = deque()
+        # Operaciones encoladas y aún sin escribir por usuario (para `barrier`)
+        self._per_user: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._flushed: asyncio.Condition | None = None
+        self._task: asyncio.Task | None = None
+        # Un solo volcado a la vez: el orden por usuario depende de ello
+        self._flush_lock: asyncio.Lock | None = None
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    # --- Encolado ---
+
+    async def add_turn(self, user_id: str, message: str, reply: str) -> None:
+        """El mensaje del usuario y la respuesta del asistente, en ese orden."""
+        await self._enqueue(_Op(TURN, user_id, {"message": message, "reply": reply}))
+
+    async def add_health_record(self, user_id: str, parameter: str, value: str) -> None:
+        await self._enqueue(_Op(HEALTH, user_id, {"parameter": parameter, "value": value}))
+
+    async def add_reminder(self, user_id: str, text: str, reminder_time, rrule: str | None = None) -> None:
+        await self._enqueue(_Op(REMINDER, user_id, {"text": text, "reminder_time": reminder_time, "rrule": rrule}))
+
+    async def _enqueue(self, op: _Op) -> None:
+        if op.kind == HEALTH:
+            # La hora del registro es la del mensaje, no la del volcado
+            op.data.setdefault("timestamp", datetime.utcnow())
+        if not self.enabled or self._task is None:
+            await asyncio.to_thread(self._write_one, op)
+            return
+        with self._lock:
+            self._pending.append(op)
+            self._per_user[op.user_id] = self._per_user.get(op.user_id, 0) + 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def barrier(self, user_id: str) -> None:
+        """Espera a que estén escritas las operaciones pendientes del usuario (lectura de lo propio)."""
+        if self._task is None or not self._per_user.get(user_id):
+            return
+        limite = time.monotonic() + BARRIER_TIMEOUT
+        async with self._flushed:
+            while self._per_user.get(user_id):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    logger.warning("Historial leído con escrituras pendientes", extra={"user_id": user_id})
+                    return
+                self._wake.set()
+                try:
+                    await asyncio.wait_for(self._flushed.wait(), timeout=restante)
+                except asyncio.TimeoutError:
+                    pass
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Lo que quede (incluidos los reintentos) se escribe antes de apagar
+        for _ in range(MAX_ATTEMPTS):
+            if not self._pending:
+                break
+            await self.flush()
+        if self._pending:
+            logger.error("Escrituras del chat perdidas al apagar", extra={"ops": len(self._pending)})
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    # --- Volcado ---
+
+    async def flush(self) -> int:
+        """Escribe todo lo pendiente, en lotes de hasta batch_size. Devuelve las operaciones escritas."""
+        written = 0
+        async with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    break
+                done, retry = await asyncio.to_thread(self._write, batch)
+                written += len(done)
+                with self._lock:
+                    # Los reintentos vuelven al principio, en su orden, por delante de lo nuevo
+                    self._pending.extendleft(reversed(retry))
+                    for op in done:
+                        self._settle(op)
+                async with self._flushed:
+                    self._flushed.notify_all()
+                if retry:
+                    break
+        return written
+
+    def _settle(self, op: _Op) -> None:
+        """La operación ya no está pendiente (escrita o descartada). Con el lock tomado."""
+        restantes = self._per_user.get(op.user_id, 0) - 1
+        if restantes > 0:
+            self._per_user[op.user_id] = restantes
+        else:
+            self._per_user.pop(op.user_id, None)
+
+    def _write(self, batch: list[_Op]) -> tuple[list[_Op], list[_Op]]:
+        """Escribe un lote en una transacción. Devuelve (terminadas, a reintentar)."""
+        started = time.perf_counter()
+        try:
+            with SessionLocal(expire_on_commit=False) as db:
+                avisos = [self._apply(db, op) for op in batch]
+                db.commit()
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.warning("Falló un lote de escrituras del chat, se reintenta una a una: %s", e, extra={"ops": len(batch)})
+            return self._write_each(batch)
+        self._notify(avisos)
+        self.flushes += 1
+        FLUSH_SIZE.observe(len(batch))
+        metrics.STAGE_DURATION.observe(time.perf_counter() - started, "chat_write_flush")
+        for op in batch:
+            WRITTEN_OPS.inc(op.kind, "written")
+        return batch, []
+
+    def _write_each(self, batch: list[_Op]) -> tuple[list[_Op], list[_Op]]:
+        done, retry = [], []
+        bloqueados: set[str] = set()  # usuarios con una operación anterior sin escribir
+        for op in batch:
+            if op.user_id in bloqueados:
+                retry.append(op)
+                continue
+            try:
+                self._write_one(op)
+            except Exception as e:
+                op.attempts += 1
+                if op.attempts < MAX_ATTEMPTS:
+                    WRITTEN_OPS.inc(op.kind, "retried")
+                    bloqueados.add(op.user_id)
+                    retry.append(op)
+                else:
+                    WRITTEN_OPS.inc(op.kind, "dropped")
+                    logger.error("Escritura del chat descartada tras %s intentos: %s", op.attempts, e, extra={"user_id": op.user_id, "kind": op.kind})
+                    done.append(op)
+                continue
+            WRITTEN_OPS.inc(op.kind, "written")
+            done.append(op)
+        return done, retry
+
+    def _write_one(self, op: _Op) -> None:
+        with SessionLocal(expire_on_commit=False) as db:
+            aviso = self._apply(db, op)
+            db.commit()
+        self._notify([aviso])
+
+    def _apply(self, db: Session, op: _Op) -> Callable[[], None] | None:
+        """Añade la operación a la sesión sin confirmar. Devuelve el aviso a lanzar tras el commit."""
+        if op.kind == TURN:
+            db.add(ConversationHistory(user_id=op.user_id, role="user", content=op.data["message"]))
+            db.add(ConversationHistory(user_id=op.user_id, role="assistant", content=op.data["reply"]))
+            return None
+        if op.kind == HEALTH:
+            record = health_service.save_health_data(db, op.user_id, commit=False, **op.data)
+            return lambda: health_service.notify_created(record)
+        reminder = reminder_service.add_reminder(db, op.user_id, commit=False, **op.data)
+        return lambda: reminder_service.notify_created(reminder)
+
+    @staticmethod
+    def _notify(avisos: list) -> None:
+        for aviso in avisos:
+            if aviso is None:
+                continue
+            try:
+                aviso()
+            except Exception as e:
+                logger.error("No se pudo avisar de una escritura del chat: %s", e)
+
+
+writer = ChatWriter()
+
+
+def _collect_metrics() -> list[str]:
+    return metrics.format_family(
+        "chat_writer_pending_ops", "gauge", "Escrituras del chat encoladas y aún sin escribir.",
+        [("", {}, writer.pending)],
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.services.database import CollectionVersion
+
+REMINDERS = "reminders"
+HEALTH = "health"
+EMERGENCY_CONTACTS = "emergency_contacts"
+EMERGENCIES = "emergencies"
+
+# Consultas que hace cada listado y que un 304 se ahorra
+_LIST_QUERIES = {REMINDERS: 1, HEALTH: 1, EMERGENCY_CONTACTS: 1, EMERGENCIES: 1}
+
+# Tamaño de la última respuesta completa por (usuario, ETag), para estimar los bytes ahorrados
+_MAX_SIZES = 10000
+
+
+def bump(db: Session, user_id: str, collection: str) -> None:
+    """
+    Incrementa la versión de una colección del usuario. No confirma: se llama antes del
+    commit de la escritura para que dato y versión cambien en la misma transacción.
+    """
+    condition = (CollectionVersion.user_id == user_id) & (CollectionVersion.collection == collection)
+    values = {"version": CollectionVersion.version + 1}
+    if db.execute(update(CollectionVersion).where(condition).values(**values)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(CollectionVersion(user_id=user_id, collection=collection, version=1))
+    except IntegrityError:
+        # Otra transacción creó la fila a la vez
+        db.execute(update(CollectionVersion).where(condition).values(**values))
+
+
+def get_version(db: Session, user_id: str, collection: str) -> int:
+    version = (
+        db.query(CollectionVersion.version)
+        .filter(CollectionVersion.user_id == user_id, CollectionVersion.collection == collection)
+        .scalar()
+    )
+    return version or 0
+
+
+def make_etag(collection: str, version: int, variant: str = "") -> str:
+    """ETag débil: la respuesta es equivalente mientras la versión no cambie."""
+    tag = f"{collection}-{version}"
+    if variant:
+        tag += "-" + hashlib.sha1(variant.encode()).hexdigest()[:10]
+    return f'W/"{tag}"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: se ignora el prefijo W/
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class ConditionalStats:
+    """Cuenta las respuestas 304 y lo que se ahorran (bytes y consultas)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self.not_modified = 0
+        self.full = 0
+        self.bytes_saved = 0
+        self.queries_avoided = 0
+
+    def record_full(self, user_id: str, etag: str, size: int) -> None:
+        with self._lock:
+            self.full += 1
+            self._sizes[(user_id, etag)] = size
+            self._sizes.move_to_end((user_id, etag))
+            if len(self._sizes) > _MAX_SIZES:
+                self._sizes.popitem(last=False)
+
+    def record_not_modified(self, user_id: str, etag: str, queries: int) -> None:
+        with self._lock:
+            self.not_modified += 1
+            self.queries_avoided += queries
+            self.bytes_saved += self._sizes.get((user_id, etag), 0)
+
+    def snapshot(self) -> dict:
+        total = self.full + self.not_modified
+        return {
+            "respuestas_completas": self.full,
+            "respuestas_304": self.not_modified,
+            "tasa_304": round(self.not_modified / total, 3) if total else 0.0,
+            "bytes_ahorrados": self.bytes_saved,
+            "consultas_evitadas": self.queries_avoided,
+        }
+
+
+stats = ConditionalStats()
+
+_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+def check_not_modified(
+    request: Request, db: Session, user_id: str, collection: str, variant: str = "", queries: int | None = None
+) -> tuple[str, Response | None]:
+    """
+    Calcula el ETag del listado a partir de la versión de la colección y, si coincide con
+    `If-None-Match`, devuelve una respuesta 304 (sin consultar la colección ni serializar nada).
+    La versión se lee antes que los datos: si cambian entre medias, el ETag queda por detrás
+    y el cliente simplemente vuelve a descargar la lista en la siguiente petición.
+    """
+    etag = make_etag(collection, get_version(db, user_id, collection), variant)
+    if _matches(request.headers.get("if-none-match"), etag):
+        stats.record_not_modified(user_id, etag, queries if queries is not None else _LIST_QUERIES[collection])
+        return etag, Response(status_code=304, headers={"ETag": etag, **_HEADERS})
+    return etag, None
+
+
+def versioned_response(items, adapter: TypeAdapter, user_id: str, etag: str) -> Response:
+    """Serializa la lista con el esquema de respuesta y la devuelve con su ETag."""
+    body = adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+    stats.record_full(user_id, etag, len(body))
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, **_HEADERS})
@@ -0,0 +1,168 @@
+"""
+Últimos mensajes de la conversación de cada usuario activo, en memoria.
+
+Cada turno del chat necesita los MAX_CONTEXT_MESSAGES mensajes anteriores del usuario, que
+casi siempre acaba de escribir este mismo proceso. El buffer los guarda por usuario en un
+anillo de tamaño fijo:
+
+- escritura directa: `chat_endpoint` añade el turno al buffer a la vez que lo encola para
+  la base de datos (`append_turn`);
+- carga perezosa: si el usuario no está, `generate_response` lee la base de datos y rellena
+  el buffer (`begin_fill` + `fill`);
+- expulsión: los usuarios sin actividad en CONVERSATION_BUFFER_IDLE_SECONDS salen, y si se
+  supera CONVERSATION_BUFFER_MAX_MB se expulsan los menos recientes.
+
+Un turno que llega mientras se carga el historial de ese usuario invalida la carga (la
+lectura no lo incluye): el buffer se queda sin el usuario y el siguiente turno vuelve a
+leer. Es por proceso: con varios workers, el tiempo de inactividad acota lo desactualizado
+que puede quedar el historial si los mensajes de un usuario llegan a workers distintos.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from app.config import settings
+from app.models.chat_schemas import ConversationItem
+from app.services import metrics
+
+# Mensajes de contexto que se envían al LLM (y que se guardan por usuario)
+MAX_CONTEXT_MESSAGES = 10
+
+# Coste aproximado de un usuario sin mensajes y de cada mensaje, sin contar el texto
+_USER_OVERHEAD = 400
+_ITEM_OVERHEAD = 150
+
+
+def _size(item: ConversationItem) -> int:
+    return _ITEM_OVERHEAD + sys.getsizeof(item.content)
+
+
+class _Entry:
+    __slots__ = ("items", "size", "touched")
+
+    def __init__(self, max_messages: int):
+        self.items: deque[ConversationItem] = deque(maxlen=max_messages)
+        self.size = _USER_OVERHEAD
+        self.touched = time.monotonic()
+
+    def append(self, item: ConversationItem) -> None:
+        if len(self.items) == self.items.maxlen:
+            self.size -= _size(self.items[0])
+        self.items.append(item)
+        self.size += _size(item)
+
+
+class ConversationBuffer:
+    """Anillo de mensajes recientes por usuario, con expulsión LRU bajo un límite de memoria."""
+
+    def __init__(self, max_messages: int, max_bytes: int, idle_seconds: float):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # Cargas en curso por usuario: True si llegó un turno durante la carga
+        self._filling: dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def users(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str) -> list[ConversationItem] | None:
+        """Los mensajes recientes en orden cronológico, o None si el usuario no está en memoria."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry.touched > self.idle_seconds:
+                self._remove(user_id)
+                entry = None
+            if entry is not None:
+                entry.touched = now
+                self._entries.move_to_end(user_id)
+                items = list(entry.items)
+        metrics.record_cache("conversation", entry is not None)
+        return items if entry is not None else None
+
+    def begin_fill(self, user_id: str) -> None:
+        """Se va a leer el historial de la base de datos; llamar antes de la consulta."""
+        if self.enabled:
+            with self._lock:
+                self._filling[user_id] = False
+
+    def fill(self, user_id: str, items: list[ConversationItem]) -> None:
+        """Guarda el historial leído, salvo que haya llegado un turno durante la lectura."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._filling.pop(user_id, True) or user_id in self._entries:
+                return
+            entry = _Entry(self.max_messages)
+            for item in items[-self.max_messages:]:
+                entry.append(item)
+            self._entries[user_id] = entry
+            self.bytes += entry.size
+            self._evict()
+
+    def append_turn(self, user_id: str, message: str, reply: str) -> None:
+        """Añade un turno (mensaje y respuesta) si el usuario está en memoria."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if user_id in self._filling:
+                self._filling[user_id] = True
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            before = entry.size
+            entry.append(ConversationItem(role="user", content=message))
+            entry.append(ConversationItem(role="assistant", content=reply))
+            entry.touched = time.monotonic()
+            self._entries.move_to_end(user_id)
+            self.bytes += entry.size - before
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._filling.clear()
+            self.bytes = 0
+
+    def _remove(self, user_id: str) -> None:
+        self.bytes -= self._entries.pop(user_id).size
+
+    def _evict(self) -> None:
+        """Con el lock tomado: fuera los inactivos y, si no basta, los menos recientes."""
+        now = time.monotonic()
+        while self._entries:
+            user_id, entry = next(iter(self._entries.items()))
+            if self.bytes <= self.max_bytes and now - entry.touched <= self.idle_seconds:
+                break
+            self._remove(user_id)
+            self.evictions += 1
+
+
+buffer = ConversationBuffer(
+    max_messages=MAX_CONTEXT_MESSAGES,
+    max_bytes=int(settings.CONVERSATION_BUFFER_MAX_MB * 1024 * 1024),
+    idle_seconds=settings.CONVERSATION_BUFFER_IDLE_SECONDS,
+)
+
+
+def _collect_metrics() -> list[str]:
+    return (
+        metrics.format_family("conversation_buffer_users", "gauge", "Usuarios con su conversación reciente en memoria.", [("", {}, buffer.users)])
+        + metrics.format_family("conversation_buffer_bytes", "gauge", "Memoria aproximada del buffer de conversaciones.", [("", {}, buffer.bytes)])
+        + metrics.format_family("conversation_buffer_evictions_total", "counter", "Usuarios expulsados del buffer de conversaciones.", [("", {}, buffer.evictions)])
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
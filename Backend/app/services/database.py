@@ -1,14 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Index, DateTime
+import logging
+from sqlalchemy import create_engine, Column, Integer, Float, String, Text, Index, Date, DateTime, JSON, inspect, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.config import settings
+from app.services import metrics
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class Base(DeclarativeBase):
     pass
 
+
+def _utcnow() -> datetime:
+    # Dentro de Reminder el nombre `datetime` es la columna, no el módulo
+    return datetime.utcnow()
+
 # Aquí definimos el modelo user
 class User(Base):
     __tablename__ = "users"
@@ -24,11 +33,30 @@ class Reminder(Base):
     user_id = Column(String, index=True)
     text = Column(Text, nullable=False)
     datetime = Column(String, nullable=False)
+    # Momento de disparo normalizado a UTC (sin zona) y último disparo reclamado por el planificador.
+    # En los recordatorios recurrentes due_at es la próxima ocurrencia pendiente de disparar.
+    due_at = Column(DateTime, nullable=True)
+    last_fired_at = Column(DateTime, nullable=True)
+    # Recurrencia: regla RRULE (sin DTSTART) y primera ocurrencia de la serie (UTC sin zona)
+    rrule = Column(String, nullable=True)
+    starts_at = Column(DateTime, nullable=True)
+    # Última modificación (UTC), para la sincronización incremental
+    updated_at = Column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
 
     __table_args__ = (
         Index('idx_reminders_user_id', user_id),
+        Index('idx_reminders_due_at', due_at),
+        Index('idx_reminders_user_updated', user_id, updated_at, id),
     )
 
+# Estado de ocurrencias concretas de un recordatorio recurrente.
+# Solo se guardan las excepciones (completadas u omitidas); las pendientes no ocupan filas.
+class ReminderOccurrenceState(Base):
+    __tablename__ = "reminder_occurrence_states"
+    reminder_id = Column(Integer, primary_key=True)
+    occurrence_at = Column(DateTime, primary_key=True)
+    status = Column(String, nullable=False) # 'completada' u 'omitida'
+
 # Define the HealthRecord model
 class HealthRecord(Base):
     __tablename__ = "health_records"
@@ -37,6 +65,11 @@ class HealthRecord(Base):
     parameter = Column(String, nullable=False)
     value = Column(String, nullable=False)
     timestamp = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
+
+    __table_args__ = (
+        Index('idx_health_records_user_updated', user_id, updated_at, id),
+    )
 
 # Define the Emergency model
 class Emergency(Base):
@@ -46,6 +79,13 @@ class Emergency(Base):
     tipo_emergencia = Column(String, nullable=False)
     mensaje_opcional = Column(Text)
     timestamp = Column(String, nullable=False)
+    # Estado del aviso a los contactos: estado global, latencia y resultado por contacto
+    notification_status = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
+
+    __table_args__ = (
+        Index('idx_emergencies_user_updated', user_id, updated_at, id),
+    )
 
 # Define the EmergencyContact model
 class EmergencyContact(Base):
@@ -55,9 +95,74 @@ class EmergencyContact(Base):
     name = Column(String, nullable=False)
     phone_number = Column(String, nullable=False)
     relationship = Column(String, nullable=True)
+    updated_at = Column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
 
     __table_args__ = (
         Index('idx_emergency_contacts_user_id', user_id),
+        Index('idx_emergency_contacts_user_updated', user_id, updated_at, id),
+    )
+
+# Registros eliminados ("tombstones"), para que la sincronización incremental propague los borrados
+class DeletedRecord(Base):
+    __tablename__ = "deleted_records"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    collection = Column(String, nullable=False) # 'reminders', 'health', 'emergency_contacts'
+    record_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_deleted_records_user_deleted', user_id, deleted_at, id),
+    )
+
+# Bandeja de salida de mensajes (SMS y otros canales): se envían desde un worker en segundo plano
+class OutboundMessage(Base):
+    __tablename__ = "outbound_messages"
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False) # 'sms', ...
+    recipient = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    idempotency_key = Column(String, nullable=False, unique=True)
+    reference = Column(String, nullable=True, index=True) # ej: 'emergency:12:contact:3'
+    status = Column(String, nullable=False, default="pendiente") # pendiente, enviando, enviado, fallido, cancelado
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_outbound_messages_status_next', status, next_attempt_at),
+    )
+
+# Versión de cada colección de un usuario (recordatorios, salud, contactos, emergencias).
+# Se incrementa en la misma transacción que cada escritura; de ella salen los ETag de los listados.
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+    user_id = Column(String, primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# Consumo del LLM agregado por día, usuario, intención y modelo (lo escribe usage_service por lotes)
+class LlmUsage(Base):
+    __tablename__ = "llm_usage"
+    day = Column(Date, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    intent = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    cache_hits = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Float, nullable=False, default=0)
+    latency_ms_max = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_llm_usage_user_day', user_id, day),
     )
 
 # Define the ConversationHistory model
@@ -72,6 +177,44 @@ class ConversationHistory(Base):
 # Function to create all tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+def _add_missing_columns():
+    """Añade a las tablas existentes las columnas nuevas de los modelos (create_all no altera tablas)."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info("Columna añadida: %s.%s", table.name, column.name)
+        # Índices de columnas añadidas a posteriori (create_all solo los crea con la tabla)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+def _collect_pool_metrics() -> list[str]:
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return []  # Pools sin estadísticas (p. ej. SQLite en memoria)
+    samples = {
+        "db_pool_size": ("Conexiones que mantiene el pool.", pool.size()),
+        "db_pool_checked_out": ("Conexiones del pool en uso.", pool.checkedout()),
+        "db_pool_checked_in": ("Conexiones del pool libres.", pool.checkedin()),
+        "db_pool_overflow": ("Conexiones abiertas por encima del tamaño del pool.", pool.overflow()),
+    }
+    lines = []
+    for name, (documentation, value) in samples.items():
+        lines += metrics.format_family(name, "gauge", documentation, [("", {}, value)])
+    return lines
+
+
+metrics.registry.add_collector(_collect_pool_metrics)
 
 # Dependency to get a DB session
 def get_db():
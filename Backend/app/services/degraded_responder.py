@@ -0,0 +1,70 @@
+"""
+Respuestas del chat sin LLM (modo degradado).
+
+Cuando OpenAI no responde a tiempo, falla o tiene el circuito abierto, y el modelo local
+tampoco responde, `generate_response` contesta con estas reglas en lugar del mensaje genérico
+de error. La respuesta tiene el mismo formato que la del LLM, así que `chat_endpoint` sigue
+actuando según la intención:
+
+- la intención sale de las mismas reglas locales que eligen la ruta del LLM
+  (`llm_router.expected_intent`): detector de emergencias, salud, recordatorios...;
+- EMERGENCIA registra la alerta y avisa a los contactos como siempre;
+- RECORDATORIO con fechas de Duckling guarda el recordatorio y lo confirma con la fecha;
+- una pregunta sobre recordatorios o salud se contesta con los datos del usuario en memoria
+  (`user_context`), si los hay.
+
+Las respuestas llevan "fallback": True (no confirman ni descartan la vía rápida de
+emergencias) y "degradado": True.
+"""
+import re
+from datetime import datetime
+
+from app.services import llm_router
+
+_PREGUNTA = re.compile(r"^\s*¿|\?\s*$|^\s*(que|qué|cual|cuál|cuando|cuándo|como|cómo|tengo algo)\b", re.IGNORECASE)
+
+_AVISO = "Ahora mismo tengo problemas de conexión y mis respuestas serán breves."
+
+RESPUESTAS = {
+    "EMERGENCIA": "Estoy avisando a tus contactos de emergencia. Mantén la calma.",
+    "RECORDATORIO": f"{_AVISO} Aun así puedo guardar tus recordatorios.",
+    "SALUD": f"{_AVISO} Anoté lo que me contaste. Si te sientes mal, avisa a un familiar o llama a emergencias.",
+    "INFORMACION": f"{_AVISO} No puedo buscar esa información en este momento; inténtalo de nuevo en unos minutos.",
+    "CONVERSACION_GENERAL": f"{_AVISO} Sigo aquí: puedo guardar recordatorios y avisar a tus contactos si lo necesitas.",
+}
+
+EMOCIONES = {"EMERGENCIA": "Urgencia", "SALUD": "Preocupacion"}
+
+
+def _fecha(fechas: list) -> str | None:
+    """La primera fecha de Duckling como "el 20/10 a las 08:00", o None si no se entiende."""
+    try:
+        valor = datetime.fromisoformat(fechas[0]["value"]["value"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+    return f"el {valor:%d/%m} a las {valor:%H:%M}"
+
+
+def respond(mensaje: str, fechas: list | None = None, contexto: str = "") -> dict:
+    """Respuesta en el formato del LLM a partir de reglas locales."""
+    intencion = llm_router.expected_intent(mensaje)
+    respuesta = RESPUESTAS[intencion]
+    if contexto and _PREGUNTA.search(mensaje) and intencion in ("RECORDATORIO", "SALUD"):
+        # "¿Qué tenía que hacer mañana?": se contesta con los datos y no se guarda nada
+        datos = contexto.split("\n", 1)[-1]
+        return {
+            "intencion": "CONVERSACION_GENERAL",
+            "emocion": "Neutra",
+            "respuesta": f"{_AVISO} Esto es lo que tengo anotado:\n{datos}",
+            "fallback": True,
+            "degradado": True,
+        }
+    if intencion == "RECORDATORIO" and fechas and (cuando := _fecha(fechas)):
+        respuesta = f"{_AVISO} Guardé tu recordatorio para {cuando}."
+    return {
+        "intencion": intencion,
+        "emocion": EMOCIONES.get(intencion, "Neutra"),
+        "respuesta": respuesta,
+        "fallback": True,
+        "degradado": True,
+    }
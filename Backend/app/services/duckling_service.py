@@ -1,30 +1,77 @@
+import logging
 import httpx
+from app.config import settings
+from app.services.resilience import get_provider, ProviderError
+
+DUCKLING_URL = f"{settings.DUCKLING_BASE_URL.rstrip('/')}/parse"
+
+logger = logging.getLogger(__name__)
+
+provider = get_provider("duckling", timeout=settings.DUCKLING_TIMEOUT)
+
+# Cliente compartido (reutiliza conexiones entre mensajes); lo cierra el apagado de la app
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=provider.timeout)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def ping(timeout: float) -> None:
+    """Comprueba que Duckling responde y deja abierta una conexión del pool."""
+    await get_client().get(settings.DUCKLING_BASE_URL, timeout=timeout)
+
+
+async def _parse(text: str) -> list:
+    response = await get_client().post(
+        DUCKLING_URL,
+        data={
+            "text": text,
+            "locale": "es_ES",
+            "tz": "America/Santiago",
+            "dims": '["time"]',
+        },
+    )
+
+    if response.status_code != 200:
+        raise ProviderError(f"HTTP {response.status_code}")
+    data = response.json()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Duckling detectó %s entidades", len(data), extra={"payload": data})
+    return data
+
+
+def summarize(entities: list) -> list[dict]:
+    """
+    Lo que se devuelve al cliente de cada fecha (`FechaDetectada`): el texto, su posición y el
+    valor elegido. La respuesta completa de Duckling (con todas las alternativas en "values")
+    se sigue usando dentro del chat.
+    """
+    fechas = []
+    for entity in entities:
+        value = entity.get("value") or {}
+        desde, hasta = value.get("from") or {}, value.get("to") or {}
+        fechas.append({
+            "body": entity.get("body", ""),
+            "start": entity.get("start", 0),
+            "end": entity.get("end", 0),
+            "value": value.get("value", desde.get("value")),
+            "to": hasta.get("value"),
+            "grain": value.get("grain", desde.get("grain")),
+        })
+    return fechas
 
 
 async def extract_dates_with_duckling(text: str) -> list:
-    print(f"[🔍 Duckling] Texto recibido: {text}")
-
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "http://localhost:8001/parse",
-                data={
-                    "text": text,
-                    "locale": "es_ES",
-                    "tz": "America/Santiago",
-                    "dims": '["time"]',
-                },
-            )
-
-            print(f"[🌐 Duckling HTTP] status: {response.status_code}")
-            if response.status_code == 200:
-                data = response.json()
-                print(f"[✅ Duckling] Resultado: {data}")
-                return data
-
-            print("[⚠️ Duckling] Respuesta no exitosa")
-            return []
-
-    except Exception as e:
-        print(f"[❌ Duckling ERROR] {e}")
-        return []
+    # Con Duckling lento o caído el chat sigue sin fechas en vez de esperar
+    return await provider.acall(_parse, text, fallback=[])
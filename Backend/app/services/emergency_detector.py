@@ -0,0 +1,115 @@
+"""
+Detector local de emergencias en los mensajes del chat, sin red ni LLM (decenas de microsegundos).
+
+Prima no perder ninguna emergencia: el LLM confirma o descarta después. Cada señal tiene
+un nivel:
+
+- "alerta": se registra la emergencia y se avisa a los contactos sin esperar al LLM
+  ("¡auxilio!", "me caí", "ayúdame", "no puedo respirar", "llamen una ambulancia"...).
+- "posible": solo adelanta el mensaje en la cola del LLM ("me siento muy mal", "urgente" o
+  palabras sueltas como "ayuda", "infarto" o "urgencias", que salen también en charlas).
+
+Una señal no cuenta si va negada ("no me caí", "no es una emergencia"), es hipotética
+("¿qué hago si me caigo?", "en caso de emergencia") o forma parte de una expresión que no
+es una emergencia ("me caí de la risa", "contacto de emergencia"). Se mira dentro de la
+misma frase: "No sé qué pasó, me caí" sí es una alerta.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass
+
+ALERTA = "alerta"
+POSIBLE = "posible"
+
+# (nivel, patrón) sobre el texto normalizado: minúsculas, sin tildes y sin letras repetidas
+_SENALES = [
+    (ALERTA, r"\b(auxilio|socorro)\b"),
+    (ALERTA, r"\b(necesito|pide|pidan|busca|busquen|llama|llamen|traigan) (una )?ayuda\b(?!\s+(con|a|al|para|en|de|del|sobre)\b)"),
+    (ALERTA, r"\b(ayudame|ayudenme|ayudeme|ayudenos)\b(?!\s+(con|a|al|para|en|de|del|sobre)\b)"),
+    (ALERTA, r"\bme (he |acabo de )?ca(i|ido)\b"),
+    (ALERTA, r"\bse (ha |acaba de )?ca(yo|ido)\b"),
+    (ALERTA, r"\bno (puedo|puede) (respirar|levantarme|levantarse|moverme|moverse|hablar)\b"),
+    (ALERTA, r"\bme (estoy )?ahog(o|ando)\b"),
+    (ALERTA, r"\b(dolor|opresion|presion) (muy )?(fuerte )?(en el|de|del) pecho\b"),
+    (ALERTA, r"\bme duele (mucho |muy fuerte )?el pecho\b"),
+    # En primera persona o ahora mismo: "me está dando un infarto", "creo que es un derrame"
+    (ALERTA, r"\b((me|le) (esta|estan) dando|(me|le) (dio|da)|estoy teniendo|creo que (es|tengo|me da)) (un |una )?"
+             r"(infarto|derrame|ataque al corazon|convulsion)\b"),
+    (ALERTA, r"\b(esta|estoy) (inconsciente|convulsionando)\b"),
+    (ALERTA, r"\b(me|se) (he |ha |esta |estoy )?desmay\w*"),
+    (ALERTA, r"\b(llama|llamen|llame|pide|pidan|pida|manden|mande|envien|traigan|necesito|necesitamos) (a )?(una |la |los )?"
+             r"(ambulancia|bomberos)\b"),
+    (ALERTA, r"\b(llevame|llevenme|lleveme) a urgencias\b"),
+    (ALERTA, r"\b(es|tengo|tenemos|hay) una emergencia\b"),
+    (ALERTA, r"\b(me (quiero|voy a) morir|me estoy muriendo)\b"),
+    (ALERTA, r"\b(sangr\w* (mucho|sin parar)|no para de sangrar)\b"),
+    (POSIBLE, r"\b(me siento|estoy|me encuentro) (muy |bastante )?mal\b"),
+    (POSIBLE, r"\b(mareo|mareado|mareada|me desvanezco)\b"),
+    (POSIBLE, r"\burgente\b"),
+    # Sueltas también salen en preguntas, agradecimientos o recordatorios: "¿qué es un infarto?",
+    # "gracias por tu ayuda", "recuérdame llamar a los bomberos"
+    (POSIBLE, r"\bayuda\b(?!\s+(con|a|al|para|en|de|del|sobre)\b)"),
+    (POSIBLE, r"\b(infarto|derrame|ataque al corazon|convulsi\w*|inconsciente|desmay\w*)\b"),
+    (POSIBLE, r"\b(ambulancia|emergencia|urgencias|bomberos)\b"),
+    (POSIBLE, r"\b(ayudame|ayudenme|sangr\w*|me (pegue|golpee)|me duele mucho)\b"),
+]
+_SENALES = [(nivel, re.compile(patron)) for nivel, patron in _SENALES]
+
+# Palabras que, poco antes de la señal y en la misma frase, la anulan
+_NEGACION = re.compile(r"\b(no|nunca|ni|tampoco|sin|si|cuando|caso|simulacro|supongamos|imagina)\b")
+_VENTANA_PALABRAS = 3
+
+# El usuario aclara que no pasa nada: se descarta todo el mensaje
+_DESCARTES = re.compile(r"\b(falsa alarma|era (una )?broma|es (una )?broma|solo (era|es) una prueba)\b")
+
+# Expresiones que contienen una señal pero no son una emergencia (se descarta la frase)
+_EXCLUSIONES = re.compile(
+    r"\b(de (la )?risa"
+    r"|(contacto|contactos|numero|numeros|telefono|boton|plan|kit|llamada|pelicula|serie|salida|puerta)s? de (emergencia|urgencias)"
+    r"|(la|una) ayuda (de|del)"
+    r"|(por|de) (tu|su|la|mucha|tanta|gran) ayuda)\b"
+)
+
+# Separadores de frase: la negación no se extiende más allá
+_FRASES = re.compile(r"[.,;:!?¡¿\n]+|\b(?:pero|aunque|y)\b")
+
+
+@dataclass(frozen=True)
+class Deteccion:
+    nivel: str
+    senal: str  # el fragmento del mensaje que la disparó
+
+    @property
+    def alerta(self) -> bool:
+        return self.nivel == ALERTA
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    # "ayudaaaa", "auxiliooo" -> "ayuda", "auxilio" ("ll" y "rr" se mantienen)
+    return re.sub(r"(\w)\1{2,}", r"\1", texto)
+
+
+def _anulada(frase: str, inicio: int) -> bool:
+    antes = frase[:inicio].split()[-_VENTANA_PALABRAS:]
+    return any(_NEGACION.fullmatch(palabra) for palabra in antes)
+
+
+def detectar(texto: str) -> Deteccion | None:
+    """La señal de mayor nivel que no esté anulada, o None si el mensaje no parece una emergencia."""
+    texto = _normalizar(texto)
+    if _DESCARTES.search(texto):
+        return None
+    mejor = None
+    for frase in _FRASES.split(texto):
+        if not frase or _EXCLUSIONES.search(frase):
+            continue
+        for nivel, patron in _SENALES:
+            for m in patron.finditer(frase):
+                if _anulada(frase, m.start()):
+                    continue
+                if nivel == ALERTA:
+                    return Deteccion(nivel, m.group(0))
+                mejor = mejor or Deteccion(nivel, m.group(0))
+    return mejor
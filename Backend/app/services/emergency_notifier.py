@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.database import SessionLocal, Emergency
+from app.services import emergency_service, outbox_service
+from app.services import collection_versions
+from app.services.outbox_service import OutboxMessage, dispatcher
+from app.services.event_hub import hub
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PREFIX = "emergency:"
+
+
+def _contact_status(message: OutboxMessage) -> str:
+    """Estado del mensaje en la bandeja de salida -> estado del contacto en la emergencia."""
+    if message.status == "pendiente" and message.attempts > 0:
+        return "reintentando"
+    return message.status
+
+
+def _reference(emergency_id: int, contact_id: int) -> str:
+    return f"{REFERENCE_PREFIX}{emergency_id}:contact:{contact_id}"
+
+
+def _parse_reference(reference: str) -> tuple[int, str]:
+    # "emergency:<id>:contact:<contact_id>"
+    _, emergency_id, _, contact_id = reference.split(":")
+    return int(emergency_id), contact_id
+
+
+def _overall_status(contactos: dict) -> str:
+    estados = [c["estado"] for c in contactos.values()]
+    if not estados:
+        return "sin_contactos"
+    if any(e not in outbox_service.FINAL_STATUSES for e in estados):
+        return "enviando"
+    if all(e == "enviado" for e in estados):
+        return "completado"
+    if any(e == "enviado" for e in estados):
+        return "parcial"
+    if all(e == "cancelado" for e in estados):
+        return "cancelado"
+    return "fallido"
+
+
+class EmergencyNotifier:
+    """
+    Avisa por SMS a todos los contactos de emergencia de un usuario.
+
+    Los SMS se guardan en la bandeja de salida (`outbound_messages`) en la misma transacción
+    que la emergencia, así que un reinicio no pierde avisos: el dispatcher de la bandeja los
+    envía en paralelo, con reintentos y límite de ritmo. Este notificador escucha los cambios
+    de estado de esos mensajes y los refleja por contacto en `Emergency.notification_status`.
+    """
+
+    def __init__(self):
+        # Serializa las escrituras de notification_status dentro del proceso
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        dispatcher.register_channel(
+            "sms",
+            emergency_service.enviar_sms,
+            rate_per_second=settings.SMS_RATE_PER_SECOND,
+            burst=settings.SMS_RATE_BURST,
+            timeout=settings.EMERGENCY_SMS_TIMEOUT,
+        )
+        dispatcher.add_listener(REFERENCE_PREFIX, self._on_message_update)
+
+    # --- Alta (dentro de la transacción de registrar_emergencia) ---
+
+    def enqueue(self, db: Session, emergency: Emergency, hold_seconds: float = 0) -> None:
+        """
+        Encola un SMS por contacto. No confirma la transacción: lo hace el llamador.
+        Con `hold_seconds` los SMS esperan ese tiempo a que `verify` o `release` los suelten
+        (o `verify` los cancele) antes de salir.
+        """
+        contacts = emergency_service.get_emergency_contacts(db, emergency.user_id)
+        body = emergency_service.mensaje_de_emergencia(emergency)
+        not_before = datetime.utcnow() + timedelta(seconds=hold_seconds) if hold_seconds > 0 else None
+        contactos = {}
+        for contact in contacts:
+            outbox_service.enqueue_message(
+                db,
+                channel="sms",
+                recipient=contact.phone_number,
+                body=body,
+                idempotency_key=f"emergency:{emergency.id}:contact:{contact.id}",
+                reference=_reference(emergency.id, contact.id),
+                commit=False,
+                not_before=not_before,
+            )
+            contactos[str(contact.id)] = {"nombre": contact.name, "telefono": contact.phone_number, "estado": "pendiente"}
+        emergency.notification_status = {"estado": _overall_status(contactos), "contactos": contactos}
+
+    # --- Verificación (alertas de la vía rápida del chat) ---
+
+    def verify(self, emergency_id: int, confirmed: bool) -> dict | None:
+        """
+        Anota el veredicto del LLM sobre una alerta ya lanzada. Si la confirma, sus SMS retenidos
+        salen al momento; si la descarta, se cancelan los que aún no han salido (los ya enviados,
+        porque venció la retención, no se pueden retirar). Devuelve el estado del aviso.
+        """
+        with self._lock:
+            db = SessionLocal()
+            try:
+                emergency = (
+                    db.query(Emergency).filter(Emergency.id == emergency_id).with_for_update().first()
+                )
+                if emergency is None:
+                    return None
+                status = dict(emergency.notification_status or {"contactos": {}})
+                status["verificacion"] = "confirmada" if confirmed else "descartada"
+                prefix = f"{REFERENCE_PREFIX}{emergency_id}:contact:"
+                if confirmed:
+                    outbox_service.release_messages(db, prefix, commit=False)
+                else:
+                    outbox_service.cancel_messages(db, prefix, commit=False)
+                    contactos = {k: dict(v) for k, v in status.get("contactos", {}).items()}
+                    for message in outbox_service.get_messages_by_reference(db, prefix):
+                        _, contact_id = _parse_reference(message.reference)
+                        if message.status == "cancelado" and contact_id in contactos:
+                            contactos[contact_id]["estado"] = "cancelado"
+                    status["contactos"] = contactos
+                    status["estado"] = _overall_status(contactos)
+                emergency.notification_status = status
+                collection_versions.bump(db, emergency.user_id, collection_versions.EMERGENCIES)
+                db.commit()
+                if confirmed:
+                    dispatcher.wake()
+                hub.publish(emergency.user_id, "emergency.updated", {"id": emergency_id, "notification_status": status})
+                return status
+            finally:
+                db.close()
+
+    def release(self, emergency_id: int) -> None:
+        """Suelta los SMS retenidos de una alerta sin veredicto (el LLM no respondió)."""
+        db = SessionLocal()
+        try:
+            outbox_service.release_messages(db, f"{REFERENCE_PREFIX}{emergency_id}:contact:")
+        finally:
+            db.close()
+
+    # --- Seguimiento ---
+
+    async def _on_message_update(self, message: OutboxMessage) -> None:
+        await asyncio.to_thread(self._apply, message)
+
+    def _apply(self, message: OutboxMessage) -> None:
+        emergency_id, contact_id = _parse_reference(message.reference)
+        with self._lock:
+            db = SessionLocal()
+            try:
+                # Entre procesos, el bloqueo de la fila evita que dos escrituras se pisen
+                emergency = (
+                    db.query(Emergency).filter(Emergency.id == emergency_id).with_for_update().first()
+                )
+                if emergency is None:
+                    return
+                status = dict(emergency.notification_status or {"contactos": {}})
+                contactos = {k: dict(v) for k, v in status.get("contactos", {}).items()}
+                entry = contactos.setdefault(contact_id, {"telefono": message.recipient})
+                entry["estado"] = _contact_status(message)
+                entry["intentos"] = message.attempts
+                if message.provider_id:
+                    entry["sid"] = message.provider_id
+                if message.last_error and message.status != "enviado":
+                    entry["error"] = message.last_error[:200]
+                else:
+                    entry.pop("error", None)
+                if message.sent_at:
+                    entry["latencia_ms"] = round((message.sent_at - _timestamp(emergency)).total_seconds() * 1000, 1)
+                status["contactos"] = contactos
+                status["estado"] = _overall_status(contactos)
+                if status["estado"] not in ("enviando", "sin_contactos") and "latencia_total_ms" not in status:
+                    # Latencia desde que se registró la alerta hasta el último SMS resuelto
+                    status["latencia_total_ms"] = round((datetime.utcnow() - _timestamp(emergency)).total_seconds() * 1000, 1)
+                    logger.info(
+                        "Emergencia %s: %s en %s ms", emergency_id, status["estado"], status["latencia_total_ms"],
+                        extra={"emergency_id": emergency_id, "user_id": emergency.user_id},
+                    )
+                emergency.notification_status = status
+                collection_versions.bump(db, emergency.user_id, collection_versions.EMERGENCIES)
+                db.commit()
+                hub.publish(emergency.user_id, "emergency.updated", {"id": emergency_id, "notification_status": status})
+            finally:
+                db.close()
+
+
+def _timestamp(emergency: Emergency) -> datetime:
+    value = emergency.timestamp
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+notifier = EmergencyNotifier()
@@ -1,50 +1,97 @@
+import functools
+import logging
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.services.database import Emergency, EmergencyContact
 from app.models.emergency_schemas import EmergencyContactCreate, EmergencyContactUpdate
 from app.config import settings
+from app.services.event_hub import hub
+from app.services import collection_versions, sync_service
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
 
-# Inicializar el cliente de Twilio
-twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+logger = logging.getLogger(__name__)
+
+@functools.cache
+def get_twilio_client() -> Client:
+    """Cliente de Twilio (con plazo máximo por petición HTTP), creado en el primer envío."""
+    client = Client(
+        settings.TWILIO_ACCOUNT_SID,
+        settings.TWILIO_AUTH_TOKEN,
+        http_client=TwilioHttpClient(timeout=settings.EMERGENCY_SMS_TIMEOUT),
+    )
+    if settings.TWILIO_API_URL:
+        client.api.base_url = settings.TWILIO_API_URL
+    return client
+
+def enviar_sms(to_phone_number: str, message_body: str) -> str:
+    """Envía un SMS a través de Twilio y devuelve el SID del mensaje. Lanza excepción si falla."""
+    message = get_twilio_client().messages.create(
+        to=to_phone_number,
+        from_=settings.TWILIO_PHONE_NUMBER,
+        body=message_body
+    )
+    return message.sid
 
 def send_sms_via_twilio(to_phone_number: str, message_body: str) -> bool:
     """Envía un SMS a través de Twilio."""
     try:
-        message = twilio_client.messages.create(
-            to=to_phone_number,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            body=message_body
-        )
-        print(f"[DEBUG] SMS enviado con éxito. SID del mensaje: {message.sid}")
+        sid = enviar_sms(to_phone_number, message_body)
+        logger.debug("SMS enviado con éxito", extra={"sid": sid})
         return True
     except Exception as e:
-        print(f"[ERROR] No se pudo enviar SMS a {to_phone_number}: {e}")
+        logger.error("No se pudo enviar SMS a %s: %s", to_phone_number, e)
         return False
 
+def mensaje_de_emergencia(emergency: Emergency) -> str:
+    """Texto del SMS que reciben los contactos de emergencia."""
+    mensaje = f"ALERTA DE EMERGENCIA: El usuario {emergency.user_id} ha activado una emergencia. Tipo: {emergency.tipo_emergencia}."
+    if emergency.mensaje_opcional:
+        mensaje += f" Mensaje: {emergency.mensaje_opcional}"
+    return mensaje
+
 def registrar_emergencia(
-    db: Session, user_id: str, tipo_emergencia: str, mensaje_opcional: str = ""
+    db: Session,
+    user_id: str,
+    tipo_emergencia: str,
+    mensaje_opcional: str = "",
+    timestamp: datetime | None = None,
+    hold_seconds: float = 0,
 ) -> Emergency:
-    """Registra una nueva emergencia en la base de datos y notifica a los contactos de emergencia."""
-    timestamp = datetime.utcnow()
-    db_emergency = Emergency(user_id=user_id, tipo_emergencia=tipo_emergencia, mensaje_opcional=mensaje_opcional, timestamp=timestamp)
+    """
+    Registra una nueva emergencia en la base de datos y notifica a los contactos de emergencia.
+    `timestamp` es cuándo se detectó (por defecto, ahora): las latencias de aviso se miden desde ahí.
+    Con `hold_seconds` (alertas de la vía rápida del chat) los SMS esperan el veredicto del LLM
+    como mucho ese tiempo (ver `EmergencyNotifier.verify`).
+    """
+    timestamp = timestamp or datetime.utcnow()
+    db_emergency = Emergency(
+        user_id=user_id,
+        tipo_emergencia=tipo_emergencia,
+        mensaje_opcional=mensaje_opcional,
+        timestamp=timestamp,
+    )
     db.add(db_emergency)
+    db.flush()
+
+    # Los SMS a los contactos se guardan en la bandeja de salida en la misma transacción:
+    # si la emergencia queda registrada, sus avisos también. Se envían en segundo plano.
+    from app.services.emergency_notifier import notifier
+    from app.services.outbox_service import dispatcher
+    notifier.enqueue(db, db_emergency, hold_seconds)
+    collection_versions.bump(db, user_id, collection_versions.EMERGENCIES)
     db.commit()
     db.refresh(db_emergency)
-
-    # Notificar a los contactos de emergencia (esta lógica se moverá al frontend para el protocolo)
-    # contacts = get_emergency_contacts(db, user_id)
-    # message_body = f"ALERTA DE EMERGENCIA: El usuario {user_id} ha activado una emergencia. Tipo: {tipo_emergencia}. Mensaje: {mensaje_opcional}"
-    # for contact in contacts:
-    #     try:
-    #         twilio_client.messages.create(
-    #             to=contact.phone_number,
-    #             from_=settings.TWILIO_PHONE_NUMBER,
-    #             body=message_body
-    #         )
-    #         print(f"[DEBUG] SMS de emergencia enviado a {contact.name} ({contact.phone_number})")
-    #     except Exception as e:
-    #         print(f"[ERROR] No se pudo enviar SMS a {contact.name} ({contact.phone_number}): {e}")
+    if hold_seconds > 0:
+        dispatcher.wake_later(hold_seconds)
+    else:
+        dispatcher.wake()
+    hub.publish(user_id, "emergency.created", {
+        "id": db_emergency.id,
+        "tipo_emergencia": db_emergency.tipo_emergencia,
+        "timestamp": db_emergency.timestamp,
+        "notification_status": db_emergency.notification_status,
+    })
 
     return db_emergency
 
@@ -65,6 +112,7 @@ def create_emergency_contact(
         relationship=contact.relationship
     )
     db.add(db_contact)
+    collection_versions.bump(db, user_id, collection_versions.EMERGENCY_CONTACTS)
     db.commit()
     db.refresh(db_contact)
     return db_contact
@@ -91,6 +139,7 @@ def update_emergency_contact(
     if db_contact:
         for key, value in contact_update.model_dump(exclude_unset=True).items():
             setattr(db_contact, key, value)
+        collection_versions.bump(db, user_id, collection_versions.EMERGENCY_CONTACTS)
         db.commit()
         db.refresh(db_contact)
     return db_contact
@@ -102,5 +151,7 @@ def delete_emergency_contact(
     db_contact = get_emergency_contact(db, contact_id, user_id)
     if db_contact:
         db.delete(db_contact)
+        sync_service.record_deletion(db, user_id, collection_versions.EMERGENCY_CONTACTS, contact_id)
+        collection_versions.bump(db, user_id, collection_versions.EMERGENCY_CONTACTS)
         db.commit()
     return db_contact
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime
+
+from app.config import settings
+from app.services import metrics
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode(data: dict) -> str:
+    return json.dumps(data, default=_json_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def _frame(event_id: str, event_type: str, payload: str) -> bytes:
+    """Codifica un evento en formato Server-Sent Events."""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """Una conexión abierta al stream de eventos de un usuario."""
+
+    # Sin __dict__ ni objetos auxiliares permanentes: con decenas de miles de conexiones
+    # inactivas, cada una solo ocupa este objeto (la lista y el future existen mientras se usan)
+    __slots__ = ("user_id", "pending", "waiter", "closed")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.pending: list[bytes] | None = None
+        self.waiter: asyncio.Future | None = None
+        self.closed = False
+
+    def push(self, frame: bytes) -> None:
+        if self.pending is None:
+            self.pending = [frame]
+        elif len(self.pending) >= settings.EVENTS_MAX_PENDING:
+            # Cliente demasiado lento: se corta y al reconectar se reanuda con Last-Event-ID
+            self.closed = True
+        else:
+            self.pending.append(frame)
+        self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_frames(self) -> list[bytes]:
+        """Espera a que haya frames y los devuelve; lista vacía cuando la conexión se cerró."""
+        while not self.pending and not self.closed:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        frames, self.pending = self.pending or [], None
+        return frames
+
+
+class EventHub:
+    """
+    Pub/sub en memoria para enviar eventos a los usuarios conectados (recordatorios,
+    emergencias, salud, respuestas del chat).
+
+    - Cada evento se serializa una sola vez y el mismo `bytes` se comparte entre todas las
+      conexiones del usuario; cada conexión solo guarda una cola de referencias.
+    - Los latidos los emite una única tarea para todas las conexiones, no un temporizador por conexión.
+    - Se guardan los últimos eventos de cada usuario para reanudar desde `Last-Event-ID`.
+      Los IDs llevan un identificador de arranque: si el cliente trae un ID de otro proceso o
+      demasiado antiguo, recibe un evento `resync` para que vuelva a pedir el estado completo.
+
+    El hub es local al proceso: con varios workers, cada uno entrega los eventos que se
+    publican en él.
+    """
+
+    def __init__(self):
+        self._boot = format(int(time.time()), "x")
+        self._seq = 0
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self._history: OrderedDict[str, deque[tuple[int, bytes]]] = OrderedDict()
+        self._evicted_seq = 0  # último evento de un historial descartado por falta de espacio
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self.published = 0
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        # Se cierran los streams abiertos para que el servidor pueda apagarse
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.EVENTS_HEARTBEAT_SECONDS)
+            for subscriptions in list(self._subscriptions.values()):
+                for subscription in list(subscriptions):
+                    subscription.push(HEARTBEAT_FRAME)
+
+    # --- Publicación ---
+
+    def publish(self, user_id: str, event_type: str, data: dict) -> None:
+        """Publica un evento para un usuario. Se puede llamar desde cualquier hilo."""
+        loop = self._loop
+        if loop is None:
+            return
+        # El JSON se genera en el hilo que publica; el ID se asigna en el event loop para
+        # que el orden de los IDs sea el orden de entrega
+        payload = _encode(data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(user_id, event_type, payload)
+        else:
+            loop.call_soon_threadsafe(self._deliver, user_id, event_type, payload)
+
+    def _deliver(self, user_id: str, event_type: str, payload: str) -> None:
+        # Solo se ejecuta en el hilo del event loop
+        self._seq += 1
+        seq = self._seq
+        frame = _frame(f"{self._boot}-{seq}", event_type, payload)
+        history = self._history.get(user_id)
+        if history is None:
+            history = self._history[user_id] = deque(maxlen=settings.EVENTS_HISTORY_SIZE)
+            if len(self._history) > settings.EVENTS_HISTORY_USERS:
+                _, evicted = self._history.popitem(last=False)
+                if evicted:
+                    self._evicted_seq = max(self._evicted_seq, evicted[-1][0])
+        else:
+            self._history.move_to_end(user_id)
+        history.append((seq, frame))
+        self.published += 1
+        for subscription in self._subscriptions.get(user_id, ()):
+            subscription.push(frame)
+
+    # --- Suscripción ---
+
+    def subscribe(self, user_id: str, last_event_id: str | None = None) -> Subscription:
+        """Abre una suscripción; si trae `last_event_id`, primero recibe lo que se perdió."""
+        subscription = Subscription(user_id)
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def _replay(self, subscription: Subscription, last_event_id: str) -> None:
+        boot, _, seq = last_event_id.partition("-")
+        history = self._history.get(subscription.user_id, ())
+        if boot != self._boot or not seq.isdigit():
+            subscription.push(_frame(f"{self._boot}-{self._seq}", "resync", _encode({"motivo": "reinicio"})))
+            return
+        last_seq = int(seq)
+        # Si el historial se recortó (o se descartó) después del último evento visto, pueden faltar eventos
+        truncated = history and len(history) == history.maxlen and history[0][0] > last_seq
+        if truncated or (not history and last_seq < self._evicted_seq):
+            subscription.push(_frame(f"{self._boot}-{self._seq}", "resync", _encode({"motivo": "historial_agotado"})))
+            return
+        for event_seq, frame in history:
+            if event_seq > last_seq:
+                subscription.push(frame)
+
+    def stats(self) -> dict:
+        return {
+            "conexiones": sum(len(s) for s in self._subscriptions.values()),
+            "usuarios_conectados": len(self._subscriptions),
+            "usuarios_con_historial": len(self._history),
+            "eventos_publicados": self.published,
+        }
+
+
+hub = EventHub()
+
+
+def _collect_metrics() -> list[str]:
+    stats = hub.stats()
+    return (
+        metrics.format_family("events_connections", "gauge", "Conexiones SSE abiertas.", [("", {}, stats["conexiones"])])
+        + metrics.format_family("events_published_total", "counter", "Eventos publicados en el hub.", [("", {}, stats["eventos_publicados"])])
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
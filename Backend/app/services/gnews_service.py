@@ -1,25 +1,41 @@
+import functools
+import logging
 import requests
 from typing import Optional, List, Dict
+from app.config import settings
+from app.services.resilience import get_provider, ProviderError
 
-class GNewsService:
-    BASE_URL = "https://gnews.io/api/v4/search"
+logger = logging.getLogger(__name__)
 
-    def __init__(self, api_key: str):
+class GNewsService:
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
         self.api_key = api_key
+        self.base_url = base_url or f"{settings.GNEWS_API_URL.rstrip('/')}/search"
+        self.provider = get_provider("gnews", timeout=settings.GNEWS_TIMEOUT)
 
     def get_news(self, query: str, lang: str = "es", max_results: int = 5) -> Optional[List[Dict]]:
+        # Si el proveedor falla o el circuito está abierto se devuelven las últimas noticias buenas (o None)
+        return self.provider.call(
+            self._fetch_news, query, lang, max_results, fallback_key=(query.lower(), lang, max_results)
+        )
+
+    def _fetch_news(self, query: str, lang: str, max_results: int) -> Optional[List[Dict]]:
         params = {
             "q": query,
             "lang": lang,
             "max": max_results,
             "token": self.api_key
         }
-        print(f"[GNewsService] Requesting URL: {self.BASE_URL} with params {params}")
-        response = requests.get(self.BASE_URL, params=params)
-        print(f"[GNewsService] Response Status Code: {response.status_code}")
+        # Sin el token: no debe acabar en los logs
+        logger.debug("Consultando noticias: %s", query, extra={"lang": lang, "max": max_results})
+        response = requests.get(self.base_url, params=params, timeout=self.provider.timeout)
+        logger.debug("Respuesta de GNews: HTTP %s", response.status_code)
+        if response.status_code >= 500 or response.status_code == 429:
+            raise ProviderError(f"HTTP {response.status_code}")
         if response.status_code == 200:
             data = response.json()
-            print(f"[GNewsService] Raw API Response: {data}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Respuesta completa de GNews", extra={"payload": data})
             # Filtrar solo los campos esenciales para el front: título y url
             if "articles" in data:
                 filtered = [
@@ -31,7 +47,13 @@ class GNewsService:
                 ]
                 return filtered
             else:
-                print("[GNewsService] 'articles' key not found in response.")
+                logger.warning("La respuesta de GNews no incluye 'articles'")
         else:
-            print(f"[GNewsService] API Error: {response.text}")
+            logger.warning("Error de la API de GNews: HTTP %s", response.status_code, extra={"body": response.text})
         return None
+
+
+@functools.cache
+def get_service() -> GNewsService:
+    """Instancia compartida, creada en el primer uso."""
+    return GNewsService(settings.GNEWS_API_KEY)
@@ -1,20 +1,38 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.services.database import HealthRecord
+from app.services import collection_versions, sync_service
+from app.services.event_hub import hub
+from app.services.user_context import store as user_context
+
+def _record_event(record: HealthRecord) -> dict:
+    return {"id": record.id, "parameter": record.parameter, "value": record.value, "timestamp": record.timestamp}
 
 def save_health_data(
-    db: Session, user_id: str, parameter: str, value: str, timestamp: str = None
+    db: Session, user_id: str, parameter: str, value: str, timestamp: str = None, commit: bool = True
 ) -> HealthRecord:
-    """Guarda un nuevo registro de salud en la base de datos."""
+    """
+    Guarda un nuevo registro de salud en la base de datos.
+    Con commit=False solo lo añade a la sesión: el llamador confirma y después llama a `notify_created`.
+    """
     if timestamp is None:
         timestamp = datetime.utcnow()
 
     db_health_record = HealthRecord(user_id=user_id, parameter=parameter, value=value, timestamp=timestamp)
     db.add(db_health_record)
+    collection_versions.bump(db, user_id, collection_versions.HEALTH)
+    if not commit:
+        return db_health_record
     db.commit()
     db.refresh(db_health_record)
+    notify_created(db_health_record)
     return db_health_record
 
+def notify_created(record: HealthRecord) -> None:
+    """Avisa a los dispositivos del usuario de un registro ya confirmado."""
+    hub.publish(record.user_id, "health.created", _record_event(record))
+    user_context.add_health_record(record)
+
 def get_health_data(db: Session, user_id: str) -> list[HealthRecord]:
     """Obtiene todos los registros de salud de un usuario."""
     return db.query(HealthRecord).filter(HealthRecord.user_id == user_id).order_by(HealthRecord.timestamp.desc()).all()
@@ -25,8 +43,11 @@ def update_health_data(db: Session, record_id: int, parameter: str, value: str)
     if db_record:
         db_record.parameter = parameter
         db_record.value = value
+        collection_versions.bump(db, db_record.user_id, collection_versions.HEALTH)
         db.commit()
         db.refresh(db_record)
+        hub.publish(db_record.user_id, "health.updated", _record_event(db_record))
+        user_context.invalidate(db_record.user_id)
     return db_record
 
 def delete_health_data(db: Session, record_id: int) -> bool:
@@ -34,6 +55,10 @@ def delete_health_data(db: Session, record_id: int) -> bool:
     db_record = db.query(HealthRecord).filter(HealthRecord.id == record_id).first()
     if db_record:
         db.delete(db_record)
+        sync_service.record_deletion(db, db_record.user_id, collection_versions.HEALTH, record_id)
+        collection_versions.bump(db, db_record.user_id, collection_versions.HEALTH)
         db.commit()
+        hub.publish(db_record.user_id, "health.deleted", {"id": record_id})
+        user_context.invalidate(db_record.user_id)
         return True
     return False
@@ -0,0 +1,209 @@
+"""
+Elección del modelo del LLM para cada mensaje del chat.
+
+Antes de llamar al LLM se estima la intención del mensaje con reglas locales (el detector de
+emergencias y las palabras de `user_context`) y se elige la primera ruta que encaje por
+intención esperada y largo del mensaje. Cada ruta tiene:
+
+- una cadena de modelos (modelo, max_tokens, temperatura y plazo de cada intento): si un
+  intento se pasa de plazo, falla o devuelve un JSON inválido se prueba el siguiente;
+- un presupuesto de latencia para toda la cadena: ningún intento pasa de lo que queda;
+- el modelo local (LLM_LOCAL_BASE_URL, compatible con la API de OpenAI) al final, como
+  último recurso, con su propio plazo (LLM_LOCAL_TIMEOUT) fuera del presupuesto.
+
+Por encima de todo está el plazo de la petición (CHAT_DEADLINE_SECONDS): si se agota o no
+responde nadie, contesta `degraded_responder`.
+
+Las rutas por defecto están en DEFAULT_ROUTES; LLM_ROUTES_FILE las sustituye por las de un
+fichero JSON con el mismo formato ({"routes": [...], "prices": {...}}). La última ruta
+recoge los mensajes que no encajen en ninguna.
+
+Por ruta se anotan en /metrics los intentos por modelo y resultado, quién acabó respondiendo,
+si la intención esperada coincidió con la del LLM, la duración y el coste estimado.
+"""
+import json
+import re
+import unicodedata
+from dataclasses import dataclass, replace
+
+from app.config import settings
+from app.services import emergency_detector, metrics, user_context
+
+OPENAI = "openai"
+LOCAL = "local"
+
+# Resultados de un intento
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+INVALID_JSON = "invalid_json"
+SHORT_CIRCUITED = "short_circuited"
+
+DEFAULT_ROUTES = [
+    # Alertas: respuesta corta y rápida, el aviso a los contactos no depende del LLM
+    {"name": "emergencia", "intents": ["EMERGENCIA"], "budget": 6,
+     "chain": [{"model": "gpt-4o-mini", "max_tokens": 200, "timeout": 3, "temperature": 0.3},
+               {"model": "gpt-4o-mini", "max_tokens": 200, "timeout": 3, "temperature": 0.3}]},
+    # "Gracias", "hola", "adiós"
+    {"name": "breve", "intents": ["CONVERSACION_GENERAL"], "max_chars": 60, "budget": 5,
+     "chain": [{"model": "gpt-4o-mini", "max_tokens": 150, "timeout": 5}]},
+    # Preguntas de salud o de información largas: mejor modelo, con respaldo más barato
+    {"name": "detallada", "intents": ["SALUD", "INFORMACION"], "min_chars": 120, "budget": 15,
+     "chain": [{"model": "gpt-4o", "max_tokens": 600, "timeout": 9},
+               {"model": "gpt-4o-mini", "max_tokens": 600, "timeout": 6}]},
+    {"name": "general", "budget": 10,
+     "chain": [{"model": "gpt-4o-mini", "max_tokens": 400, "timeout": 6},
+               {"model": "gpt-4o-mini", "max_tokens": 400, "timeout": 4}]},
+]
+
+# USD por millón de tokens (entrada, salida); los modelos que no están cuentan como gratis
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Más estricto que `user_context.temas` ("hoy" o "mañana" no bastan para esperar un recordatorio)
+_RECORDATORIO = re.compile(
+    r"\b(recuerd\w*|recordatorio\w*|recordar\w*|agenda\w*|cita|tengo que|tenia que|pastilla\w*|medicamento\w*)\b"
+)
+_INFORMACION = re.compile(
+    r"\b(que es|que son|cual es|cuales son|como (funciona|se hace)|por que|explica\w*|cuentame sobre|"
+    r"clima|tiempo hace|noticia\w*)\b"
+)
+
+ATTEMPTS = metrics.Counter("llm_route_attempts_total", "Intentos de cada ruta del LLM por modelo y resultado.", ("route", "model", "result"))
+RESPONSES = metrics.Counter("llm_route_responses_total", "Respuestas de cada ruta del LLM según qué intento respondió.", ("route", "served_by"))
+INTENT_MATCH = metrics.Counter(
+    "llm_route_intent_total", "Coincidencia entre la intención esperada (reglas locales) y la del LLM, por ruta.", ("route", "match"),
+)
+DURATION = metrics.Histogram("llm_route_duration_seconds", "Duración de la cadena de cada ruta del LLM.", ("route",))
+COST = metrics.Counter("llm_route_cost_usd_total", "Coste estimado del LLM por ruta y modelo (USD).", ("route", "model"))
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+@dataclass(frozen=True)
+class Target:
+    model: str
+    max_tokens: int
+    timeout: float
+    temperature: float = 0.7
+    endpoint: str = OPENAI
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    chain: tuple[Target, ...]
+    budget: float
+    intents: frozenset[str] = frozenset()
+    min_chars: int = 0
+    max_chars: int | None = None
+
+    def matches(self, intent: str, length: int) -> bool:
+        return (
+            (not self.intents or intent in self.intents)
+            and length >= self.min_chars
+            and (self.max_chars is None or length <= self.max_chars)
+        )
+
+
+def expected_intent(mensaje: str) -> str:
+    """Intención probable del mensaje según reglas locales (sin red, microsegundos)."""
+    deteccion = emergency_detector.detectar(mensaje)
+    if deteccion is not None and deteccion.alerta:
+        return "EMERGENCIA"
+    texto = _normalizar(mensaje)
+    if deteccion is not None or user_context.SALUD in user_context.temas(mensaje):
+        return "SALUD"
+    if _RECORDATORIO.search(texto):
+        return "RECORDATORIO"
+    if _INFORMACION.search(texto):
+        return "INFORMACION"
+    return "CONVERSACION_GENERAL"
+
+
+def _parse_route(raw: dict, local: Target | None) -> Route:
+    try:
+        chain = tuple(
+            Target(
+                model=t["model"],
+                max_tokens=int(t.get("max_tokens", 400)),
+                timeout=float(t.get("timeout", 6)),
+                temperature=float(t.get("temperature", 0.7)),
+            )
+            for t in raw["chain"]
+        )
+        if not chain:
+            raise ValueError("cadena vacía")
+        if local is not None:
+            # El modelo local responde con los mismos límites que el último de la cadena
+            local = replace(local, max_tokens=chain[-1].max_tokens, temperature=chain[-1].temperature)
+        return Route(
+            name=raw["name"],
+            chain=chain + ((local,) if local is not None else ()),
+            budget=float(raw.get("budget", sum(t.timeout for t in chain))),
+            intents=frozenset(raw.get("intents", ())),
+            min_chars=int(raw.get("min_chars", 0)),
+            max_chars=int(raw["max_chars"]) if raw.get("max_chars") is not None else None,
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Ruta del LLM no válida ({raw.get('name', '?')}): {e}") from e
+
+
+class Router:
+    """Rutas del LLM y contabilidad por ruta."""
+
+    def __init__(self, routes: list[dict], prices: dict[str, tuple[float, float]], local: Target | None = None):
+        if not routes:
+            raise ValueError("No hay rutas del LLM configuradas")
+        self.routes = [_parse_route(raw, local) for raw in routes]
+        self.prices = {model: (float(p[0]), float(p[1])) for model, p in prices.items()}
+
+    def choose(self, mensaje: str) -> tuple[Route, str]:
+        """La ruta del mensaje y la intención esperada con la que se eligió."""
+        intent = expected_intent(mensaje)
+        length = len(mensaje)
+        route = next((r for r in self.routes if r.matches(intent, length)), self.routes[-1])
+        return route, intent
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+    def record_attempt(self, route: Route, target: Target, result: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        ATTEMPTS.inc(route.name, target.model, result)
+        cost = self.cost(target.model, prompt_tokens, completion_tokens) if target.endpoint == OPENAI else 0.0
+        if cost:
+            COST.inc(route.name, target.model, amount=cost)
+
+    def record_response(self, route: Route, expected: str, served_by: int | None, intent: str | None, seconds: float) -> None:
+        """Cierra la cadena: qué intento respondió (None si ninguno) y qué intención dio el LLM."""
+        if served_by is None:
+            RESPONSES.inc(route.name, "ninguno")
+        elif route.chain[served_by].endpoint == LOCAL:
+            RESPONSES.inc(route.name, "local")
+        else:
+            RESPONSES.inc(route.name, "principal" if served_by == 0 else "respaldo")
+        if intent:
+            INTENT_MATCH.inc(route.name, "si" if intent == expected else "no")
+        DURATION.observe(seconds, route.name)
+
+
+def _load() -> Router:
+    routes, prices = DEFAULT_ROUTES, dict(DEFAULT_PRICES)
+    if settings.LLM_ROUTES_FILE:
+        with open(settings.LLM_ROUTES_FILE, encoding="utf-8") as f:
+            config = json.load(f)
+        routes = config.get("routes", routes)
+        prices.update(config.get("prices", {}))
+    local = None
+    if settings.LLM_LOCAL_BASE_URL:
+        local = Target(model=settings.LLM_LOCAL_MODEL, max_tokens=0, timeout=settings.LLM_LOCAL_TIMEOUT, endpoint=LOCAL)
+    return Router(routes, prices, local)
+
+
+router = _load()
@@ -1,42 +1,135 @@
 import json
-from openai import AsyncOpenAI
+import asyncio
+import logging
+import time
 from app.config import settings
 from app.models.chat_schemas import ConversationItem
 from app.services.database import ConversationHistory, get_db
 from sqlalchemy.orm import Session
 from typing import Optional, Dict
-from .weather_service import WeatherAPIService
-from .gnews_service import GNewsService
+from app.services import weather_service, gnews_service
+from app.services import metrics
+from app.services.cache import Cache
+from app.services.usage_service import accountant as usage
+from app.services.admission import llm_gate, NORMAL
+from app.services.chat_writer import writer as chat_writer
+from app.services.conversation_buffer import buffer as conversation_buffer, MAX_CONTEXT_MESSAGES
+from app.services import user_context
+from app.services import llm_router, degraded_responder
+from app.services.llm_router import router
+from app.services.resilience import get_provider
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-# Caché en memoria para respuestas del LLM
-llm_cache = {}
+_clients: dict = {}
 
-# Configuración: máximo de mensajes de contexto
-MAX_CONTEXT_MESSAGES = 10
+# Circuit breaker de cada endpoint del LLM: con el circuito abierto los intentos se saltan
+# sin tocar la red (provider_* en /metrics)
+_providers = {
+    llm_router.OPENAI: get_provider("openai", timeout=settings.CHAT_DEADLINE_SECONDS),
+    llm_router.LOCAL: get_provider("llm_local", timeout=settings.LLM_LOCAL_TIMEOUT),
+}
+
+DEGRADED = metrics.Counter(
+    "llm_degraded_responses_total", "Respuestas del chat dadas sin LLM (modo degradado) por motivo.", ("reason",),
+)
+
+
+def get_client(endpoint: str = llm_router.OPENAI):
+    """
+    Cliente de OpenAI (o del modelo local), creado en el primer uso: importar `openai` cuesta
+    más de medio segundo en frío. Sin reintentos propios: los hace la cadena de la ruta.
+    """
+    client = _clients.get(endpoint)
+    if client is None:
+        from openai import AsyncOpenAI
+        if endpoint == llm_router.LOCAL:
+            client = AsyncOpenAI(api_key=settings.LLM_LOCAL_API_KEY, base_url=settings.LLM_LOCAL_BASE_URL, max_retries=0)
+        else:
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+        _clients[endpoint] = client
+    return client
+
+
+async def close_client() -> None:
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
+
+
+async def ping(timeout: float) -> None:
+    """
+    Comprueba que la API de OpenAI responde (sin consumir tokens) y deja abierta la conexión
+    del pool del cliente. Cualquier respuesta HTTP, aunque sea un error, cuenta como alcanzable.
+    """
+    from openai import APIStatusError
+    try:
+        await get_client().with_options(timeout=timeout, max_retries=0).models.list()
+    except APIStatusError:
+        pass
+
+# Caché de respuestas del LLM (compartida entre workers si CACHE_BACKEND no es "memory").
+# Subir la versión si cambia el prompt o el formato de la respuesta.
+llm_cache = Cache("llm", version=1, ttl=settings.LLM_CACHE_TTL_SECONDS)
 
 async def get_recent_conversation_history(user_id: str, db: Session, max_messages: int = MAX_CONTEXT_MESSAGES):
-    """Obtiene los últimos N mensajes de la conversación del usuario desde la base de datos."""
+    """
+    Obtiene los últimos N mensajes de la conversación del usuario desde la base de datos.
+    La consulta corre en un hilo y la conexión vuelve al pool al terminar: esperar una
+    conexión desde el bucle de eventos lo bloquearía.
+    """
+    return await asyncio.to_thread(_recent_history, user_id, db, max_messages)
+
+def _recent_history(user_id: str, db: Session, max_messages: int) -> list[ConversationItem]:
     history = db.query(ConversationHistory).filter(ConversationHistory.user_id == user_id).order_by(ConversationHistory.id.desc()).limit(max_messages).all()
     # Invertir para que estén en orden cronológico
-    return [ConversationItem(role=h.role, content=h.content) for h in reversed(history)]
+    items = [ConversationItem(role=h.role, content=h.content) for h in reversed(history)]
+    db.commit()
+    return items
 
 async def generate_response(
     mensaje_usuario: str,
     fechas: list = None,
     conversation_history: list[ConversationItem] = None,
     user_id: str = None,
-    db: Session = None
+    db: Session = None,
+    priority: int = NORMAL,
+    deadline: float | None = None,
 ) -> dict:
+    """
+    Respuesta del LLM ({"intencion", "emocion", "respuesta"}). `deadline` (time.monotonic) es
+    el plazo para tenerla, contando la espera en la cola; por defecto CHAT_DEADLINE_SECONDS
+    desde ahora. Si el LLM no responde a tiempo, la respuesta es la del modo degradado.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + settings.CHAT_DEADLINE_SECONDS
     # Si no se pasa un historial, obtenerlo de la base de datos (persistencia)
     if conversation_history is None and user_id and db:
-        conversation_history = await get_recent_conversation_history(user_id, db)
+        with metrics.stage("history"):
+            conversation_history = conversation_buffer.get(user_id)
+            if conversation_history is None:
+                conversation_buffer.begin_fill(user_id)
+                # Los turnos anteriores del usuario pueden estar aún en la cola de escrituras
+                await chat_writer.barrier(user_id)
+                conversation_history = await get_recent_conversation_history(user_id, db)
+                conversation_buffer.fill(user_id, conversation_history)
 
     # Limitar el tamaño del historial (optimización)
     if conversation_history:
         conversation_history = conversation_history[-MAX_CONTEXT_MESSAGES:]
 
+    # Recordatorios y mediciones del usuario, solo si el mensaje habla de ellos
+    contexto = ""
+    temas = user_context.temas(mensaje_usuario) if user_id and db else set()
+    if temas:
+        with metrics.stage("user_context"):
+            # Lo que el chat acaba de encolar (un recordatorio, una medición) entra en la foto al escribirse
+            await chat_writer.barrier(user_id)
+            snapshot = user_context.store.get(user_id)
+            if snapshot is None:
+                snapshot = await asyncio.to_thread(user_context.store.load, user_id)
+        contexto = user_context.render(snapshot, temas)
+
     # Generar una clave única para la caché
     fechas_json = json.dumps(fechas, sort_keys=True) if fechas else ""
     history_json = (
@@ -44,12 +137,17 @@ async def generate_response(
         if conversation_history
         else ""
     )
-    cache_key = (mensaje_usuario, fechas_json, history_json)
+    cache_key = (mensaje_usuario, fechas_json, history_json, contexto)
+
+    # Modelo, max_tokens y plazos según la intención esperada y el largo del mensaje
+    route, expected = router.choose(mensaje_usuario)
 
     # Intentar obtener la respuesta de la caché
-    if cache_key in llm_cache:
-        print("[DEBUG] Respondiendo desde la caché del LLM.")
-        return llm_cache[cache_key]
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Respondiendo desde la caché del LLM")
+        usage.record(user_id, cached.get("intencion"), route.chain[0].model, cache_hit=True)
+        return cached
 
     # Construir el prompt del sistema
     system_prompt = """
@@ -88,6 +186,8 @@ async def generate_response(
 
     # Construir los mensajes para la API de OpenAI
     messages_for_openai = [{"role": "system", "content": system_prompt}]
+    if contexto:
+        messages_for_openai.append({"role": "system", "content": contexto})
 
     # Añadir el historial de conversación
     if conversation_history:
@@ -106,45 +206,135 @@ async def generate_response(
             }
         )
 
+    # Mientras espera turno y respuesta, la petición no retiene una conexión del pool de la base de datos
+    if db is not None:
+        db.commit()
+
+    # Turno en la cola del LLM; lanza admission.Overloaded si está llena o la espera es excesiva.
+    # Si el plazo se acaba antes de tener turno, se responde sin LLM
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages_for_openai,
-            response_format={"type": "json_object"},
-            temperature=0.7, # Un poco de creatividad para que no suene tan robótico
-        )
+        await asyncio.wait_for(llm_gate.acquire(priority), max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        DEGRADED.inc("queue")
+        logger.warning("Sin turno en la cola del LLM dentro del plazo", extra={"user_id": user_id})
+        return degraded_responder.respond(mensaje_usuario, fechas, contexto)
+    started = time.perf_counter()
+    try:
+        parsed_response, served_by, results = await _complete(route, messages_for_openai, user_id, deadline)
+    finally:
+        llm_gate.release(time.perf_counter() - started)
+    router.record_response(
+        route, expected, served_by, parsed_response.get("intencion") if parsed_response else None, time.perf_counter() - started
+    )
 
-        llm_response_content = response.choices[0].message.content.strip()
+    if parsed_response is None:
+        # Sin respuesta del LLM: reglas locales, que aun así guardan recordatorios y avisan de emergencias
+        if results and all(r == llm_router.SHORT_CIRCUITED for r in results):
+            reason = "circuit_open"
+        elif not results or llm_router.TIMEOUT in results:
+            reason = "timeout"
+        else:
+            reason = "error"
+        DEGRADED.inc(reason)
+        logger.warning("Respuesta del chat en modo degradado", extra={"user_id": user_id, "reason": reason, "route": route.name})
+        return degraded_responder.respond(mensaje_usuario, fechas, contexto)
 
-        try:
-            parsed_response = json.loads(llm_response_content)
-            # Almacenar la respuesta en la caché antes de devolverla
-            llm_cache[cache_key] = parsed_response
-            return parsed_response
-        except json.JSONDecodeError:
-            print(f"[❌ LLM JSON ERROR] No se pudo parsear la respuesta del LLM: {llm_response_content}")
-            # Fallback a una respuesta genérica si el JSON del LLM es inválido
-            return {
-                "intencion": "CONVERSACION_GENERAL",
-                "respuesta": "Lo siento, me está costando un poco entenderte. ¿Podrías decírmelo de otra manera?",
-            }
+    # Almacenar la respuesta en la caché antes de devolverla
+    await llm_cache.set(cache_key, parsed_response)
+    return parsed_response
+
+async def _complete(
+    route: llm_router.Route, messages: list[dict], user_id: str | None, deadline: float
+) -> tuple[dict | None, int | None, list[str]]:
+    """
+    Recorre la cadena de la ruta hasta obtener una respuesta válida, sin pasarse del presupuesto
+    de la ruta (el modelo local tiene su propio plazo) ni del plazo de la petición. Devuelve la
+    respuesta, el intento que respondió y el resultado de cada intento.
+    """
+    budget_end = min(time.monotonic() + route.budget, deadline)
+    results = []
+    for index, target in enumerate(route.chain):
+        end = deadline if target.endpoint == llm_router.LOCAL else budget_end
+        timeout = min(target.timeout, end - time.monotonic())
+        if timeout <= 0:
+            continue
+        parsed, result = await _attempt(route, target, timeout, messages, user_id)
+        results.append(result)
+        if parsed is not None:
+            return parsed, index, results
+    return None, None, results
 
+async def _attempt(route: llm_router.Route, target: llm_router.Target, timeout: float, messages: list[dict], user_id: str | None) -> tuple[dict | None, str]:
+    """
+    Un intento de la cadena: la respuesta JSON (o None) y el resultado. Al pasar el plazo se
+    cancela la llamada (se cierra la conexión). Los timeouts y errores cuentan como fallos para
+    el circuit breaker del endpoint; un JSON inválido no.
+    """
+    provider = _providers[target.endpoint]
+    if not provider.allow():
+        router.record_attempt(route, target, llm_router.SHORT_CIRCUITED)
+        return None, llm_router.SHORT_CIRCUITED
+    started = time.perf_counter()
+    parsed, tokens = None, {}
+    try:
+        with metrics.stage("openai" if target.endpoint == llm_router.OPENAI else "llm_local"):
+            response = await asyncio.wait_for(
+                get_client(target.endpoint).chat.completions.create(
+                    model=target.model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    temperature=target.temperature,
+                    max_tokens=target.max_tokens,
+                ),
+                timeout,
+            )
+    except asyncio.CancelledError:
+        # Plazo del chat agotado: no es culpa del proveedor, pero se libera su hueco de prueba
+        provider.release()
+        raise
+    except asyncio.TimeoutError as e:
+        result = llm_router.TIMEOUT
+        provider.record_failure(started, e)
+        logger.warning("El LLM no respondió a tiempo", extra={"route": route.name, "model": target.model, "timeout_s": round(timeout, 2)})
     except Exception as e:
-        print(f"[❌ LLM ERROR] {e}")
-        # Fallback a una respuesta de error genérica
-        return {
-            "intencion": "CONVERSACION_GENERAL",
-            "respuesta": "Uhm, parece que tengo un pequeño problema técnico. Por favor, inténtalo de nuevo en un momento.",
-        }
+        result = llm_router.ERROR
+        provider.record_failure(started, e)
+        logger.error("Error llamando al LLM: %s", e, extra={"error_type": type(e).__name__, "route": route.name, "model": target.model})
+    else:
+        provider.record_success(started)
+        if response.usage:
+            metrics.LLM_TOKENS.inc("prompt", amount=response.usage.prompt_tokens)
+            metrics.LLM_TOKENS.inc("completion", amount=response.usage.completion_tokens)
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            tokens = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": (details.cached_tokens or 0) if details else 0,
+            }
+        llm_response_content = (response.choices[0].message.content or "").strip()
+        try:
+            parsed = json.loads(llm_response_content)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, dict):
+            result = llm_router.OK
+        else:
+            parsed, result = None, llm_router.INVALID_JSON
+            logger.error("No se pudo parsear la respuesta del LLM", extra={"body": llm_response_content, "model": target.model})
+    metrics.LLM_REQUESTS.inc(result)
+    router.record_attempt(route, target, result, tokens.get("prompt_tokens", 0), tokens.get("completion_tokens", 0))
+    usage.record(
+        user_id, parsed.get("intencion") if parsed else None, target.model,
+        latency_ms=(time.perf_counter() - started) * 1000, error=parsed is None, **tokens,
+    )
+    return parsed, result
 
 async def get_weather_info_from_llm(location: str) -> Optional[Dict]:
-    """Obtiene el clima usando WeatherAPIService y lo devuelve en formato resumido para el LLM o el frontend."""
-    # Usa la misma key que en external.py
-    api_key = "6de1f0c88d044f2284e143213252205"
-    weather_service = WeatherAPIService(api_key)
-    return weather_service.get_weather(location)
+    """Obtiene el clima usando WeatherAPIService y lo devuelve en formato resumido para el LLM o el frontend.
+
+    El cliente HTTP es síncrono: se llama en un hilo para no bloquear el bucle de eventos.
+    """
+    return await asyncio.to_thread(weather_service.get_service().get_weather, location)
 
 async def get_news_info_from_llm(query: str):
-    api_key = "1f7255a0ebcff7789b11a3e6128cf40f"
-    gnews_service = GNewsService(api_key)
-    return gnews_service.get_news(query)
\ No newline at end of file
+    return await asyncio.to_thread(gnews_service.get_service().get_news, query)
\ No newline at end of file
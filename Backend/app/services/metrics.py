@@ -0,0 +1,229 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (GET /metrics).
+
+Implementación mínima y sin dependencias: contadores e histogramas con etiquetas, más
+"colectores" que leen el estado de otros servicios (proveedores, pool de la base de datos,
+outbox, SSE) solo cuando se piden las métricas, sin coste en el camino de las peticiones.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Cubetas en segundos: de 5 ms (consultas) a 10 s (LLM lento)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Muestra: (sufijo del nombre, etiquetas, valor)
+Sample = tuple[str, dict, float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def format_family(name: str, kind: str, documentation: str, samples: Iterable[Sample]) -> list[str]:
+    """Líneas de texto de una familia de métricas."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text else f"{name}{suffix} {_format_value(value)}")
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list["_Metric"] = []
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], list[str]]) -> None:
+        """`collector` devuelve líneas ya formateadas (ver `format_family`)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += format_family(metric.name, metric.kind, metric.documentation, metric.samples())
+        for collector in self._collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                # Un colector roto no debe dejar sin métricas al resto
+                logger.exception("Error en un colector: %s", e)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _labels(self, values: tuple) -> dict:
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("", self._labels(labels), value) for labels, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Por etiquetas: [conteos por cubeta (la última es +Inf), suma, total]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+        samples = []
+        for labels, (counts, total, count) in items:
+            samples += histogram_samples(self._labels(labels), self.buckets, counts, total, count)
+        return samples
+
+
+def histogram_samples(labels: dict, buckets: tuple[float, ...], counts: list[int], total: float, count: int) -> list[Sample]:
+    """Muestras de un histograma a partir de conteos no acumulados (la última cubeta es +Inf)."""
+    samples, cumulative = [], 0
+    for bound, n in zip(buckets + (float("inf"),), counts):
+        cumulative += n
+        samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+    samples.append(("_sum", labels, total))
+    samples.append(("_count", labels, count))
+    return samples
+
+
+# --- Métricas de la aplicación ---
+
+HTTP_REQUESTS = Counter("http_requests_total", "Peticiones HTTP atendidas.", ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Duración de las peticiones HTTP por ruta.", ("method", "route"))
+STAGE_DURATION = Histogram("app_stage_duration_seconds", "Duración de cada etapa del procesamiento de una petición.", ("stage",))
+LLM_REQUESTS = Counter("llm_requests_total", "Llamadas al LLM por resultado.", ("result",))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumidos en el LLM.", ("kind",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Consultas a cachés internas (hit/miss).", ("cache", "result"))
+EMERGENCY_ALERT_LATENCY = Histogram(
+    "emergency_alert_seconds", "Desde que llega el mensaje hasta que la emergencia queda registrada y sus avisos encolados.", ("via",)
+)
+EMERGENCY_FAST_LANE = Counter("emergency_fast_lane_total", "Alertas de la vía rápida del chat por veredicto del LLM.", ("result",))
+
+
+@contextmanager
+def stage(name: str):
+    """Mide una etapa: `with metrics.stage("openai"): ...` (también con `await` dentro)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, name)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def route_template(scope) -> str:
+    """
+    Plantilla de la ruta atendida, con el prefijo del router incluido. Según la versión de
+    FastAPI, `scope["route"].path` puede no llevar el prefijo de `include_router`: se recupera
+    buscando el sufijo de la URL que encaja con la ruta.
+    """
+    route = scope.get("route")
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is None:
+        return "sin_ruta"
+    path = scope["path"]
+    start = 0
+    while start != -1:
+        if path_regex.match(path[start:]):
+            return path[:start] + route.path
+        start = path.find("/", start + 1)
+    return route.path
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que cuenta las peticiones y mide su duración por plantilla de ruta
+    (`/reminders/{reminder_id}`, no la URL concreta, para no disparar la cardinalidad).
+    """
+
+    # Conexiones largas: se cuentan pero su duración no es latencia
+    UNTIMED_ROUTES = {"/events/stream"}
+
+    def __init__(self, app):
+        self.app = app
+        self.in_progress = 0
+        registry.add_collector(self._collect)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.in_progress += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.in_progress -= 1
+            path = route_template(scope)
+            HTTP_REQUESTS.inc(scope["method"], path, str(status_code))
+            if path not in self.UNTIMED_ROUTES:
+                HTTP_DURATION.observe(time.perf_counter() - started, scope["method"], path)
+
+    def _collect(self) -> list[str]:
+        return format_family("http_requests_in_progress", "gauge", "Peticiones HTTP en curso.", [("", {}, self.in_progress)])
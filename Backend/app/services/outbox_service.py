@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services import metrics
+from app.services.database import SessionLocal, OutboundMessage
+from app.services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que un mensaje ya no se vuelve a intentar
+FINAL_STATUSES = ("enviado", "fallido", "cancelado")
+
+
+@dataclass
+class OutboxMessage:
+    """Copia de un mensaje de la bandeja de salida, independiente de la sesión de base de datos."""
+    id: int
+    channel: str
+    recipient: str
+    body: str
+    reference: str | None
+    status: str
+    attempts: int
+    max_attempts: int
+    provider_id: str | None = None
+    last_error: str | None = None
+    sent_at: datetime | None = None
+
+    @classmethod
+    def from_row(cls, row: OutboundMessage) -> "OutboxMessage":
+        return cls(
+            id=row.id, channel=row.channel, recipient=row.recipient, body=row.body,
+            reference=row.reference, status=row.status, attempts=row.attempts,
+            max_attempts=row.max_attempts, provider_id=row.provider_id,
+            last_error=row.last_error, sent_at=row.sent_at,
+        )
+
+
+def enqueue_message(
+    db: Session,
+    channel: str,
+    recipient: str,
+    body: str,
+    idempotency_key: str,
+    reference: str | None = None,
+    commit: bool = True,
+    not_before: datetime | None = None,
+) -> OutboundMessage:
+    """
+    Guarda un mensaje en la bandeja de salida. Si ya existe uno con la misma clave de
+    idempotencia se devuelve el existente en vez de duplicarlo.
+    Con `commit=False` el mensaje queda en la transacción del llamador (ej: junto a la emergencia).
+    Con `not_before` no se envía antes de esa hora (UTC), salvo que se libere con `release_messages`.
+    """
+    existing = db.query(OutboundMessage).filter(OutboundMessage.idempotency_key == idempotency_key).first()
+    if existing:
+        return existing
+    message = OutboundMessage(
+        channel=channel,
+        recipient=recipient,
+        body=body,
+        idempotency_key=idempotency_key,
+        reference=reference,
+        status="pendiente",
+        attempts=0,
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+        next_attempt_at=not_before or datetime.utcnow(),
+    )
+    try:
+        with db.begin_nested():
+            db.add(message)
+    except IntegrityError:
+        # Otra petición insertó la misma clave a la vez
+        return db.query(OutboundMessage).filter(OutboundMessage.idempotency_key == idempotency_key).one()
+    if commit:
+        db.commit()
+        db.refresh(message)
+        dispatcher.wake()
+    # Sin commit, es el llamador quien avisa al dispatcher tras confirmar su transacción
+    return message
+
+
+def cancel_messages(db: Session, reference_prefix: str, commit: bool = True) -> int:
+    """Cancela los mensajes aún no enviados cuya referencia empieza por `reference_prefix`."""
+    result = db.execute(
+        update(OutboundMessage)
+        .where(
+            OutboundMessage.reference.like(f"{reference_prefix}%"),
+            OutboundMessage.status == "pendiente",
+        )
+        .values(status="cancelado")
+    )
+    if commit:
+        db.commit()
+    return result.rowcount
+
+
+def release_messages(db: Session, reference_prefix: str, commit: bool = True) -> int:
+    """Adelanta a ahora los mensajes pendientes y retenidos (`not_before`) cuya referencia empieza por `reference_prefix`."""
+    now = datetime.utcnow()
+    result = db.execute(
+        update(OutboundMessage)
+        .where(
+            OutboundMessage.reference.like(f"{reference_prefix}%"),
+            OutboundMessage.status == "pendiente",
+            OutboundMessage.attempts == 0,
+            OutboundMessage.next_attempt_at > now,
+        )
+        .values(next_attempt_at=now)
+    )
+    if commit:
+        db.commit()
+        dispatcher.wake()
+    return result.rowcount
+
+
+def get_messages_by_reference(db: Session, reference_prefix: str) -> list[OutboundMessage]:
+    return db.query(OutboundMessage).filter(OutboundMessage.reference.like(f"{reference_prefix}%")).all()
+
+
+class OutboxDispatcher:
+    """
+    Worker que envía los mensajes pendientes de la bandeja de salida.
+
+    - Reclama lotes con `SELECT ... FOR UPDATE SKIP LOCKED`, así varios workers pueden
+      trabajar a la vez sin repartirse el mismo mensaje. El reclamo es un "alquiler":
+      si el worker muere a mitad de envío, el mensaje se vuelve a reclamar al vencer.
+    - Reintenta con backoff exponencial (con jitter) hasta `max_attempts`.
+    - Respeta un límite de ritmo por canal (token bucket) y un plazo por mensaje.
+
+    La entrega es "al menos una vez": si el proceso cae justo después de que el proveedor
+    acepte un mensaje y antes de marcarlo como enviado, ese mensaje se puede repetir.
+    """
+
+    def __init__(self):
+        self.concurrency = settings.OUTBOX_CONCURRENCY
+        self.batch_size = settings.OUTBOX_BATCH_SIZE
+        self._channels: dict[str, tuple[Callable[[str, str], str], TokenBucket, float]] = {}
+        self._listeners: list[tuple[str, Callable[[OutboxMessage], Awaitable[None]]]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._executor: ThreadPoolExecutor | None = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # --- Configuración ---
+
+    def register_channel(self, name: str, sender: Callable[[str, str], str], rate_per_second: float, burst: int, timeout: float) -> None:
+        """Registra un canal: `sender(destinatario, cuerpo)` envía de forma bloqueante y devuelve el ID del proveedor."""
+        self._channels[name] = (sender, TokenBucket(rate_per_second, burst), timeout)
+
+    def add_listener(self, reference_prefix: str, callback: Callable[[OutboxMessage], Awaitable[None]]) -> None:
+        """Llama a `callback` cada vez que cambia el estado de un mensaje con esa referencia."""
+        self._listeners.append((reference_prefix, callback))
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # Hilos propios para los envíos: el pool por defecto de asyncio es pequeño
+        # (5 hilos con una CPU) y limitaría la concurrencia real a ese número
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, grace: float = 10.0) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight:
+            # Lo que no termine a tiempo se reintentará al vencer su alquiler
+            await asyncio.wait(self._inflight, timeout=grace)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+    def wake(self) -> None:
+        """Avisa al worker de que hay mensajes nuevos. Se puede llamar desde cualquier hilo."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def wake_later(self, delay: float) -> None:
+        """Como `wake`, pasados `delay` segundos (al vencer la retención de un mensaje)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._loop.call_later, delay, self._wake.set)
+
+    async def _run(self) -> None:
+        # Se reclama por lotes: con pocos huecos libres se espera a que terminen más envíos,
+        # para no hacer un reclamo (consulta + commit) por cada mensaje
+        min_claim = max(1, min(self.batch_size, self.concurrency) // 4)
+        while True:
+            try:
+                self._wake.clear()
+                free = self.concurrency - len(self._inflight)
+                if free < min_claim and self._inflight:
+                    await self._wait(settings.OUTBOX_POLL_SECONDS)
+                    continue
+                limit = min(free, self.batch_size)
+                claimed, exhausted = await asyncio.to_thread(self._claim_batch, limit)
+                for message in claimed:
+                    task = asyncio.create_task(self._deliver(message))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._on_task_done)
+                for message in exhausted:
+                    self.failed += 1
+                    logger.error("Mensaje %s descartado: su último intento (%s) no terminó", message.id, message.attempts)
+                    await self._emit(message)
+                if len(claimed) + len(exhausted) < limit:
+                    # No queda trabajo listo: se espera a un aviso o al siguiente sondeo
+                    await self._wait(settings.OUTBOX_POLL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Error en el bucle del dispatcher: %s", e)
+                await asyncio.sleep(settings.OUTBOX_POLL_SECONDS)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._inflight.discard(task)
+        self._wake.set()
+
+    async def _wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    # --- Base de datos ---
+
+    def _claim_batch(self, limit: int) -> tuple[list[OutboxMessage], list[OutboxMessage]]:
+        """
+        Reclama hasta `limit` mensajes listos: los pendientes y los "enviando" cuyo alquiler
+        venció. Devuelve los reclamados y los que se dan por fallidos porque su alquiler venció
+        durante el último intento (reclamarlos los enviaría más de `max_attempts` veces).
+        """
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(OutboundMessage)
+                .filter(
+                    OutboundMessage.status.in_(("pendiente", "enviando")),
+                    OutboundMessage.next_attempt_at <= now,
+                    OutboundMessage.channel.in_(list(self._channels)),
+                )
+                .order_by(OutboundMessage.next_attempt_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            lease_until = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            claimed, exhausted = [], []
+            for row in rows:
+                if row.status == "enviando" and row.attempts >= row.max_attempts:
+                    row.status = "fallido"
+                    row.last_error = "El último intento no terminó antes de vencer su alquiler"
+                    exhausted.append(row)
+                    continue
+                row.status = "enviando"
+                row.attempts += 1
+                row.next_attempt_at = lease_until
+                claimed.append(row)
+            db.commit()
+            return [OutboxMessage.from_row(row) for row in claimed], [OutboxMessage.from_row(row) for row in exhausted]
+        finally:
+            db.close()
+
+    def _finish(self, message: OutboxMessage, provider_id: str | None, error: str | None) -> OutboxMessage | None:
+        """Guarda el resultado de un intento. Devuelve None si el alquiler lo tomó otro worker."""
+        now = datetime.utcnow()
+        if error is None:
+            values = {"status": "enviado", "provider_id": provider_id, "sent_at": now, "last_error": None}
+        elif message.attempts >= message.max_attempts:
+            values = {"status": "fallido", "last_error": error}
+        else:
+            backoff = min(
+                settings.OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (message.attempts - 1),
+                settings.OUTBOX_BACKOFF_MAX_SECONDS,
+            )
+            backoff *= random.uniform(0.8, 1.2)
+            values = {"status": "pendiente", "last_error": error, "next_attempt_at": now + timedelta(seconds=backoff)}
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(OutboundMessage)
+                .where(
+                    OutboundMessage.id == message.id,
+                    OutboundMessage.status == "enviando",
+                    OutboundMessage.attempts == message.attempts,
+                )
+                .values(**values)
+            )
+            db.commit()
+            if result.rowcount != 1:
+                return None
+        finally:
+            db.close()
+        message.status = values["status"]
+        message.provider_id = values.get("provider_id", message.provider_id)
+        message.last_error = values.get("last_error")
+        message.sent_at = values.get("sent_at", message.sent_at)
+        return message
+
+    # --- Envío ---
+
+    async def _deliver(self, message: OutboxMessage) -> None:
+        sender, bucket, timeout = self._channels[message.channel]
+        await self._emit(message)
+        await bucket.acquire()
+        provider_id, error = None, None
+        try:
+            send = self._loop.run_in_executor(self._executor, sender, message.recipient, message.body)
+            provider_id = await asyncio.wait_for(send, timeout=timeout)
+        except asyncio.TimeoutError:
+            error = f"Sin respuesta del proveedor en {timeout:.0f} s"
+        except Exception as e:
+            error = str(e)[:500]
+        updated = await self._loop.run_in_executor(self._executor, self._finish, message, provider_id, error)
+        if updated is None:
+            return
+        if updated.status == "enviado":
+            self.sent += 1
+        elif updated.status == "fallido":
+            self.failed += 1
+            logger.error("Mensaje %s descartado tras %s intentos: %s", message.id, message.attempts, error)
+        else:
+            self.retried += 1
+        await self._emit(updated)
+
+    async def _emit(self, message: OutboxMessage) -> None:
+        for prefix, callback in self._listeners:
+            if message.reference and message.reference.startswith(prefix):
+                try:
+                    await callback(message)
+                except Exception as e:
+                    logger.exception("Error en el listener de '%s': %s", prefix, e)
+
+    def collect_metrics(self) -> list[str]:
+        return metrics.format_family(
+            "outbox_messages_total", "counter", "Mensajes de la bandeja de salida por resultado.",
+            [("", {"result": "sent"}, self.sent), ("", {"result": "failed"}, self.failed), ("", {"result": "retried"}, self.retried)],
+        )
+
+
+dispatcher = OutboxDispatcher()
+metrics.registry.add_collector(dispatcher.collect_metrics)
@@ -0,0 +1,253 @@
+"""
+Perfilado de peticiones bajo demanda.
+
+Una petición se perfila si trae la cabecera `X-Profile` firmada por un administrador
+(ver `sign`) o si cae en la fracción muestreada (PROFILING_SAMPLE_RATE). Mientras dura,
+un hilo toma muestras de la pila de la petición cada PROFILING_INTERVAL_MS:
+
+- si su tarea se está ejecutando, la pila del hilo del bucle de eventos;
+- si está esperando, la cadena de corrutinas suspendidas (tiempo de espera de E/S: OpenAI,
+  Duckling...) y, si espera a un hilo del threadpool (endpoints síncronos, consultas a la
+  base de datos), también la pila de ese hilo.
+
+Es un perfil de tiempo real (wall clock) solo de esa petición. El resultado se guarda en
+formato "folded" (`marco;marco;marco N`), listo para flamegraph.pl o speedscope, con el
+identificador de la petición como nombre. Sin secreto ni muestreo configurados el
+middleware no se instala y no cuesta nada.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from app.config import settings
+from app.logging_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+HEADER = b"x-profile"
+
+
+# --- Firma de la cabecera ---
+
+def sign(expires_at: int, secret: str | None = None) -> str:
+    """Valor de `X-Profile` válido hasta `expires_at` (segundos epoch)."""
+    secret = secret or settings.PROFILING_SECRET
+    digest = hmac.new(secret.encode(), str(expires_at).encode(), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{digest}"
+
+
+def verify(value: str | None) -> bool:
+    if not value or not settings.PROFILING_SECRET:
+        return False
+    expires, _, _ = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(value, sign(int(expires)))
+
+
+# --- Pilas ---
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/")
+    short = "/".join(path.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> list:
+    """Marcos de un hilo, de la raíz a la hoja."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _coroutine_stack(coro) -> list:
+    """Marcos de una cadena de corrutinas suspendidas, de la raíz a la hoja."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+def _waiting_thread(frames) -> threading.Thread | None:
+    """
+    Hilo del threadpool al que espera la corrutina. anyio (run_in_threadpool de FastAPI)
+    guarda el hilo en la variable local `worker` mientras espera el resultado.
+    """
+    for frame in reversed(frames):
+        worker = frame.f_locals.get("worker")
+        if isinstance(worker, threading.Thread):
+            return worker
+    return None
+
+
+class Profile:
+    """Muestreo de la pila de una tarea asyncio (y de los hilos a los que espera)."""
+
+    def __init__(self, task: asyncio.Task, loop_thread_id: int, interval: float):
+        self.task = task
+        self.loop = task.get_loop()
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                # Las pilas cambian mientras se leen: una muestra fallida se descarta
+                logger.debug("Muestra descartada: %s", e)
+
+    def _sample(self) -> None:
+        current_frames = sys._current_frames()
+        if asyncio.tasks._current_tasks.get(self.loop) is self.task:
+            names = [_frame_name(f) for f in _thread_stack(current_frames.get(self.loop_thread_id))]
+        else:
+            frames = _coroutine_stack(self.task.get_coro())
+            names = [_frame_name(f) for f in frames]
+            worker = _waiting_thread(frames)
+            if worker is not None and worker.ident in current_frames:
+                names += [f"[hilo {worker.name}]"] + [_frame_name(f) for f in _thread_stack(current_frames[worker.ident])]
+            else:
+                names.append("[esperando]")
+        if names:
+            self.stacks[";".join(names)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# --- Almacenamiento ---
+
+def _path(request_id: str, extension: str) -> str:
+    safe = "".join(c for c in request_id if c.isalnum() or c in "-_")
+    return os.path.join(settings.PROFILING_DIR, f"{safe}.{extension}")
+
+
+def save(request_id: str, profile: Profile, meta: dict) -> None:
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    with open(_path(request_id, "folded"), "w") as f:
+        f.write(profile.folded())
+    with open(_path(request_id, "json"), "w") as f:
+        json.dump({**meta, "request_id": request_id, "samples": profile.samples, "interval_ms": profile.interval * 1000}, f)
+    _prune()
+
+
+def _prune() -> None:
+    """Conserva solo los PROFILING_MAX_FILES perfiles más recientes."""
+    metas = sorted(
+        (os.path.join(settings.PROFILING_DIR, name) for name in os.listdir(settings.PROFILING_DIR) if name.endswith(".json")),
+        key=os.path.getmtime,
+    )
+    for meta_path in metas[: max(0, len(metas) - settings.PROFILING_MAX_FILES)]:
+        for path in (meta_path, meta_path[:-5] + ".folded"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(settings.PROFILING_DIR):
+        if name.endswith(".json"):
+            with open(os.path.join(settings.PROFILING_DIR, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+
+def load_folded(request_id: str) -> str | None:
+    try:
+        with open(_path(request_id, "folded")) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def enabled() -> bool:
+    return bool(settings.PROFILING_SECRET) or settings.PROFILING_SAMPLE_RATE > 0
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila las peticiones marcadas. Debe ir dentro de
+    RequestIdMiddleware: el perfil se guarda con el identificador de la petición.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL_MS / 1000
+
+    def _requested(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        for name, value in scope["headers"]:
+            if name == HEADER:
+                return verify(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_flag(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profiled", b"1")]
+            await send(message)
+
+        profile = Profile(asyncio.current_task(), threading.get_ident(), self.interval)
+        started_at, started = time.time(), time.perf_counter()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_flag)
+        finally:
+            profile.stop()
+            request_id = request_id_var.get() or f"sin-id-{uuid.uuid4().hex[:16]}"
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "started_at": started_at,
+            }
+            try:
+                await asyncio.to_thread(save, request_id, profile, meta)
+                logger.info("Perfil guardado", extra={"profile_request_id": request_id, **meta, "samples": profile.samples})
+            except OSError as e:
+                logger.error("No se pudo guardar el perfil de %s: %s", request_id, e)
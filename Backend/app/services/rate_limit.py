@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: admite ráfagas de hasta `capacity` operaciones y un ritmo sostenido
+    de `rate` operaciones por segundo.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> tuple[bool, float]:
+        """Intenta consumir `tokens`. Devuelve (concedido, segundos hasta que habría tokens suficientes)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Espera (sin bloquear el event loop) hasta poder consumir `tokens`."""
+        while True:
+            granted, wait = self.try_acquire(tokens)
+            if granted:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,189 @@
+"""
+Sondas de vida y disponibilidad, y calentamiento del arranque.
+
+- Vida (`/livez`): el proceso responde. No mira dependencias, para que un fallo de la
+  base de datos no haga que la plataforma reinicie la aplicación en bucle.
+- Disponibilidad (`/readyz`): la aplicación terminó de calentar y la base de datos responde.
+  Duckling, OpenAI y el resto de proveedores se comprueban e informan, pero no la marcan
+  como no disponible: el chat sigue funcionando sin ellos (respaldos y circuit breakers).
+
+Las comprobaciones se hacen a la vez, cada una con su plazo, y el resultado se reutiliza
+READINESS_CACHE_SECONDS para que sondear a menudo no cargue las dependencias.
+
+Antes de declararse lista, la aplicación abre las conexiones del pool de la base de datos
+y las de Duckling y OpenAI (la primera comprobación pasa por sus clientes), así la primera
+petición real no paga la conexión ni el TLS.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.services import cache, duckling_service, llm_service, metrics
+from app.services.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Dependencias sin las que la aplicación no puede atender peticiones
+CRITICAL = {"database"}
+
+
+def _check_database() -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _prewarm_database(count: int) -> int:
+    """Abre `count` conexiones a la vez y las devuelve al pool. Devuelve cuántas se abrieron."""
+    pool_size = engine.pool.size() if hasattr(engine.pool, "size") else count
+    connections = []
+    try:
+        for _ in range(min(count, pool_size)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            connections.append(conn)
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
+class ReadinessChecker:
+    def __init__(self):
+        self.timeout = settings.READINESS_TIMEOUT
+        self.cache_seconds = settings.READINESS_CACHE_SECONDS
+        self.ready = False
+        self.timings: dict[str, float] = {}  # duración de cada fase del arranque (segundos)
+        self._results: dict[str, dict] = {}
+        self._checked_at = 0.0
+        self._refresh: asyncio.Task | None = None
+        self._warm_up: asyncio.Task | None = None
+        self._http: httpx.AsyncClient | None = None
+
+    def _checks(self) -> dict[str, Callable[[], Awaitable[None]]]:
+        checks = {
+            "database": lambda: asyncio.to_thread(_check_database),
+            "duckling": lambda: duckling_service.ping(self.timeout),
+            "openai": lambda: llm_service.ping(self.timeout),
+            "weatherapi": lambda: self._reachable(settings.WEATHER_API_URL),
+            "gnews": lambda: self._reachable(settings.GNEWS_API_URL),
+            "twilio": lambda: self._reachable(settings.TWILIO_API_URL or "https://api.twilio.com"),
+        }
+        if settings.CACHE_BACKEND != "memory":
+            checks["cache"] = lambda: cache.get_backend().ping()
+        return checks
+
+    async def _reachable(self, url: str) -> None:
+        """Cualquier respuesta HTTP cuenta: solo se comprueba que el proveedor responde."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        await self._http.head(url)
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        """Calienta en segundo plano: /livez responde ya y /readyz cuando termine."""
+        self.ready = False
+        self._results, self._checked_at, self._refresh = {}, 0.0, None
+        self._warm_up = asyncio.create_task(self.warm_up())
+
+    async def stop(self) -> None:
+        for task in (self._warm_up, self._refresh):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._warm_up = self._refresh = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self.ready = False
+
+    async def warm_up(self) -> None:
+        started = time.perf_counter()
+        # El cliente de OpenAI se crea en un hilo: importar `openai` bloquearía el bucle
+        database, _ = await asyncio.gather(
+            asyncio.to_thread(_prewarm_database, settings.DB_PREWARM_CONNECTIONS),
+            asyncio.to_thread(llm_service.get_client),
+            return_exceptions=True,
+        )
+        if isinstance(database, Exception):
+            logger.warning("No se pudo calentar el pool de la base de datos: %s", database)
+        else:
+            logger.debug("Pool de la base de datos calentado", extra={"connections": database})
+        results = await self.check(force=True)
+        self.timings["warm_up"] = time.perf_counter() - started
+        self.ready = True
+        logger.info(
+            "Aplicación lista",
+            extra={
+                **{f"{phase}_ms": round(seconds * 1000) for phase, seconds in self.timings.items()},
+                "unavailable": [name for name, result in results.items() if not result["ok"]],
+            },
+        )
+
+    # --- Comprobaciones ---
+
+    async def check(self, force: bool = False) -> dict[str, dict]:
+        """Estado de cada dependencia; reutiliza el último si tiene menos de READINESS_CACHE_SECONDS."""
+        if not force and self._results and time.monotonic() - self._checked_at < self.cache_seconds:
+            return self._results
+        # Peticiones simultáneas comparten una misma ronda de comprobaciones
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._run_checks())
+        return await asyncio.shield(self._refresh)
+
+    async def _run_checks(self) -> dict[str, dict]:
+        checks = self._checks()
+        outcomes = await asyncio.gather(*(self._timed(check) for check in checks.values()))
+        self._results = dict(zip(checks, outcomes))
+        self._checked_at = time.monotonic()
+        return self._results
+
+    async def _timed(self, check: Callable[[], Awaitable[None]]) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"ok": True}
+        except Exception as e:
+            result = {"ok": False, "error": str(e) or type(e).__name__}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def status(self) -> tuple[bool, dict]:
+        """(disponible, cuerpo de /readyz)."""
+        if not self.ready:
+            return False, {"status": "starting"}
+        results = await self.check()
+        available = all(results[name]["ok"] for name in CRITICAL)
+        degraded = any(not result["ok"] for result in results.values())
+        body = {
+            "status": "unavailable" if not available else "degraded" if degraded else "ready",
+            "checks": results,
+            "startup_ms": {phase: round(seconds * 1000) for phase, seconds in self.timings.items()},
+        }
+        return available, body
+
+
+checker = ReadinessChecker()
+
+
+def _collect_metrics() -> list[str]:
+    lines = metrics.format_family(
+        "app_ready", "gauge", "1 si la aplicación terminó de arrancar y la base de datos responde.",
+        [("", {}, int(checker.ready and all(checker._results.get(name, {}).get("ok") for name in CRITICAL)))],
+    )
+    lines += metrics.format_family(
+        "app_startup_seconds", "gauge", "Duración de cada fase del arranque.",
+        [("", {"phase": phase}, seconds) for phase, seconds in checker.timings.items()],
+    )
+    return lines
+
+
+metrics.registry.add_collector(_collect_metrics)
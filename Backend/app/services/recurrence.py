@@ -0,0 +1,114 @@
+import logging
+import re
+import unicodedata
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from dateutil.rrule import rrulestr
+
+from app.config import settings
+
+# Máximo de ocurrencias que se expanden por recordatorio en una consulta
+MAX_OCCURRENCES = 1000
+# Máximo de ocurrencias que se recorren desde el inicio de la serie buscando una fecha (una
+# cada hora durante 50 años): ninguna regla guardada puede dejar la búsqueda girando sin fin
+MAX_SEARCH_ITERATIONS = 50 * 366 * 24
+
+logger = logging.getLogger(__name__)
+
+_DIAS = {
+    "lunes": "MO", "martes": "TU", "miercoles": "WE", "jueves": "TH",
+    "viernes": "FR", "sabado": "SA", "domingo": "SU",
+}
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def detectar_recurrencia(texto: str) -> str | None:
+    """
+    Detecta en el mensaje del usuario expresiones de repetición y devuelve una regla RRULE.
+    Ej: "tomar pastillas todos los días a las 8" -> "FREQ=DAILY".
+    """
+    t = _normalizar(texto)
+    if m := re.search(r"cada ([1-9]\d*) horas", t):
+        return f"FREQ=HOURLY;INTERVAL={int(m.group(1))}"
+    if m := re.search(r"cada ([1-9]\d*) dias", t):
+        return f"FREQ=DAILY;INTERVAL={int(m.group(1))}"
+    if re.search(r"(todos los|cada) (lunes|martes|miercoles|jueves|viernes|sabado|domingo)", t):
+        # "todos los lunes y jueves" -> BYDAY=MO,TH
+        dias = [codigo for dia, codigo in _DIAS.items() if re.search(rf"\b{dia}s?\b", t)]
+        return f"FREQ=WEEKLY;BYDAY={','.join(dias)}"
+    if re.search(r"todos los dias|cada dia\b|diariamente|a diario", t):
+        return "FREQ=DAILY"
+    if re.search(r"cada semana|todas las semanas|semanalmente", t):
+        return "FREQ=WEEKLY"
+    if re.search(r"cada mes\b|todos los meses|mensualmente", t):
+        return "FREQ=MONTHLY"
+    return None
+
+
+def validar_rrule(rule: str) -> str:
+    """Valida una regla RRULE (sin DTSTART) y la devuelve normalizada. Lanza ValueError si no es válida."""
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:]
+    if "DTSTART" in rule.upper():
+        raise ValueError("La regla no debe incluir DTSTART; se usa la fecha del recordatorio.")
+    regla = rrulestr(rule, dtstart=datetime(2000, 1, 1))
+    if getattr(regla, "_interval", 1) < 1:
+        raise ValueError("INTERVAL debe ser 1 o mayor.")
+    return rule.upper()
+
+
+def _tz() -> ZoneInfo:
+    return ZoneInfo(settings.DEFAULT_TIMEZONE)
+
+
+def _a_local(value: datetime) -> datetime:
+    """UTC sin zona -> hora local sin zona (la regla se expande en hora local para respetar el horario de verano)."""
+    return value.replace(tzinfo=timezone.utc).astimezone(_tz()).replace(tzinfo=None)
+
+
+def _a_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=_tz()).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _recorrer(starts_at: datetime, rule: str):
+    """
+    Ocurrencias de la regla (hora local) desde el inicio de la serie, como mucho
+    MAX_SEARCH_ITERATIONS. Una regla guardada antes de validar INTERVAL (INTERVAL=0 repite la
+    misma fecha para siempre) o demasiado densa se corta con un aviso en vez de colgar la petición.
+    """
+    regla = rrulestr(rule, dtstart=_a_local(starts_at))
+    if getattr(regla, "_interval", 1) < 1:
+        logger.warning("Regla de recurrencia sin ocurrencias válidas: %s", rule)
+        return
+    for i, ocurrencia in enumerate(regla):
+        if i >= MAX_SEARCH_ITERATIONS:
+            logger.warning("Búsqueda de ocurrencias cortada tras %s iteraciones: %s", i, rule)
+            return
+        yield ocurrencia
+
+
+def ocurrencias(starts_at: datetime, rule: str, desde: datetime, hasta: datetime, limite: int = MAX_OCCURRENCES) -> list[datetime]:
+    """Ocurrencias (UTC sin zona) de la regla dentro de [desde, hasta], expandidas solo en esa ventana."""
+    inicio, fin = _a_local(desde), _a_local(hasta)
+    resultado = []
+    for ocurrencia in _recorrer(starts_at, rule):
+        if ocurrencia < inicio:
+            continue
+        if ocurrencia > fin or len(resultado) >= limite:
+            break
+        resultado.append(_a_utc(ocurrencia))
+    return resultado
+
+
+def siguiente_ocurrencia(starts_at: datetime, rule: str, despues_de: datetime, inclusive: bool = False) -> datetime | None:
+    """Primera ocurrencia posterior (o igual, si `inclusive`) a `despues_de`, en UTC sin zona."""
+    limite = _a_local(despues_de)
+    for ocurrencia in _recorrer(starts_at, rule):
+        if ocurrencia > limite or (inclusive and ocurrencia == limite):
+            return _a_utc(ocurrencia)
+    return None
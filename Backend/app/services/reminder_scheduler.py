@@ -0,0 +1,333 @@
+import heapq
+import asyncio
+import calendar
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from app.config import settings
+from app.services.database import SessionLocal, Reminder, ReminderOccurrenceState
+from app.services import recurrence
+from app.services.event_hub import hub
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DueReminder:
+    """Recordatorio que acaba de vencer y debe entregarse."""
+    id: int
+    user_id: str
+    text: str
+    due_at: datetime
+
+
+class ReminderNotifier(ABC):
+    """Canal de entrega de recordatorios vencidos (push, SMS, stream de eventos...)."""
+
+    @abstractmethod
+    async def notify(self, reminder: DueReminder) -> None:
+        ...
+
+
+class LogNotifier(ReminderNotifier):
+    """Notificador por defecto: solo deja constancia en el log."""
+
+    async def notify(self, reminder: DueReminder) -> None:
+        logger.info(
+            "Recordatorio vencido: %s", reminder.text,
+            extra={"user_id": reminder.user_id, "reminder_id": reminder.id, "due_at": f"{reminder.due_at:%Y-%m-%d %H:%M}"},
+        )
+
+
+class EventStreamNotifier(ReminderNotifier):
+    """Envía el recordatorio vencido al stream de eventos del usuario (si está conectado)."""
+
+    async def notify(self, reminder: DueReminder) -> None:
+        hub.publish(reminder.user_id, "reminder.due", {"id": reminder.id, "text": reminder.text, "due_at": reminder.due_at})
+
+
+def _to_ts(value: datetime) -> float:
+    """datetime UTC sin zona -> segundos desde epoch."""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1_000_000
+
+
+class ReminderScheduler:
+    """
+    Dispara los recordatorios cuando vencen.
+
+    Mantiene en memoria un min-heap solo con los recordatorios que vencen dentro de una
+    ventana deslizante (por defecto una hora); la ventana se recarga de la base de datos
+    de forma incremental. Las altas, cambios y bajas actualizan el heap al momento y las
+    entradas obsoletas se descartan de forma perezosa mediante un número de versión.
+
+    Con varios workers cada uno tiene su propio heap, pero antes de entregar se "reclama"
+    la fila con un UPDATE condicional sobre `last_fired_at`: solo un worker lo consigue,
+    así que ningún recordatorio se dispara dos veces.
+    """
+
+    BATCH_SIZE = 1000
+    MAX_CONCURRENT_DELIVERIES = 50
+
+    def __init__(self, window: timedelta | None = None, max_late: timedelta | None = None):
+        self.window = window or timedelta(minutes=settings.REMINDER_WINDOW_MINUTES)
+        self.max_late = max_late or timedelta(minutes=settings.REMINDER_MAX_LATE_MINUTES)
+        self.notifiers: list[ReminderNotifier] = [LogNotifier(), EventStreamNotifier()]
+        self._heap: list[tuple[float, int, int]] = []  # (vencimiento, id, versión)
+        self._versions: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._horizon: datetime | None = None  # hasta dónde se ha cargado la ventana
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._deliveries: asyncio.Semaphore | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self.fired = 0
+        self.lateness_ms: list[float] = []
+
+    # --- Notificadores ---
+
+    def add_notifier(self, notifier: ReminderNotifier) -> None:
+        self.notifiers.append(notifier)
+
+    # --- Altas, cambios y bajas (llamadas desde reminder_service, en cualquier hilo) ---
+
+    def schedule(self, reminder_id: int, due_at: datetime | None) -> None:
+        """Programa (o reprograma) un recordatorio si vence dentro de la ventana cargada."""
+        with self._lock:
+            version = self._versions.get(reminder_id, 0) + 1
+            if (
+                due_at is None
+                or self._horizon is None
+                or due_at > self._horizon
+                or due_at < datetime.utcnow() - self.max_late
+            ):
+                # Fuera de la ventana: se cargará de la base de datos cuando la ventana avance
+                self._versions.pop(reminder_id, None)
+                return
+            self._versions[reminder_id] = version
+            heapq.heappush(self._heap, (_to_ts(due_at), reminder_id, version))
+        self._notify_change()
+
+    def unschedule(self, reminder_id: int) -> None:
+        with self._lock:
+            self._versions.pop(reminder_id, None)
+
+    def _notify_change(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    @property
+    def pending(self) -> int:
+        return len(self._versions)
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._deliveries = asyncio.Semaphore(self.MAX_CONCURRENT_DELIVERIES)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        next_refill = 0.0
+        while True:
+            try:
+                now = time.time()
+                if now >= next_refill:
+                    await asyncio.to_thread(self._refill)
+                    next_refill = now + self.window.total_seconds() / 2
+
+                # Se limpia antes de mirar el heap para no perder avisos de schedule() concurrentes
+                self._wake.clear()
+                for entry in self._pop_due(time.time()):
+                    task = asyncio.create_task(self._deliver(*entry))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+
+                delay = min(self._seconds_until_next(), max(next_refill - time.time(), 0))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Error en el bucle del planificador: %s", e)
+                await asyncio.sleep(5)
+
+    # --- Heap ---
+
+    def _pop_due(self, now: float) -> list[tuple[float, int]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_ts, reminder_id, version = heapq.heappop(self._heap)
+                if self._versions.get(reminder_id) != version:
+                    continue  # entrada obsoleta (recordatorio modificado o eliminado)
+                del self._versions[reminder_id]
+                due.append((due_ts, reminder_id))
+        return due
+
+    def _seconds_until_next(self) -> float:
+        with self._lock:
+            while self._heap and self._versions.get(self._heap[0][1]) != self._heap[0][2]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return self.window.total_seconds()
+            return max(self._heap[0][0] - time.time(), 0)
+
+    # --- Base de datos ---
+
+    def _refill(self) -> None:
+        """Carga los recordatorios que entran en la ventana desde el último horizonte cargado."""
+        now = datetime.utcnow()
+        new_horizon = now + self.window
+        with self._lock:
+            first_load = self._horizon is None
+            start = self._horizon if not first_load else now - self.max_late
+            # Se amplía el horizonte antes de consultar: así las altas concurrentes entran por
+            # schedule() o por la consulta (un duplicado se resuelve por versión), nunca por ninguno.
+            self._horizon = new_horizon
+        db = SessionLocal()
+        try:
+            if first_load:
+                self._advance_stale(db, start)
+            last_due, last_id = start, 0
+            while True:
+                # Paginación por (due_at, id) para no cargar la ventana de una vez
+                rows = (
+                    db.query(Reminder.id, Reminder.due_at)
+                    .filter(
+                        Reminder.due_at <= new_horizon,
+                        or_(Reminder.due_at > last_due, (Reminder.due_at == last_due) & (Reminder.id > last_id)),
+                        or_(Reminder.last_fired_at.is_(None), Reminder.last_fired_at < Reminder.due_at),
+                    )
+                    .order_by(Reminder.due_at, Reminder.id)
+                    .limit(self.BATCH_SIZE)
+                    .all()
+                )
+                with self._lock:
+                    for reminder_id, due_at in rows:
+                        version = self._versions.get(reminder_id, 0) + 1
+                        self._versions[reminder_id] = version
+                        heapq.heappush(self._heap, (_to_ts(due_at), reminder_id, version))
+                if len(rows) < self.BATCH_SIZE:
+                    break
+                last_due, last_id = rows[-1].due_at, rows[-1].id
+        finally:
+            db.close()
+
+    def _advance_stale(self, db, cutoff: datetime) -> None:
+        """
+        Avanza los recurrentes cuya ocurrencia pendiente quedó antes de `cutoff` (tras una caída
+        o un despliegue largo) a su primera ocurrencia posterior, sin dispararla: si no, la
+        ventana no los volvería a cargar y la serie se detendría. El retraso máximo solo
+        suprime la entrega, no la reprogramación.
+        """
+        advanced, last_id = 0, 0
+        while True:
+            rows = (
+                db.query(Reminder.id, Reminder.due_at, Reminder.starts_at, Reminder.rrule)
+                .filter(
+                    Reminder.id > last_id,
+                    Reminder.rrule.isnot(None),
+                    Reminder.starts_at.isnot(None),
+                    Reminder.due_at < cutoff,
+                    or_(Reminder.last_fired_at.is_(None), Reminder.last_fired_at < Reminder.due_at),
+                )
+                .order_by(Reminder.id)
+                .limit(self.BATCH_SIZE)
+                .all()
+            )
+            for row in rows:
+                next_due = recurrence.siguiente_ocurrencia(row.starts_at, row.rrule, cutoff)
+                # Condicionado a due_at: si otro worker ya lo avanzó, no se toca
+                result = db.execute(
+                    update(Reminder)
+                    .where(Reminder.id == row.id, Reminder.due_at == row.due_at)
+                    .values(due_at=next_due, updated_at=Reminder.updated_at)
+                )
+                advanced += result.rowcount
+            db.commit()
+            if len(rows) < self.BATCH_SIZE:
+                break
+            last_id = rows[-1].id
+        if advanced:
+            logger.warning("%s recordatorios recurrentes atrasados avanzados a su siguiente ocurrencia sin notificar", advanced)
+
+    def _claim(self, reminder_id: int, due_ts: float) -> DueReminder | None:
+        """Marca el recordatorio como disparado si nadie lo ha hecho antes; devuelve sus datos si lo consigue."""
+        db = SessionLocal()
+        try:
+            reminder = db.query(Reminder).filter(Reminder.id == reminder_id).first()
+            if reminder is None or reminder.due_at is None:
+                return None  # eliminado desde que se cargó
+            if abs(_to_ts(reminder.due_at) - due_ts) > 1:
+                # Reprogramado desde que se cargó: se vuelve a programar con la fecha vigente
+                self.schedule(reminder.id, reminder.due_at)
+                return None
+            due_at = reminder.due_at
+            # En los recurrentes, el mismo UPDATE avanza due_at a la siguiente ocurrencia
+            next_due = None
+            if reminder.rrule and reminder.starts_at:
+                next_due = recurrence.siguiente_ocurrencia(reminder.starts_at, reminder.rrule, due_at)
+            # Disparar no cambia nada que vea el cliente: no cuenta como modificación para la sincronización
+            values = {"last_fired_at": due_at, "updated_at": Reminder.updated_at}
+            if reminder.rrule:
+                values["due_at"] = next_due
+            result = db.execute(
+                update(Reminder)
+                .where(
+                    Reminder.id == reminder_id,
+                    Reminder.due_at == due_at,
+                    or_(Reminder.last_fired_at.is_(None), Reminder.last_fired_at < due_at),
+                )
+                .values(**values)
+            )
+            db.commit()
+            if result.rowcount != 1:
+                return None  # otro worker lo reclamó primero
+            if reminder.rrule:
+                self.schedule(reminder.id, next_due)
+                # Ocurrencia ya completada u omitida por el usuario: se avanza sin notificar
+                if db.get(ReminderOccurrenceState, (reminder.id, due_at)) is not None:
+                    return None
+            return DueReminder(id=reminder.id, user_id=reminder.user_id, text=reminder.text, due_at=due_at)
+        finally:
+            db.close()
+
+    async def _deliver(self, due_ts: float, reminder_id: int) -> None:
+        async with self._deliveries:
+            try:
+                due = await asyncio.to_thread(self._claim, reminder_id, due_ts)
+            except Exception as e:
+                logger.error("No se pudo reclamar el recordatorio %s: %s", reminder_id, e)
+                return
+            if due is None:
+                return
+            self.fired += 1
+            self.lateness_ms.append((time.time() - due_ts) * 1000)
+            del self.lateness_ms[:-1000]  # solo las últimas mediciones
+            for notifier in self.notifiers:
+                try:
+                    await notifier.notify(due)
+                except Exception as e:
+                    logger.error("%s falló con el recordatorio %s: %s", type(notifier).__name__, reminder_id, e)
+
+
+scheduler = ReminderScheduler()
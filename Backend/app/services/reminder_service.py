@@ -1,39 +1,200 @@
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from app.services.database import Reminder
-from datetime import datetime
+from app.services.database import Reminder, ReminderOccurrenceState, SessionLocal
+from app.services.reminder_scheduler import scheduler
+from app.services.event_hub import hub
+from app.services.user_context import store as user_context
+from app.services import recurrence
+from app.services import collection_versions, sync_service
+from app.config import settings
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from dateutil import parser
 
-def add_reminder(db: Session, user_id: str, text: str, reminder_time: str) -> Reminder:
-    """Añade un nuevo recordatorio a la base de datos."""
-    db_reminder = Reminder(user_id=user_id, text=text, datetime=reminder_time)
+OCCURRENCE_STATUSES = ("completada", "omitida")
+
+def _reminder_event(reminder: Reminder) -> dict:
+    return {"id": reminder.id, "text": reminder.text, "datetime": reminder.datetime, "rrule": reminder.rrule}
+
+def parse_due_at(reminder_time) -> datetime | None:
+    """Normaliza la fecha de un recordatorio a UTC sin zona (las fechas sin zona se leen en la zona por defecto)."""
+    if reminder_time is None:
+        return None
+    if isinstance(reminder_time, datetime):
+        value = reminder_time
+    else:
+        try:
+            value = parser.parse(str(reminder_time))
+        except (ValueError, OverflowError):
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=ZoneInfo(settings.DEFAULT_TIMEZONE))
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _to_local_iso(value: datetime) -> str:
+    """UTC sin zona -> ISO en hora local sin zona (el formato que envía el frontend)."""
+    local = value.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(settings.DEFAULT_TIMEZONE))
+    return local.replace(tzinfo=None).isoformat(timespec="seconds")
+
+def _schedule_fields(reminder_time, rrule: str | None) -> dict:
+    """Calcula starts_at y due_at; en los recurrentes due_at es la próxima ocurrencia desde ahora."""
+    starts_at = parse_due_at(reminder_time)
+    due_at = starts_at
+    if rrule and starts_at:
+        due_at = recurrence.siguiente_ocurrencia(starts_at, rrule, datetime.utcnow(), inclusive=True)
+    return {"starts_at": starts_at, "due_at": due_at}
+
+def add_reminder(db: Session, user_id: str, text: str, reminder_time: str, rrule: str | None = None, commit: bool = True) -> Reminder:
+    """
+    Añade un nuevo recordatorio a la base de datos (con una regla RRULE si es recurrente).
+    Con commit=False solo lo añade a la sesión: el llamador confirma y después llama a `notify_created`.
+    """
+    if rrule:
+        rrule = recurrence.validar_rrule(rrule)
+    db_reminder = Reminder(user_id=user_id, text=text, datetime=reminder_time, rrule=rrule, **_schedule_fields(reminder_time, rrule))
     db.add(db_reminder)
+    collection_versions.bump(db, user_id, collection_versions.REMINDERS)
+    if not commit:
+        return db_reminder
     db.commit()
     db.refresh(db_reminder)
+    notify_created(db_reminder)
     return db_reminder
 
-def get_user_reminders(db: Session, user_id: str) -> list[Reminder]:
-    """Obtiene todos los recordatorios de un usuario."""
-    return db.query(Reminder).filter(Reminder.user_id == user_id).order_by(Reminder.datetime.desc()).all()
+def notify_created(reminder: Reminder) -> None:
+    """Programa un recordatorio ya confirmado y avisa a los dispositivos del usuario."""
+    scheduler.schedule(reminder.id, reminder.due_at)
+    hub.publish(reminder.user_id, "reminder.created", _reminder_event(reminder))
+    user_context.add_reminder(reminder)
+
+def get_user_reminders(db: Session, user_id: str, desde: datetime | None = None, hasta: datetime | None = None) -> list:
+    """
+    Obtiene los recordatorios de un usuario.
+    Sin ventana devuelve las filas tal cual; con ventana [desde, hasta] (UTC sin zona) devuelve
+    las ocurrencias concretas, expandiendo las reglas de recurrencia solo dentro de la ventana.
+    """
+    if desde is None and hasta is None:
+        return db.query(Reminder).filter(Reminder.user_id == user_id).order_by(Reminder.datetime.desc()).all()
+
+    reminders = (
+        db.query(Reminder)
+        .filter(
+            Reminder.user_id == user_id,
+            or_(
+                Reminder.rrule.is_(None) & Reminder.starts_at.between(desde, hasta),
+                Reminder.rrule.isnot(None) & (Reminder.starts_at <= hasta),
+            ),
+        )
+        .all()
+    )
+    recurring_ids = [r.id for r in reminders if r.rrule]
+    states = {}
+    if recurring_ids:
+        rows = (
+            db.query(ReminderOccurrenceState)
+            .filter(
+                ReminderOccurrenceState.reminder_id.in_(recurring_ids),
+                ReminderOccurrenceState.occurrence_at.between(desde, hasta),
+            )
+            .all()
+        )
+        states = {(s.reminder_id, s.occurrence_at): s.status for s in rows}
+
+    occurrences = []
+    for reminder in reminders:
+        if reminder.rrule:
+            fechas = recurrence.ocurrencias(reminder.starts_at, reminder.rrule, desde, hasta)
+        else:
+            fechas = [reminder.starts_at]
+        for fecha in fechas:
+            occurrences.append({
+                "id": reminder.id,
+                "text": reminder.text,
+                "datetime": _to_local_iso(fecha),
+                "rrule": reminder.rrule,
+                "status": states.get((reminder.id, fecha), "pendiente"),
+            })
+    occurrences.sort(key=lambda o: o["datetime"])
+    return occurrences
+
+def set_occurrence_status(db: Session, user_id: str, reminder_id: int, occurrence_at: datetime, status: str) -> bool:
+    """Marca una ocurrencia de un recordatorio recurrente como completada, omitida o pendiente."""
+    db_reminder = db.query(Reminder).filter(Reminder.id == reminder_id, Reminder.user_id == user_id).first()
+    if not db_reminder or not db_reminder.rrule or not db_reminder.starts_at:
+        return False
+    # La fecha debe ser una ocurrencia real de la regla
+    if recurrence.siguiente_ocurrencia(db_reminder.starts_at, db_reminder.rrule, occurrence_at, inclusive=True) != occurrence_at:
+        return False
+    existing = db.get(ReminderOccurrenceState, (reminder_id, occurrence_at))
+    if status in OCCURRENCE_STATUSES:
+        if existing:
+            existing.status = status
+        else:
+            db.add(ReminderOccurrenceState(reminder_id=reminder_id, occurrence_at=occurrence_at, status=status))
+    elif existing:
+        db.delete(existing)
+    collection_versions.bump(db, user_id, collection_versions.REMINDERS)
+    db.commit()
+    hub.publish(user_id, "reminder.occurrence", {"id": reminder_id, "occurrence": _to_local_iso(occurrence_at), "status": status})
+    return True
 
 def delete_reminder(db: Session, user_id: str, reminder_id: int) -> bool:
     """Elimina un recordatorio por su ID y user_id."""
     db_reminder = db.query(Reminder).filter(Reminder.id == reminder_id, Reminder.user_id == user_id).first()
     if db_reminder:
+        db.query(ReminderOccurrenceState).filter(ReminderOccurrenceState.reminder_id == reminder_id).delete()
         db.delete(db_reminder)
+        sync_service.record_deletion(db, user_id, collection_versions.REMINDERS, reminder_id)
+        collection_versions.bump(db, user_id, collection_versions.REMINDERS)
         db.commit()
+        scheduler.unschedule(reminder_id)
+        hub.publish(user_id, "reminder.deleted", {"id": reminder_id})
+        user_context.invalidate(user_id)
         return True
     return False
 
-def update_reminder(db: Session, user_id: str, reminder_id: int, text: str, reminder_time: datetime) -> Reminder | None:
-    """Actualiza un recordatorio existente por su ID y user_id."""
+def update_reminder(db: Session, user_id: str, reminder_id: int, text: str, reminder_time: datetime, rrule: str | None = None) -> Reminder | None:
+    """
+    Actualiza un recordatorio existente por su ID y user_id.
+    `rrule=None` conserva la recurrencia actual y `rrule=""` la elimina.
+    """
     db_reminder = db.query(Reminder).filter(Reminder.id == reminder_id, Reminder.user_id == user_id).first()
     if db_reminder:
+        if rrule is not None:
+            db_reminder.rrule = recurrence.validar_rrule(rrule) if rrule else None
         db_reminder.text = text
         db_reminder.datetime = reminder_time
+        for key, value in _schedule_fields(reminder_time, db_reminder.rrule).items():
+            setattr(db_reminder, key, value)
+        collection_versions.bump(db, user_id, collection_versions.REMINDERS)
         db.commit()
         db.refresh(db_reminder)
+        scheduler.schedule(db_reminder.id, db_reminder.due_at)
+        hub.publish(user_id, "reminder.updated", _reminder_event(db_reminder))
+        user_context.invalidate(user_id)
         return db_reminder
     return None
 
 def get_reminder_by_id(db: Session, reminder_id: int) -> Reminder | None:
     """Obtiene un recordatorio específico por su ID."""
-    return db.query(Reminder).filter(Reminder.id == reminder_id).first()
\ No newline at end of file
+    return db.query(Reminder).filter(Reminder.id == reminder_id).first()
+
+def backfill_schedule_fields(batch_size: int = 500) -> int:
+    """Calcula starts_at/due_at de los recordatorios creados antes de que existieran esas columnas."""
+    db = SessionLocal()
+    total = 0
+    try:
+        while True:
+            rows = db.query(Reminder).filter(Reminder.starts_at.is_(None)).limit(batch_size).all()
+            if not rows:
+                break
+            for reminder in rows:
+                fields = _schedule_fields(reminder.datetime, reminder.rrule)
+                # Sin fecha interpretable se marca igualmente para no volver a procesarlo
+                reminder.starts_at = fields["starts_at"] or datetime(1970, 1, 1)
+                reminder.due_at = fields["due_at"]
+            db.commit()
+            total += len(rows)
+    finally:
+        db.close()
+    return total
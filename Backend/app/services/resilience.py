@@ -0,0 +1,317 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Optional
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Si la última llamada de `call`/`acall` en este contexto respondió con el respaldo
+_served_fallback: ContextVar[bool] = ContextVar("served_fallback", default=False)
+
+
+def served_fallback() -> bool:
+    """True si la última llamada protegida de este hilo o tarea se respondió con el respaldo."""
+    return _served_fallback.get()
+
+
+class ProviderError(Exception):
+    """Error de un proveedor externo que debe contar como fallo para el circuit breaker."""
+
+
+class LatencyHistogram:
+    """Histograma acumulativo de latencias (en milisegundos) con cubetas fijas."""
+
+    BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # la última cubeta es +Inf
+        self.total_ms = 0.0
+        self.count = 0
+
+    def observe(self, elapsed_ms: float) -> None:
+        with self._lock:
+            for i, limite in enumerate(self.BUCKETS_MS):
+                if elapsed_ms <= limite:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.total_ms += elapsed_ms
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {f"le_{limite}": n for limite, n in zip(self.BUCKETS_MS, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+                "buckets": buckets,
+            }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con tres estados:
+    - closed: las llamadas pasan; tras `failure_threshold` fallos seguidos se abre.
+    - open: las llamadas se rechazan sin tocar la red durante `reset_timeout` segundos.
+    - half_open: se deja pasar una llamada de prueba; si funciona se cierra, si falla se vuelve a abrir.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Devuelve el hueco de una llamada que no terminó (cancelada): no cuenta como éxito ni fallo."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self.times_opened,
+            }
+
+
+class Provider:
+    """
+    Envuelve las llamadas a un proveedor externo con un plazo máximo (timeout),
+    un circuit breaker y una caché de los últimos resultados buenos para responder
+    rápido cuando el proveedor está caído.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        fallback_cache_size: int = 256,
+        fallback_max_age: float = 6 * 60 * 60,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self.fallback_cache_size = fallback_cache_size
+        self.fallback_max_age = fallback_max_age
+        self._fallbacks: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.fallbacks_served = 0
+
+    # --- Caché de respaldo ---
+
+    def _remember(self, key: Optional[Hashable], value: Any) -> None:
+        if key is None or value is None:
+            return
+        with self._lock:
+            self._fallbacks[key] = (time.monotonic(), value)
+            self._fallbacks.move_to_end(key)
+            while len(self._fallbacks) > self.fallback_cache_size:
+                self._fallbacks.popitem(last=False)
+
+    def _fallback(self, key: Optional[Hashable], default: Any) -> Any:
+        _served_fallback.set(True)
+        with self._lock:
+            self.fallbacks_served += 1
+            if key is not None and key in self._fallbacks:
+                stored_at, value = self._fallbacks[key]
+                if time.monotonic() - stored_at <= self.fallback_max_age:
+                    return value
+                del self._fallbacks[key]
+        return default
+
+    # --- Contabilidad ---
+
+    def allow(self) -> bool:
+        """Para quien hace la llamada por su cuenta: False (y se cuenta) si el circuito la rechaza."""
+        if self.breaker.allow_request():
+            return True
+        self.short_circuited += 1
+        return False
+
+    def release(self) -> None:
+        """Para quien hace la llamada por su cuenta: la llamada permitida por `allow` se canceló."""
+        self.breaker.release()
+
+    def record_success(self, started: float) -> None:
+        self.latency.observe((time.perf_counter() - started) * 1000)
+        self.breaker.record_success()
+        self.successes += 1
+
+    def record_failure(self, started: float, error: Exception) -> None:
+        self.latency.observe((time.perf_counter() - started) * 1000)
+        self.breaker.record_failure()
+        self.failures += 1
+        logger.warning(
+            "Fallo del proveedor %s (%s): %s", self.name, type(error).__name__, error,
+            extra={"provider": self.name, "circuit": self.breaker.state},
+        )
+
+    # --- Llamadas ---
+
+    def call(self, fn: Callable, *args, fallback_key: Optional[Hashable] = None, fallback: Any = None, **kwargs) -> Any:
+        """Ejecuta `fn` (síncrona) protegida por el circuit breaker."""
+        _served_fallback.set(False)
+        if not self.breaker.allow_request():
+            self.short_circuited += 1
+            return self._fallback(fallback_key, fallback)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(started, e)
+            return self._fallback(fallback_key, fallback)
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.record_success(started)
+        self._remember(fallback_key, result)
+        return result
+
+    async def acall(self, fn: Callable, *args, fallback_key: Optional[Hashable] = None, fallback: Any = None, **kwargs) -> Any:
+        """Igual que `call`, pero para funciones asíncronas."""
+        _served_fallback.set(False)
+        if not self.breaker.allow_request():
+            self.short_circuited += 1
+            return self._fallback(fallback_key, fallback)
+        started = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(started, e)
+            return self._fallback(fallback_key, fallback)
+        except BaseException:
+            # Cancelada (plazo de quien llama, apagado): sin veredicto, pero si era la llamada
+            # de prueba del circuito semiabierto hay que liberar el hueco o no se probaría más
+            self.breaker.release()
+            raise
+        self.record_success(started)
+        self._remember(fallback_key, result)
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "timeout_s": self.timeout,
+            "breaker": self.breaker.snapshot(),
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "fallbacks_served": self.fallbacks_served,
+            "latency_ms": self.latency.snapshot(),
+        }
+
+
+# Registro compartido: todas las instancias de un mismo servicio usan el mismo circuito
+_providers: dict[str, Provider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str, timeout: float) -> Provider:
+    """Devuelve (creándolo si hace falta) el proveedor registrado con ese nombre."""
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = Provider(
+                name,
+                timeout=timeout,
+                failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_RESET_SECONDS,
+            )
+        return _providers[name]
+
+
+def providers_snapshot() -> dict:
+    """Estado de todos los proveedores registrados (circuito, contadores y latencias)."""
+    with _providers_lock:
+        providers = list(_providers.values())
+    return {p.name: p.snapshot() for p in providers}
+
+
+def _collect_metrics() -> list[str]:
+    with _providers_lock:
+        providers = list(_providers.values())
+    calls, circuit, latency = [], [], []
+    for p in providers:
+        for result, value in (("success", p.successes), ("failure", p.failures), ("short_circuited", p.short_circuited)):
+            calls.append(("", {"provider": p.name, "result": result}, value))
+        state = p.breaker.state
+        for candidate in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            circuit.append(("", {"provider": p.name, "state": candidate}, int(state == candidate)))
+        with p.latency._lock:
+            counts, total_ms, count = list(p.latency.counts), p.latency.total_ms, p.latency.count
+        buckets = tuple(limite / 1000 for limite in LatencyHistogram.BUCKETS_MS)
+        latency += metrics.histogram_samples({"provider": p.name}, buckets, counts, total_ms / 1000, count)
+    return (
+        metrics.format_family("provider_requests_total", "counter", "Llamadas a proveedores externos por resultado.", calls)
+        + metrics.format_family("provider_circuit_state", "gauge", "Estado del circuit breaker de cada proveedor (1 = estado actual).", circuit)
+        + metrics.format_family("provider_request_duration_seconds", "histogram", "Latencia de las llamadas a proveedores externos.", latency)
+        + metrics.format_family(
+            "provider_fallbacks_total", "counter", "Respuestas servidas desde la caché de respaldo.",
+            [("", {"provider": p.name}, p.fallbacks_served) for p in providers],
+        )
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
@@ -0,0 +1,47 @@
+"""
+Serialización JSON y compresión de las respuestas de la API.
+
+- `FastJSONResponse` es la clase de respuesta por defecto de la app (envuelta en `Default`,
+  ver main.py). Las rutas con `response_model` siguen serializando con pydantic
+  (`dump_json`, en Rust); la usan las que devuelven diccionarios sin esquema (/health/etags,
+  /external/status, /readyz...). Con `orjson` instalado serializa con él; si no, con `json`
+  como JSONResponse, con la misma salida.
+- `add_compression` instala gzip para las respuestas de más de COMPRESSION_MIN_BYTES cuando
+  el cliente lo acepta. Starlette ya excluye el stream de eventos (text/event-stream).
+"""
+import json
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # opcional: sin él se usa json
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compacto en UTF-8, como lo envía la API."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que serializa con orjson si está disponible."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def add_compression(app: FastAPI) -> None:
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            GZipMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_BYTES,
+            compresslevel=settings.COMPRESSION_LEVEL,
+        )
@@ -0,0 +1,156 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.database import SessionLocal, Reminder, HealthRecord, EmergencyContact, Emergency, DeletedRecord
+from app.services.collection_versions import REMINDERS, HEALTH, EMERGENCY_CONTACTS, EMERGENCIES
+
+# Colecciones que se sincronizan y su modelo
+MODELS = {
+    REMINDERS: Reminder,
+    HEALTH: HealthRecord,
+    EMERGENCY_CONTACTS: EmergencyContact,
+    EMERGENCIES: Emergency,
+}
+_DELETED = "deleted"
+_EPOCH = datetime(1970, 1, 1)
+CURSOR_VERSION = 1
+
+
+def record_deletion(db: Session, user_id: str, collection: str, record_id: int) -> None:
+    """Deja constancia de un borrado. No confirma: va en la transacción del borrado."""
+    db.add(DeletedRecord(user_id=user_id, collection=collection, record_id=record_id, deleted_at=datetime.utcnow()))
+
+
+# --- Cursor ---
+# Posición (updated_at, id) alcanzada en cada colección y en los borrados. Es opaco para el cliente.
+
+def encode_cursor(positions: dict[str, tuple[datetime, int]]) -> str:
+    data = {"v": CURSOR_VERSION, **{name: [ts.isoformat(), record_id] for name, (ts, record_id) in positions.items()}}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, tuple[datetime, int]]:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data.pop("v") != CURSOR_VERSION:
+            raise ValueError("versión de cursor no soportada")
+        positions = {name: (datetime.fromisoformat(ts), int(record_id)) for name, (ts, record_id) in data.items()}
+    except (KeyError, TypeError, AttributeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"cursor inválido: {e}") from e
+    if set(positions) != set(MODELS) | {_DELETED}:
+        raise ValueError("cursor inválido: faltan colecciones")
+    return positions
+
+
+# --- Consulta ---
+
+def _after(ts_column, id_column, position: tuple[datetime, int]):
+    ts, record_id = position
+    return or_(ts_column > ts, and_(ts_column == ts, id_column > record_id))
+
+
+def get_changes(db: Session, user_id: str, cursor: str | None, limit: int | None = None) -> dict:
+    """
+    Cambios de las colecciones del usuario desde `cursor` (todo, si no hay cursor).
+
+    Solo se devuelven filas con `updated_at` anterior a "ahora - SYNC_SAFETY_SECONDS": una
+    transacción que aún no ha confirmado una fila con marca más antigua no queda nunca por
+    detrás del cursor. Con `has_more` el cliente debe volver a llamar con el nuevo cursor.
+    El cliente debe aplicar primero los borrados y después las altas/cambios.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    now = datetime.utcnow()
+    upper = now - timedelta(seconds=settings.SYNC_SAFETY_SECONDS)
+    # Posición "después de todo lo anterior a upper"
+    upper_position = (upper, 2**62)
+
+    positions = decode_cursor(cursor) if cursor else None
+    # Los borrados más antiguos que la retención ya no existen: hace falta una copia completa
+    if positions and positions[_DELETED][0] < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+        positions = None
+    reset = positions is None
+    if reset:
+        # Copia completa: el cliente reemplaza sus datos y no necesita los borrados anteriores
+        positions = {name: (_EPOCH, 0) for name in MODELS}
+        positions[_DELETED] = upper_position
+
+    result = {"reset": reset, "has_more": False}
+    new_positions = {}
+    for name, model in MODELS.items():
+        rows = (
+            db.query(model)
+            .filter(
+                model.user_id == user_id,
+                _after(model.updated_at, model.id, positions[name]),
+                model.updated_at <= upper,
+            )
+            .order_by(model.updated_at, model.id)
+            .limit(limit + 1)
+            .all()
+        )
+        if len(rows) > limit:
+            rows = rows[:limit]
+            result["has_more"] = True
+        new_positions[name] = (rows[-1].updated_at, rows[-1].id) if rows else positions[name]
+        result[name] = {"upserts": rows, "deleted": []}
+
+    tombstones = (
+        db.query(DeletedRecord)
+        .filter(
+            DeletedRecord.user_id == user_id,
+            _after(DeletedRecord.deleted_at, DeletedRecord.id, positions[_DELETED]),
+            DeletedRecord.deleted_at <= upper,
+        )
+        .order_by(DeletedRecord.deleted_at, DeletedRecord.id)
+        .limit(limit + 1)
+        .all()
+    )
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        result["has_more"] = True
+        new_positions[_DELETED] = (tombstones[-1].deleted_at, tombstones[-1].id)
+    else:
+        # Vistos todos los borrados hasta upper: el cursor avanza aunque no haya ninguno,
+        # así un cliente sin borrados no cae fuera de la retención
+        new_positions[_DELETED] = max(upper_position, positions[_DELETED])
+    for tombstone in tombstones:
+        if tombstone.collection in result:
+            result[tombstone.collection]["deleted"].append(tombstone.record_id)
+
+    result["cursor"] = encode_cursor(new_positions)
+    return result
+
+
+# --- Mantenimiento ---
+
+def backfill_updated_at() -> int:
+    """Marca con la hora actual las filas creadas antes de que existiera `updated_at`."""
+    db = SessionLocal()
+    total = 0
+    try:
+        now = datetime.utcnow()
+        for model in MODELS.values():
+            result = db.execute(update(model).where(model.updated_at.is_(None)).values(updated_at=now))
+            total += result.rowcount
+        db.commit()
+    finally:
+        db.close()
+    return total
+
+
+def prune_tombstones() -> int:
+    """Elimina los borrados más antiguos que la retención (SYNC_TOMBSTONE_DAYS)."""
+    db = SessionLocal()
+    try:
+        limit = datetime.utcnow() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        result = db.execute(delete(DeletedRecord).where(DeletedRecord.deleted_at < limit))
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
@@ -0,0 +1,249 @@
+"""
+Contabilidad del consumo del LLM por usuario, intención y día.
+
+Cada llamada a `generate_response` se anota en memoria (`accountant.record`) sin tocar la
+base de datos. Un worker vuelca lo acumulado por lotes cada USAGE_FLUSH_SECONDS (o antes
+si hay muchas claves pendientes) con un upsert que suma a la fila del día, y vacía lo que
+quede al apagar. Si la base de datos falla, el lote vuelve a memoria y se reintenta en el
+siguiente volcado.
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services import metrics
+from app.services.database import SessionLocal, LlmUsage, engine
+
+logger = logging.getLogger(__name__)
+
+# Intención de las llamadas que fallan antes de clasificar el mensaje
+UNKNOWN_INTENT = "DESCONOCIDA"
+
+# Columnas por las que se puede agrupar un informe
+GROUP_COLUMNS = {
+    "user": LlmUsage.user_id,
+    "intent": LlmUsage.intent,
+    "day": LlmUsage.day,
+    "model": LlmUsage.model,
+}
+
+
+@dataclass
+class UsageTotals:
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_ms_total: float = 0.0
+    latency_ms_max: float = 0.0
+
+    def merge(self, other: "UsageTotals") -> None:
+        for field in fields(self):
+            if field.name == "latency_ms_max":
+                self.latency_ms_max = max(self.latency_ms_max, other.latency_ms_max)
+            else:
+                setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+def _insert(table):
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+class UsageAccountant:
+    """Acumula el consumo en memoria y lo vuelca por lotes a la tabla `llm_usage`."""
+
+    def __init__(self):
+        self.flush_seconds = settings.USAGE_FLUSH_SECONDS
+        self.max_pending = settings.USAGE_FLUSH_MAX_KEYS
+        self._pending: dict[tuple[date, str, str, str], UsageTotals] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def record(
+        self,
+        user_id: str | None,
+        intent: str | None,
+        model: str,
+        *,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        latency_ms: float = 0.0,
+        cache_hit: bool = False,
+        error: bool = False,
+    ) -> None:
+        """Anota una llamada al LLM. No hace E/S; se puede llamar desde cualquier hilo."""
+        key = (datetime.utcnow().date(), user_id or "anonimo", intent or UNKNOWN_INTENT, model)
+        with self._lock:
+            totals = self._pending.get(key)
+            if totals is None:
+                totals = self._pending[key] = UsageTotals()
+            totals.requests += 1
+            totals.cache_hits += int(cache_hit)
+            totals.errors += int(error)
+            totals.prompt_tokens += prompt_tokens
+            totals.completion_tokens += completion_tokens
+            totals.cached_tokens += cached_tokens
+            totals.latency_ms_total += latency_ms
+            totals.latency_ms_max = max(totals.latency_ms_max, latency_ms)
+            full = len(self._pending) >= self.max_pending
+        if full and self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    # --- Volcado ---
+
+    async def flush(self) -> int:
+        """Escribe lo acumulado en la base de datos. Devuelve el número de filas escritas."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error("No se pudo volcar el consumo del LLM: %s", e, extra={"keys": len(batch)})
+            # De vuelta a memoria para el siguiente intento
+            with self._lock:
+                for key, totals in batch.items():
+                    current = self._pending.get(key)
+                    if current is None:
+                        self._pending[key] = totals
+                    else:
+                        current.merge(totals)
+            return 0
+        self.flushes += 1
+        return len(batch)
+
+    def _write(self, batch: dict[tuple[date, str, str, str], UsageTotals]) -> None:
+        table = LlmUsage.__table__
+        statement = _insert(table)
+        excluded = statement.excluded
+        summed = ("requests", "cache_hits", "errors", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms_total")
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.user_id, table.c.intent, table.c.model],
+            set_={
+                **{name: table.c[name] + excluded[name] for name in summed},
+                "latency_ms_max": case(
+                    (excluded.latency_ms_max > table.c.latency_ms_max, excluded.latency_ms_max),
+                    else_=table.c.latency_ms_max,
+                ),
+            },
+        )
+        rows = [
+            {"day": day, "user_id": user_id, "intent": intent, "model": model, **vars(totals)}
+            for (day, user_id, intent, model), totals in batch.items()
+        ]
+        with SessionLocal() as db:
+            db.execute(statement, rows)
+            db.commit()
+
+
+accountant = UsageAccountant()
+
+
+def _collect_metrics() -> list[str]:
+    return metrics.format_family(
+        "llm_usage_pending_keys", "gauge", "Combinaciones de consumo del LLM pendientes de volcar.",
+        [("", {}, accountant.pending)],
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
+
+
+# --- Informes ---
+
+def get_usage(
+    db: Session,
+    group_by: list[str],
+    user_id: str | None = None,
+    since: date | None = None,
+    until: date | None = None,
+) -> list[dict]:
+    """
+    Consumo agregado por las columnas de `group_by` ("user", "intent", "day", "model"),
+    opcionalmente de un usuario y entre dos días (ambos incluidos).
+    """
+    unknown = [name for name in group_by if name not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"No se puede agrupar por: {', '.join(unknown)}")
+    columns = [GROUP_COLUMNS[name].label(name) for name in group_by]
+    query = db.query(
+        *columns,
+        func.sum(LlmUsage.requests).label("requests"),
+        func.sum(LlmUsage.cache_hits).label("cache_hits"),
+        func.sum(LlmUsage.errors).label("errors"),
+        func.sum(LlmUsage.prompt_tokens).label("prompt_tokens"),
+        func.sum(LlmUsage.completion_tokens).label("completion_tokens"),
+        func.sum(LlmUsage.cached_tokens).label("cached_tokens"),
+        func.sum(LlmUsage.latency_ms_total).label("latency_ms_total"),
+        func.max(LlmUsage.latency_ms_max).label("latency_ms_max"),
+    )
+    if user_id is not None:
+        query = query.filter(LlmUsage.user_id == user_id)
+    if since is not None:
+        query = query.filter(LlmUsage.day >= since)
+    if until is not None:
+        query = query.filter(LlmUsage.day <= until)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+
+    report = []
+    for row in query.all():
+        entry = dict(row._mapping)
+        if not entry["requests"]:
+            continue  # sin filas, la agregación sin agrupar devuelve una fila vacía
+        latency_total = entry.pop("latency_ms_total")
+        calls = entry["requests"] - entry["cache_hits"]
+        entry["total_tokens"] = entry["prompt_tokens"] + entry["completion_tokens"]
+        entry["avg_latency_ms"] = round(latency_total / calls, 1) if calls else 0.0
+        entry["max_latency_ms"] = round(entry.pop("latency_ms_max"), 1)
+        report.append(entry)
+    return report
@@ -0,0 +1,230 @@
+"""
+Resumen de los datos del usuario para el prompt del LLM.
+
+Para que el asistente pueda responder "¿qué tenía que hacer mañana?" o "¿cómo ha estado mi
+azúcar?" con datos reales, cada usuario activo tiene en memoria una foto con sus próximos
+CONTEXT_REMINDERS recordatorios y la última medición de cada parámetro de salud (hasta
+CONTEXT_HEALTH_PARAMETERS). Se carga de la base de datos la primera vez y después la
+mantienen al día las escrituras de `reminder_service` y `health_service`:
+
+- un recordatorio o una medición nuevos se incorporan a la foto sin consultar nada;
+- editar o borrar descarta la foto del usuario, que se recarga en el siguiente uso;
+- un recordatorio cuya hora ya pasó también la descarta (los recurrentes avanzan).
+
+Solo se añade al prompt cuando el mensaje habla de recordatorios o de salud (`temas`), y
+solo la parte que corresponde. Es por proceso: CONTEXT_SNAPSHOT_TTL_SECONDS acota lo
+desactualizada que puede quedar si otro worker escribe los datos del usuario.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.services import metrics
+from app.services.database import HealthRecord, Reminder, SessionLocal
+
+RECORDATORIOS = "recordatorios"
+SALUD = "salud"
+
+_TEMAS = {
+    RECORDATORIOS: re.compile(
+        r"\b(recordatorio\w*|recuerd\w*|record\w*|agenda\w*|cita\w*|pendiente\w*|tengo que|tenia que|"
+        r"que (tengo|tenia|hay) (que|para)|manana|pasado manana|hoy|esta semana|pastilla\w*|medicamento\w*|remedio\w*)\b"
+    ),
+    SALUD: re.compile(
+        r"\b(salud|presion|azucar|glucosa|pulso|peso|temperatura|colesterol|saturacion|oxigeno|medicion\w*|"
+        r"como (he|ha) estado|mis (datos|valores|niveles))\b"
+    ),
+}
+
+# Largo máximo de cada texto en el prompt
+_MAX_TEXT = 80
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def temas(mensaje: str) -> set[str]:
+    """Los datos del usuario que pueden hacer falta para responder el mensaje."""
+    texto = _normalizar(mensaje)
+    return {tema for tema, patron in _TEMAS.items() if patron.search(texto)}
+
+
+@dataclass
+class Snapshot:
+    # (due_at UTC, id, texto, rrule) ordenados por hora
+    reminders: list[tuple[datetime, int, str, str | None]] = field(default_factory=list)
+    # parámetro -> (timestamp, valor)
+    health: dict[str, tuple[datetime, str]] = field(default_factory=dict)
+    loaded: float = field(default_factory=time.monotonic)
+
+
+def _local(value: datetime) -> str:
+    local = value.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(settings.DEFAULT_TIMEZONE))
+    return f"{local:%d/%m %H:%M}"
+
+
+def _corto(texto: str) -> str:
+    texto = " ".join(str(texto).split())
+    return texto if len(texto) <= _MAX_TEXT else texto[:_MAX_TEXT - 1] + "…"
+
+
+def _as_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def render(snapshot: Snapshot, wanted: set[str]) -> str:
+    """Texto compacto para el prompt con las partes pedidas, o "" si no hay nada que contar."""
+    partes = []
+    if RECORDATORIOS in wanted:
+        if snapshot.reminders:
+            items = "; ".join(
+                f"{_local(due)} {_corto(text)}" + (" (se repite)" if rrule else "")
+                for due, _, text, rrule in snapshot.reminders
+            )
+            partes.append(f"Próximos recordatorios: {items}.")
+        else:
+            partes.append("No tiene recordatorios próximos.")
+    if SALUD in wanted and snapshot.health:
+        ultimas = sorted(snapshot.health.items(), key=lambda kv: kv[1][0], reverse=True)
+        items = "; ".join(f"{_corto(parametro)}: {_corto(valor)} ({_local(ts)})" for parametro, (ts, valor) in ultimas)
+        partes.append(f"Últimas mediciones de salud: {items}.")
+    if not partes:
+        return ""
+    return "Datos del usuario (hora local; úsalos solo si la pregunta los necesita):\n" + "\n".join(partes)
+
+
+class UserContextStore:
+    """Fotos por usuario, con expulsión LRU y caducidad."""
+
+    def __init__(self, max_users: int, ttl_seconds: float, reminders: int, health_parameters: int):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.reminders = reminders
+        self.health_parameters = health_parameters
+        self._snapshots: OrderedDict[str, Snapshot] = OrderedDict()
+        # Cargas en curso: True si llegó una escritura del usuario durante la carga
+        self._loading: dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def users(self) -> int:
+        return len(self._snapshots)
+
+    def get(self, user_id: str) -> Snapshot | None:
+        """La foto del usuario si está en memoria y sigue valiendo; si no, None (usar `load`)."""
+        now = datetime.utcnow()
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None and (
+                time.monotonic() - snapshot.loaded > self.ttl_seconds
+                or (snapshot.reminders and snapshot.reminders[0][0] <= now)
+            ):
+                del self._snapshots[user_id]
+                snapshot = None
+            if snapshot is not None:
+                self._snapshots.move_to_end(user_id)
+        metrics.record_cache("user_context", snapshot is not None)
+        return snapshot
+
+    def load(self, user_id: str) -> Snapshot:
+        """Carga la foto de la base de datos y la guarda (bloquea: llamar desde un hilo)."""
+        with self._lock:
+            self._loading[user_id] = False
+        snapshot = Snapshot()
+        with SessionLocal() as db:
+            rows = (
+                db.query(Reminder.due_at, Reminder.id, Reminder.text, Reminder.rrule)
+                .filter(Reminder.user_id == user_id, Reminder.due_at > datetime.utcnow())
+                .order_by(Reminder.due_at, Reminder.id)
+                .limit(self.reminders)
+                .all()
+            )
+            snapshot.reminders = [tuple(row) for row in rows]
+            # Las mediciones recientes bastan para encontrar la última de cada parámetro
+            records = (
+                db.query(HealthRecord.parameter, HealthRecord.timestamp, HealthRecord.value)
+                .filter(HealthRecord.user_id == user_id)
+                .order_by(HealthRecord.timestamp.desc())
+                .limit(self.health_parameters * 20)
+                .all()
+            )
+        for parameter, timestamp, value in records:
+            if len(snapshot.health) >= self.health_parameters:
+                break
+            snapshot.health.setdefault(parameter, (_as_datetime(timestamp), value))
+        with self._lock:
+            if not self._loading.pop(user_id, True):
+                self._snapshots[user_id] = snapshot
+                self._snapshots.move_to_end(user_id)
+                while len(self._snapshots) > self.max_users:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    # --- Escrituras (llamadas por los servicios tras confirmar) ---
+
+    def add_reminder(self, reminder: Reminder) -> None:
+        with self._lock:
+            snapshot = self._touch(reminder.user_id)
+            if snapshot is None or reminder.due_at is None or reminder.due_at <= datetime.utcnow():
+                return
+            entry = (reminder.due_at, reminder.id, reminder.text, reminder.rrule)
+            if len(snapshot.reminders) >= self.reminders and entry >= snapshot.reminders[-1]:
+                return
+            snapshot.reminders = sorted(snapshot.reminders + [entry])[: self.reminders]
+
+    def add_health_record(self, record: HealthRecord) -> None:
+        with self._lock:
+            snapshot = self._touch(record.user_id)
+            if snapshot is None:
+                return
+            timestamp = _as_datetime(record.timestamp)
+            current = snapshot.health.get(record.parameter)
+            if current is not None and current[0] > timestamp:
+                return
+            snapshot.health[record.parameter] = (timestamp, record.value)
+            if len(snapshot.health) > self.health_parameters:
+                oldest = min(snapshot.health, key=lambda p: snapshot.health[p][0])
+                del snapshot.health[oldest]
+
+    def invalidate(self, user_id: str) -> None:
+        """Ediciones y borrados: la foto se vuelve a cargar en el siguiente uso."""
+        with self._lock:
+            self._touch(user_id)
+            self._snapshots.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+            self._loading.clear()
+
+    def _touch(self, user_id: str) -> Snapshot | None:
+        """Con el lock tomado: marca la carga en curso como desactualizada y devuelve la foto."""
+        if user_id in self._loading:
+            self._loading[user_id] = True
+        return self._snapshots.get(user_id)
+
+
+store = UserContextStore(
+    max_users=settings.CONTEXT_SNAPSHOT_MAX_USERS,
+    ttl_seconds=settings.CONTEXT_SNAPSHOT_TTL_SECONDS,
+    reminders=settings.CONTEXT_REMINDERS,
+    health_parameters=settings.CONTEXT_HEALTH_PARAMETERS,
+)
+
+
+def _collect_metrics() -> list[str]:
+    return metrics.format_family(
+        "user_context_snapshots", "gauge", "Usuarios con su resumen de datos para el LLM en memoria.",
+        [("", {}, store.users)],
+    )
+
+
+metrics.registry.add_collector(_collect_metrics)
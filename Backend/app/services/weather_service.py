@@ -1,19 +1,28 @@
+import functools
 import requests
 from typing import Optional, Dict
+from app.config import settings
+from app.services.resilience import get_provider, ProviderError
 
 class WeatherAPIService:
-    BASE_URL = "https://api.weatherapi.com/v1/current.json"
-
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
         self.api_key = api_key
+        self.base_url = base_url or f"{settings.WEATHER_API_URL.rstrip('/')}/current.json"
+        self.provider = get_provider("weatherapi", timeout=settings.WEATHER_TIMEOUT)
 
     def get_weather(self, location: str, lang: str = "es") -> Optional[Dict]:
+        # Si el proveedor falla o el circuito está abierto se devuelve el último clima bueno (o None)
+        return self.provider.call(self._fetch_weather, location, lang, fallback_key=(location.lower(), lang))
+
+    def _fetch_weather(self, location: str, lang: str) -> Optional[Dict]:
         params = {
             "key": self.api_key,
             "q": location,
             "lang": lang
         }
-        response = requests.get(self.BASE_URL, params=params)
+        response = requests.get(self.base_url, params=params, timeout=self.provider.timeout)
+        if response.status_code >= 500:
+            raise ProviderError(f"HTTP {response.status_code}")
         if response.status_code == 200:
             data = response.json()
             # Filtrar solo los campos esenciales para el front
@@ -27,3 +36,9 @@ class WeatherAPIService:
                 }
                 return filtered
         return None
+
+
+@functools.cache
+def get_service() -> WeatherAPIService:
+    """Instancia compartida, creada en el primer uso."""
+    return WeatherAPIService(settings.WEATHER_API_KEY)
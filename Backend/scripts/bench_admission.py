@@ -0,0 +1,129 @@
+"""
+Comprueba el control de admisión del chat con el LLM simulado (fake_services.py) lento.
+
+1. Ráfaga de un usuario: pasan CHAT_USER_BURST mensajes y el resto recibe 429 con Retry-After.
+   Una emergencia del mismo usuario pasa aunque esté limitado.
+2. Prioridad: muchos usuarios charlando saturan la cola del LLM y, con ella llena, llegan
+   emergencias. Se compara su latencia con la de la charla.
+3. Cola llena: lo que no cabe recibe 503 con Retry-After, y /metrics expone la profundidad
+   de la cola y la espera.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_admission.py [latencia_llm_ms] [mensajes_de_charla]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPTS_DIR, '..')))
+sys.path.append(SCRIPTS_DIR)
+
+LATENCIA_MS = sys.argv[1] if len(sys.argv) > 1 else "400"
+CHARLA = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+EMERGENCIAS = 5
+PUERTO = 9043
+
+import fake_services
+from loadtest import lifespan, percentile
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{LATENCIA_MS}")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CHAT_USER_BURST"] = "5"
+os.environ["CHAT_GLOBAL_RATE_PER_SECOND"] = "0"
+os.environ["LLM_MAX_CONCURRENCY"] = "2"
+os.environ["LLM_QUEUE_SIZE"] = str(CHARLA // 5)
+
+import httpx
+from app.main import app
+
+errores = []
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+async def usuario(client: httpx.AsyncClient, nombre: str) -> dict:
+    await client.post("/auth/register", json={"username": nombre, "pin": "1234", "age": 80, "city": "Santiago"})
+    token = (await client.post("/auth/login", json={"username": nombre, "pin": "1234"})).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def enviar(client: httpx.AsyncClient, headers: dict, mensaje: str) -> tuple[int, float, str | None]:
+    inicio = time.perf_counter()
+    respuesta = await client.post("/chat/", json={"message": mensaje}, headers=headers)
+    return respuesta.status_code, (time.perf_counter() - inicio) * 1000, respuesta.headers.get("retry-after")
+
+
+async def metrica(client: httpx.AsyncClient, linea: str) -> float:
+    texto = (await client.get("/metrics")).text
+    return next((float(l.split()[-1]) for l in texto.splitlines() if l.startswith(linea + " ")), 0.0)
+
+
+async def rafaga(client: httpx.AsyncClient) -> None:
+    print("Ráfaga de un usuario (20 mensajes seguidos):")
+    headers = await usuario(client, "insistente")
+    resultados = [await enviar(client, headers, f"Hola otra vez ({i})") for i in range(20)]
+    codigos = [codigo for codigo, _, _ in resultados]
+    esperar(codigos.count(200) == 5 and codigos.count(429) == 15, f"5 admitidos y 15 con 429 ({codigos.count(200)} y {codigos.count(429)})")
+    esperar(all(r for c, _, r in resultados if c == 429), "los 429 llevan Retry-After")
+    codigo, _, _ = await enviar(client, headers, "¡Ayuda, me caí en el baño!")
+    esperar(codigo == 200, "una emergencia pasa aunque el usuario esté limitado")
+
+
+async def prioridad(client: httpx.AsyncClient) -> None:
+    print(f"\nPrioridad ({CHARLA} mensajes de charla, LLM de {LATENCIA_MS} ms, 2 llamadas a la vez, cola de {CHARLA // 5}):")
+    cabeceras = [await usuario(client, f"charla{i}") for i in range(CHARLA)]
+    urgentes = [await usuario(client, f"urgente{i}") for i in range(EMERGENCIAS)]
+
+    charla = [asyncio.create_task(enviar(client, h, f"Cuéntame algo bonito ({i})")) for i, h in enumerate(cabeceras)]
+    # Las emergencias llegan con la cola ya llena
+    profundidad = 0.0
+    while profundidad < CHARLA // 5 and not all(t.done() for t in charla):
+        await asyncio.sleep(0.02)
+        profundidad = await metrica(client, 'llm_queue_depth{priority="normal"}')
+    emergencias = [asyncio.create_task(enviar(client, h, "Me duele mucho el pecho, llamen una ambulancia")) for h in urgentes]
+    charla, emergencias = await asyncio.gather(asyncio.gather(*charla), asyncio.gather(*emergencias))
+
+    atendidas = sorted(ms for codigo, ms, _ in charla if codigo == 200)
+    rechazadas = [(codigo, r) for codigo, _, r in charla if codigo != 200]
+    urgentes_ms = sorted(ms for codigo, ms, _ in emergencias if codigo == 200)
+    espera = {}
+    for prioridad in ("normal", "urgent"):
+        total = await metrica(client, f'llm_queue_wait_seconds_sum{{priority="{prioridad}"}}')
+        cuenta = await metrica(client, f'llm_queue_wait_seconds_count{{priority="{prioridad}"}}')
+        espera[prioridad] = total / cuenta * 1000 if cuenta else 0.0
+    print(f"  charla:      {len(atendidas)} atendidas, p50 {percentile(atendidas, 50):6.0f} ms, p95 {percentile(atendidas, 95):6.0f} ms, espera media en cola {espera['normal']:5.0f} ms")
+    print(f"  emergencias: {len(urgentes_ms)} atendidas, p50 {percentile(urgentes_ms, 50):6.0f} ms, p95 {percentile(urgentes_ms, 95):6.0f} ms, espera media en cola {espera['urgent']:5.0f} ms")
+    esperar(profundidad > 0, f"/metrics expone la profundidad de la cola ({profundidad:.0f} en espera)")
+    esperar(len(urgentes_ms) == EMERGENCIAS, "todas las emergencias atendidas con la cola llena")
+    esperar(espera["urgent"] < espera["normal"], "las emergencias esperan menos en la cola que la charla")
+    esperar(bool(rechazadas) and all(c == 503 and r for c, r in rechazadas), f"lo que no cabe recibe 503 con Retry-After ({len(rechazadas)})")
+
+
+async def main() -> int:
+    state: dict = {}
+    await lifespan(app, "startup", state)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+    try:
+        await rafaga(client)
+        await prioridad(client)
+    finally:
+        await client.aclose()
+        await lifespan(app, "shutdown", state)
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,127 @@
+"""
+Prueba y compara los backends de la caché compartida contra el Redis simulado (fake_redis.py).
+
+1. Comprobaciones: ida y vuelta de valores (comprimidos y sin comprimir), caducidad,
+   invalidación vista por otro worker y Redis caído (la caché responde fallo, no error).
+2. Tasa de aciertos con varios workers: cada worker tiene su propio backend (como procesos
+   distintos) y reciben peticiones repartidas al azar sobre las mismas claves.
+3. Coste de un acierto en cada backend.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_cache.py [workers] [peticiones]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+PETICIONES = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+PUERTO = 6391
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["REDIS_URL"] = f"redis://127.0.0.1:{PUERTO}/0"
+os.environ.setdefault("CACHE_NEAR_TTL_SECONDS", "5")
+
+import fake_redis
+from app.services import cache
+
+RESPUESTA = {"intencion": "CONVERSACION_GENERAL", "emocion": "Positiva", "respuesta": "¡Hola! Me alegra saludarte. ¿En qué te puedo ayudar hoy?"}
+
+
+async def comprobar(redis: fake_redis.FakeRedis) -> list[str]:
+    errores = []
+
+    def esperar(condicion: bool, descripcion: str) -> None:
+        print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+        if not condicion:
+            errores.append(descripcion)
+
+    for tipo in ("memory", "redis", "near"):
+        c = cache.Cache(f"prueba-{tipo}", ttl=60, backend=cache.create_backend(tipo))
+        grande = {"historial": ["mensaje largo " * 20] * 20}
+        await c.set(("hola", "", ""), RESPUESTA)
+        await c.set("grande", grande)
+        esperar(await c.get(("hola", "", "")) == RESPUESTA and await c.get("grande") == grande, f"{tipo}: ida y vuelta")
+        await c.set("corta", 1, ttl=0.05)
+        await asyncio.sleep(0.1)
+        if tipo == "near":
+            await c.backend.local.delete(await c._key("corta"))
+        esperar(await c.get("corta") is None, f"{tipo}: caducidad")
+        await c.backend.close()
+
+    # Invalidación: el segundo worker deja de ver la entrada al releer la generación
+    a = cache.Cache("inval", backend=cache.create_backend("redis"))
+    b = cache.Cache("inval", backend=cache.create_backend("redis"))
+    await a.set("k", "v")
+    esperar(await b.get("k") == "v", "redis: otro worker ve la entrada")
+    await a.invalidate()
+    b._generation_read_at = float("-inf")  # sin esperar GENERATION_REFRESH_SECONDS
+    esperar(await b.get("k") is None, "redis: invalidate() se ve en el otro worker")
+
+    tamano = len(cache.encode({"historial": ["mensaje largo " * 20] * 20}))
+    esperar(tamano < 1000, f"valores grandes comprimidos ({tamano} bytes)")
+
+    # Redis caído: fallos de caché, sin excepciones y sin esperar más que el plazo
+    c = cache.Cache("caida", backend=cache.create_backend("near"))
+    redis.stop()
+    await asyncio.sleep(0.05)
+    inicio = time.perf_counter()
+    try:
+        await c.set("x", 1)
+        valor = await c.get("x")  # la copia local sigue sirviendo
+        otro = await c.get("y")
+        esperar(valor == 1 and otro is None, f"near con Redis caído: responde ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+    except Exception as e:
+        esperar(False, f"near con Redis caído lanzó {type(e).__name__}: {e}")
+    return errores
+
+
+async def tasa_de_aciertos(tipo: str) -> float:
+    """Cada worker responde por el LLM las claves que no encuentra en su caché."""
+    workers = [cache.Cache("llm", ttl=600, backend=cache.create_backend(tipo)) for _ in range(WORKERS)]
+    await workers[0].invalidate()  # empezar vacía
+    aciertos = 0
+    rnd = random.Random(42)
+    claves = max(1, PETICIONES // 8)  # cada clave se pide de media 8 veces
+    for _ in range(PETICIONES):
+        worker = rnd.choice(workers)
+        clave = ("mensaje", rnd.randrange(claves))
+        if await worker.get(clave) is not None:
+            aciertos += 1
+        else:
+            await worker.set(clave, RESPUESTA)
+    for worker in workers:
+        await worker.backend.close()
+    return aciertos / PETICIONES
+
+
+async def coste_acierto(tipo: str, repeticiones: int = 2000) -> float:
+    c = cache.Cache("coste", backend=cache.create_backend(tipo))
+    await c.set("clave", RESPUESTA)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        await c.get("clave")
+    await c.backend.close()
+    return (time.perf_counter() - inicio) * 1e6 / repeticiones
+
+
+async def main() -> int:
+    redis = fake_redis.run_in_background(port=PUERTO)
+    print(f"Tasa de aciertos ({WORKERS} workers, {PETICIONES} peticiones):")
+    for tipo in ("memory", "redis", "near"):
+        print(f"  {tipo:<7} {await tasa_de_aciertos(tipo) * 100:5.1f} %")
+    print("\nCoste de un acierto:")
+    for tipo in ("memory", "redis", "near"):
+        print(f"  {tipo:<7} {await coste_acierto(tipo):7.1f} µs")
+    print(f"\nComprobaciones ({redis.commands} comandos atendidos hasta ahora):")
+    errores = await comprobar(redis)
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
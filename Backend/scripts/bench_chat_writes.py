@@ -0,0 +1,179 @@
+"""
+Escrituras del chat: en el momento frente a diferidas por lotes (app/services/chat_writer.py).
+
+Varios usuarios a la vez mantienen una conversación con el LLM simulado (fake_services.py)
+mezclando charla, datos de salud y recordatorios. Para cada modo se mide:
+
+- latencia del chat (p50/p95) y turnos por segundo,
+- sentencias de escritura (INSERT/UPDATE/DELETE enviadas a la base de datos) y transacciones
+  con escrituras por turno,
+  contadas con eventos del engine de SQLAlchemy.
+
+Al terminar comprueba que no se perdió nada y que el historial de cada usuario está en
+orden. Sale con código 1 si falla alguna comprobación.
+
+Cada usuario piensa PAUSA_MS antes de escribir el siguiente mensaje, como en una conversación
+real: sin pausa, cada mensaje espera a que se escriba el turno anterior (`barrier`).
+
+Uso: python bench_chat_writes.py [usuarios] [mensajes_por_usuario] [latencia_llm_ms] [pausa_ms]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPTS_DIR, '..')))
+sys.path.append(SCRIPTS_DIR)
+
+USUARIOS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+MENSAJES = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+LATENCIA_MS = sys.argv[3] if len(sys.argv) > 3 else "50"
+PAUSA_MS = float(sys.argv[4]) if len(sys.argv) > 4 else 300
+PUERTO = 9045
+
+import fake_services
+from loadtest import lifespan, percentile
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{LATENCIA_MS}")
+config.latency["duckling"] = fake_services.LatencyDistribution("fixed:5")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+os.environ["CHAT_GLOBAL_RATE_PER_SECOND"] = "0"
+
+import httpx
+from sqlalchemy import event
+from app.main import app
+from app.services.chat_writer import writer
+from app.services.database import SessionLocal, engine, ConversationHistory, HealthRecord, Reminder
+
+# Un mensaje de cada tipo por vuelta: charla, salud, recordatorio y charla
+PLANTILLAS = (
+    "Hola, cuéntame algo bonito ({})",
+    "Me duele la rodilla desde ayer ({})",
+    "Recuérdame llamar a mi hija mañana ({})",
+    "Qué bonito está el día ({})",
+)
+
+errores = []
+escrituras = {"sentencias": 0, "transacciones": 0}
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _sentencia(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+        escrituras["sentencias"] += 1
+        conn.info["escribe"] = True
+
+
+@event.listens_for(engine, "commit")
+def _commit(conn):
+    if conn.info.pop("escribe", False):
+        escrituras["transacciones"] += 1
+
+
+async def usuario(client: httpx.AsyncClient, nombre: str) -> dict:
+    await client.post("/auth/register", json={"username": nombre, "pin": "1234", "age": 80, "city": "Santiago"})
+    token = (await client.post("/auth/login", json={"username": nombre, "pin": "1234"})).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def conversar(client: httpx.AsyncClient, headers: dict, nombre: str) -> list[float]:
+    tiempos = []
+    for i in range(MENSAJES):
+        mensaje = PLANTILLAS[i % len(PLANTILLAS)].format(f"{nombre}-{i}")
+        inicio = time.perf_counter()
+        respuesta = await client.post("/chat/", json={"message": mensaje}, headers=headers)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code != 200:
+            errores.append(f"{nombre}: {respuesta.status_code} {respuesta.text[:100]}")
+        await asyncio.sleep(PAUSA_MS / 1000)
+    return tiempos
+
+
+async def medir(diferido: bool) -> dict:
+    writer.enabled = diferido
+    state: dict = {}
+    await lifespan(app, "startup", state)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+    prefijo = "diferido" if diferido else "directo"
+    try:
+        nombres = [f"{prefijo}{i}" for i in range(USUARIOS)]
+        cabeceras = [await usuario(client, n) for n in nombres]
+        # Sin las escrituras del arranque (migración, calentamiento del pool)
+        while (await client.get("/readyz")).status_code != 200:
+            await asyncio.sleep(0.05)
+        escrituras.update(sentencias=0, transacciones=0)
+        inicio = time.perf_counter()
+        tiempos = await asyncio.gather(*(conversar(client, h, n) for h, n in zip(cabeceras, nombres)))
+        duracion = time.perf_counter() - inicio - MENSAJES * PAUSA_MS / 1000
+        await writer.flush()
+        contadas = dict(escrituras)
+    finally:
+        await client.aclose()
+        await lifespan(app, "shutdown", state)  # vuelca lo que quede en la cola
+    turnos = USUARIOS * MENSAJES
+    latencias = sorted(t for lista in tiempos for t in lista)
+    return {
+        "nombres": nombres,
+        "p50": percentile(latencias, 50),
+        "p95": percentile(latencias, 95),
+        "turnos_s": turnos / duracion,
+        "sentencias": contadas["sentencias"] / turnos,
+        "transacciones": contadas["transacciones"] / turnos,
+    }
+
+
+def comprobar(nombres: list[str]) -> None:
+    """Todo escrito y, por usuario, en el orden en que se envió."""
+    salud_esperada = sum(1 for i in range(MENSAJES) if i % len(PLANTILLAS) == 1)
+    recordatorios_esperados = sum(1 for i in range(MENSAJES) if i % len(PLANTILLAS) == 2)
+    desordenados = incompletos = 0
+    with SessionLocal() as db:
+        for nombre in nombres:
+            filas = db.query(ConversationHistory).filter(ConversationHistory.user_id == nombre).order_by(ConversationHistory.id).all()
+            esperado = [PLANTILLAS[i % len(PLANTILLAS)].format(f"{nombre}-{i}") for i in range(MENSAJES)]
+            if len(filas) != 2 * MENSAJES:
+                incompletos += 1
+                continue
+            if [f.content for f in filas if f.role == "user"] != esperado or [f.role for f in filas] != ["user", "assistant"] * MENSAJES:
+                desordenados += 1
+            salud = db.query(HealthRecord).filter(HealthRecord.user_id == nombre).count()
+            recordatorios = db.query(Reminder).filter(Reminder.user_id == nombre).count()
+            if salud != salud_esperada or recordatorios != recordatorios_esperados:
+                incompletos += 1
+    esperar(not incompletos, f"historial, salud y recordatorios completos ({len(nombres) - incompletos}/{len(nombres)} usuarios)")
+    esperar(not desordenados, "el historial de cada usuario está en el orden de envío")
+
+
+async def main() -> int:
+    print(f"{USUARIOS} usuarios x {MENSAJES} mensajes, LLM de {LATENCIA_MS} ms, {PAUSA_MS:.0f} ms entre mensajes:")
+    resultados = {}
+    for diferido in (False, True):
+        resultados[diferido] = await medir(diferido)
+    print(f"  {'modo':<10} {'p50 ms':>8} {'p95 ms':>8} {'turnos/s':>9} {'escrituras/turno':>17} {'transacciones/turno':>20}")
+    for diferido, r in resultados.items():
+        print(f"  {'diferido' if diferido else 'directo':<10} {r['p50']:8.1f} {r['p95']:8.1f} {r['turnos_s']:9.1f} {r['sentencias']:17.2f} {r['transacciones']:20.2f}")
+    print()
+    for r in resultados.values():
+        comprobar(r["nombres"])
+    esperar(resultados[True]["transacciones"] < resultados[False]["transacciones"], "los lotes reducen las transacciones por turno")
+    for error in errores[:5]:
+        print(f"  {error}")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,95 @@
+"""
+Mide el efecto de los ETag en los listados (GET /reminders/, /health/, /emergency/contacts/,
+/emergency/): compara una recarga completa con una recarga condicional (If-None-Match),
+contando bytes transferidos y consultas SQL por petición, y comprueba que una escritura
+cambia el ETag.
+
+Uso: python bench_conditional_get.py [filas_por_coleccion] [recargas]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FILAS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+RECARGAS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("ADMIN_API_KEY", "bench")
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.database import SessionLocal, engine, Emergency
+from app.services import reminder_service, health_service, emergency_service, collection_versions
+from app.models.emergency_schemas import EmergencyContactCreate
+
+consultas = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def contar(*args):
+    global consultas
+    consultas += 1
+
+
+RUTAS = ["/reminders/", "/health/", "/emergency/contacts/", "/emergency/"]
+
+
+def medir(client, ruta, headers):
+    global consultas
+    respuesta = client.get(ruta, headers=headers)
+    etag = respuesta.headers["etag"]
+    condicional = {**headers, "If-None-Match": etag}
+
+    resultados = {}
+    for nombre, cabeceras in (("completa", headers), ("condicional", condicional)):
+        consultas, bytes_total = 0, 0
+        inicio = time.perf_counter()
+        for _ in range(RECARGAS):
+            r = client.get(ruta, headers=cabeceras)
+            bytes_total += len(r.content)
+        resultados[nombre] = (
+            (time.perf_counter() - inicio) * 1000 / RECARGAS, bytes_total / RECARGAS, consultas / RECARGAS, r.status_code
+        )
+    return etag, resultados
+
+
+def main():
+    with TestClient(app) as client:
+        usuario = "etag"
+        client.post("/auth/register", json={"username": usuario, "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": usuario, "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        db = SessionLocal()
+        for i in range(FILAS):
+            reminder_service.add_reminder(db, usuario, f"Recordatorio {i}", f"2030-01-{i % 28 + 1:02d}T08:00:00")
+            health_service.save_health_data(db, usuario, "pulso", str(60 + i % 40))
+            emergency_service.create_emergency_contact(db, usuario, EmergencyContactCreate(name=f"Contacto {i}", phone_number=f"+569{i:08d}"))
+            db.add(Emergency(user_id=usuario, tipo_emergencia="Caída", mensaje_opcional="", timestamp=f"2030-01-01T00:00:{i % 60:02d}"))
+        collection_versions.bump(db, usuario, collection_versions.EMERGENCIES)
+        db.commit()
+        db.close()
+
+        print(f"{FILAS} filas por colección, {RECARGAS} recargas por ruta")
+        print(f"{'ruta':<22}{'tipo':<13}{'ms/petición':>12}{'bytes':>10}{'consultas':>11}  estado")
+        for ruta in RUTAS:
+            etag, resultados = medir(client, ruta, headers)
+            for nombre, (ms, size, queries, code) in resultados.items():
+                print(f"{ruta:<22}{nombre:<13}{ms:>12.2f}{size:>10.0f}{queries:>11.1f}  {code}")
+
+        # Una escritura debe invalidar el ETag de su colección (y solo de esa)
+        antes = {ruta: client.get(ruta, headers=headers).headers["etag"] for ruta in RUTAS}
+        client.post("/reminders/", json={"text": "Nuevo", "datetime": "2030-02-01T08:00:00"}, headers=headers)
+        despues = {ruta: client.get(ruta, headers=headers).headers["etag"] for ruta in RUTAS}
+        print("ETag cambiado tras crear un recordatorio:", {r: antes[r] != despues[r] for r in RUTAS})
+        print("Estadísticas:", client.get("/health/etags", headers={"X-Admin-Key": os.environ["ADMIN_API_KEY"]}).json())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Buffer de conversaciones en memoria (app/services/conversation_buffer.py) con el LLM simulado.
+
+1. Consultas del historial por turno y tiempo de la etapa "history", con el buffer y sin él.
+2. Coherencia: lo que hay en memoria coincide con los últimos mensajes guardados en la base
+   de datos, también después de vaciar el buffer (carga perezosa) y de una expulsión.
+3. Límite de memoria: con un límite limite el buffer no lo supera y expulsa usuarios.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_conversation_buffer.py [usuarios] [mensajes_por_usuario]
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPTS_DIR, '..')))
+sys.path.append(SCRIPTS_DIR)
+
+USUARIOS = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+MENSAJES = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+PUERTO = 9046
+
+import fake_services
+from loadtest import lifespan
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution("fixed:20")
+config.latency["duckling"] = fake_services.LatencyDistribution("fixed:5")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+os.environ["CHAT_GLOBAL_RATE_PER_SECOND"] = "0"
+
+import httpx
+from sqlalchemy import event
+from app.main import app
+from app.services import llm_service
+from app.services.chat_writer import writer
+from app.services.conversation_buffer import buffer
+from app.services.database import SessionLocal, engine
+
+errores = []
+consultas = {"historial": 0}
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _consulta(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith("SELECT") and "FROM conversation_history" in statement:
+        consultas["historial"] += 1
+
+
+async def usuario(client: httpx.AsyncClient, nombre: str) -> dict:
+    await client.post("/auth/register", json={"username": nombre, "pin": "1234", "age": 80, "city": "Santiago"})
+    token = (await client.post("/auth/login", json={"username": nombre, "pin": "1234"})).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def conversar(client: httpx.AsyncClient, headers: dict, nombre: str, mensajes: int, desde: int = 0) -> None:
+    for i in range(desde, desde + mensajes):
+        respuesta = await client.post("/chat/", json={"message": f"Hola, te cuento algo ({nombre}-{i})"}, headers=headers)
+        if respuesta.status_code != 200:
+            errores.append(f"{nombre}: {respuesta.status_code}")
+        await asyncio.sleep(0.05)
+
+
+async def etapa_history(client: httpx.AsyncClient) -> tuple[float, float]:
+    texto = (await client.get("/metrics")).text
+    valores = {
+        linea.split("{")[0]: float(linea.split()[-1])
+        for linea in texto.splitlines()
+        if 'stage="history"' in linea and ("_sum{" in linea or "_count{" in linea)
+    }
+    return valores.get("app_stage_duration_seconds_sum", 0.0), valores.get("app_stage_duration_seconds_count", 0.0)
+
+
+async def medir(client: httpx.AsyncClient, prefijo: str, activado: bool, max_bytes: int) -> dict:
+    buffer.max_bytes = max_bytes if activado else 0
+    buffer.clear()
+    nombres = [f"{prefijo}{i}" for i in range(USUARIOS)]
+    cabeceras = [await usuario(client, n) for n in nombres]
+    consultas["historial"] = 0
+    suma, cuenta = await etapa_history(client)
+    await asyncio.gather(*(conversar(client, h, n, MENSAJES) for h, n in zip(cabeceras, nombres)))
+    suma2, cuenta2 = await etapa_history(client)
+    turnos = USUARIOS * MENSAJES
+    return {
+        "nombres": nombres,
+        "cabeceras": cabeceras,
+        "consultas": consultas["historial"] / turnos,
+        "history_ms": (suma2 - suma) / (cuenta2 - cuenta) * 1000 if cuenta2 > cuenta else 0.0,
+    }
+
+
+async def coherente(nombres: list[str]) -> tuple[int, int]:
+    """(usuarios en memoria, de ellos los que coinciden con la base de datos)."""
+    await writer.flush()
+    en_memoria = iguales = 0
+    with SessionLocal() as db:
+        for nombre in nombres:
+            memoria = buffer.get(nombre)
+            if memoria is None:
+                continue
+            en_memoria += 1
+            guardado = await llm_service.get_recent_conversation_history(nombre, db)
+            iguales += memoria == guardado
+    return en_memoria, iguales
+
+
+async def main() -> int:
+    state: dict = {}
+    await lifespan(app, "startup", state)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+    max_bytes = buffer.max_bytes
+    try:
+        print(f"{USUARIOS} usuarios x {MENSAJES} mensajes:")
+        sin = await medir(client, "sin", False, max_bytes)
+        con = await medir(client, "con", True, max_bytes)
+        for nombre, r in (("sin buffer", sin), ("con buffer", con)):
+            print(f"  {nombre:<11} consultas del historial por turno {r['consultas']:5.2f}   etapa history {r['history_ms']:6.2f} ms")
+        esperar(con["consultas"] <= 1 / MENSAJES + 1e-9, "con el buffer solo el primer turno de cada usuario consulta el historial")
+
+        print("\nCoherencia:")
+        en_memoria, iguales = await coherente(con["nombres"])
+        esperar(en_memoria == USUARIOS and iguales == USUARIOS, f"el buffer coincide con la base de datos ({iguales}/{en_memoria} de {USUARIOS})")
+        buffer.clear()
+        await asyncio.gather(*(conversar(client, h, n, 2, desde=MENSAJES) for h, n in zip(con["cabeceras"], con["nombres"])))
+        en_memoria, iguales = await coherente(con["nombres"])
+        esperar(iguales == USUARIOS, f"tras vaciarlo, se recarga de la base de datos y sigue coincidiendo ({iguales}/{USUARIOS})")
+
+        print("\nLímite de memoria:")
+        limite = 20 * 1024
+        buffer.max_bytes = limite
+        buffer.evictions = 0
+        await asyncio.gather(*(conversar(client, h, n, 2, desde=MENSAJES + 2) for h, n in zip(con["cabeceras"], con["nombres"])))
+        print(f"  {buffer.users} usuarios en memoria, {buffer.bytes / 1024:.1f} KiB de {limite / 1024:.0f} KiB, {buffer.evictions} expulsiones")
+        esperar(buffer.bytes <= limite, "no supera el límite")
+        esperar(buffer.evictions > 0 and buffer.users < USUARIOS, "expulsa a los usuarios menos recientes")
+        en_memoria, iguales = await coherente(con["nombres"])
+        esperar(iguales == en_memoria, f"los que quedan siguen coincidiendo ({iguales}/{en_memoria})")
+    finally:
+        buffer.max_bytes = max_bytes
+        await client.aclose()
+        await lifespan(app, "shutdown", state)
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
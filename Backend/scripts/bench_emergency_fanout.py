@@ -0,0 +1,64 @@
+"""
+Mide la latencia de aviso de una emergencia contra el Twilio simulado (fake_services.py):
+- cuánto tarda en responder POST /emergency/,
+- cuánto pasa desde la alerta hasta el último SMS enviado,
+comparando el envío secuencial (concurrencia 1) con el envío en paralelo.
+
+Uso: python bench_emergency_fanout.py [contactos] [latencia_twilio_ms]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+
+CONTACTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+LATENCIA_MS = sys.argv[2] if len(sys.argv) > 2 else "300"
+PUERTO = 9031
+
+config = fake_services.FakeConfig()
+config.latency["twilio"] = fake_services.LatencyDistribution(f"lognormal:{LATENCIA_MS}:0.3")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.outbox_service import dispatcher
+
+
+def medir(concurrencia: int) -> None:
+    dispatcher.concurrency = concurrencia
+    with TestClient(app) as client:
+        usuario = f"bench{concurrencia}"
+        client.post("/auth/register", json={"username": usuario, "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": usuario, "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(CONTACTOS):
+            client.post("/emergency/contacts/", json={"name": f"Contacto {i}", "phone_number": f"+5690000000{i}"}, headers=headers)
+
+        inicio = time.perf_counter()
+        respuesta = client.post("/emergency/", json={"user_id": usuario, "tipo_emergencia": "Caída"}, headers=headers)
+        respuesta_ms = (time.perf_counter() - inicio) * 1000
+        emergency_id = respuesta.json()["id"]
+
+        estado = {}
+        while estado.get("estado") not in ("completado", "parcial", "fallido", "sin_contactos"):
+            time.sleep(0.05)
+            emergencias = client.get("/emergency/", headers=headers).json()
+            estado = next(e for e in emergencias if e["id"] == emergency_id)["notification_status"] or {}
+        print(
+            f"concurrencia={concurrencia:<3} respuesta POST /emergency/={respuesta_ms:7.1f} ms  "
+            f"alerta→último SMS={estado['latencia_total_ms']:8.1f} ms  estado={estado['estado']}"
+        )
+
+
+if __name__ == "__main__":
+    print(f"{CONTACTOS} contactos, latencia Twilio simulada ~{LATENCIA_MS} ms")
+    medir(1)
+    medir(10)
@@ -0,0 +1,191 @@
+"""
+Vía rápida de emergencias del chat contra los servicios simulados (fake_services.py).
+
+1. Detector: aciertos sobre frases de ejemplo (con negaciones e hipótesis) y coste por mensaje.
+2. Latencia desde que llega "¡Ayuda, me caí!" al chat hasta que sale el último SMS a los
+   contactos, con la vía rápida (los SMS salen en cuanto el LLM confirma) y sin ella (la
+   alerta se registra tras Duckling y el LLM); y con un LLM más lento que la retención
+   (EMERGENCY_FAST_LANE_HOLD_SECONDS), en el que los SMS no esperan al LLM.
+3. Veredicto del LLM: confirma una alerta real y descarta una que el LLM simulado no ve
+   como emergencia, sin que salga ningún SMS.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_emergency_fastlane.py [latencia_llm_ms] [latencia_twilio_ms]
+"""
+import os
+import sys
+import time
+import timeit
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+
+LATENCIA_LLM = sys.argv[1] if len(sys.argv) > 1 else "800"
+LATENCIA_TWILIO = sys.argv[2] if len(sys.argv) > 2 else "150"
+CONTACTOS = 3
+PUERTO = 9044
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{LATENCIA_LLM}")
+config.latency["duckling"] = fake_services.LatencyDistribution("fixed:50")
+config.latency["twilio"] = fake_services.LatencyDistribution(f"fixed:{LATENCIA_TWILIO}")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services.emergency_detector import detectar
+
+# Frase -> nivel esperado (None: no es una emergencia)
+EJEMPLOS = {
+    "¡Ayuda, me caí!": "alerta",
+    "ayudaaaa": "posible",
+    "AUXILIO": "alerta",
+    "Me he caído en el baño": "alerta",
+    "mi esposo se cayó y no responde": "alerta",
+    "No puedo respirar bien": "alerta",
+    "me duele mucho el pecho": "alerta",
+    "tengo un dolor fuerte en el pecho": "alerta",
+    "Llamen una ambulancia por favor": "alerta",
+    "creo que es un infarto": "alerta",
+    "necesito ayuda": "alerta",
+    "No sé qué pasó, me caí": "alerta",
+    "me caí y no puedo levantarme": "alerta",
+    "Me siento muy mal": "posible",
+    "estoy mareada": "posible",
+    "es urgente": "posible",
+    "ayúdame por favor": "alerta",
+    "ayúdenme, mi mamá no responde": "alerta",
+    "me está dando un infarto": "alerta",
+    "es una emergencia": "alerta",
+    "no me caí, tranquila": None,
+    "no es una emergencia": None,
+    "no necesito ayuda": None,
+    "¿qué hago si me caigo?": None,
+    "¿qué hago en caso de emergencia?": None,
+    "me caí de la risa con ese chiste": None,
+    "agrega un contacto de emergencia": None,
+    "necesito ayuda con el celular": None,
+    "ayuda a mi nieto con la tarea": None,
+    "falsa alarma, me caí pero estoy bien": None,
+    "hola, ¿cómo estás?": None,
+    "recuérdame tomar las pastillas": None,
+    "mi presión es 130/85": None,
+    # Palabras de emergencia en una charla: como mucho adelantan el mensaje en la cola
+    "Gracias por tu ayuda": None,
+    "muchas gracias por la ayuda!": None,
+    "eres de mucha ayuda": None,
+    "hoy vi una película de emergencia": None,
+    "qué es un infarto?": "posible",
+    "mi vecino tuvo un infarto": "posible",
+    "tengo hora en urgencias mañana": "posible",
+    "recuérdame llamar a los bomberos por la inspección": "posible",
+}
+
+errores = []
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+def detector() -> None:
+    print("Detector:")
+    fallos = 0
+    for texto, esperado in EJEMPLOS.items():
+        deteccion = detectar(texto)
+        if (deteccion.nivel if deteccion else None) != esperado:
+            fallos += 1
+            print(f"    {texto!r}: esperado {esperado}, detectado {deteccion}")
+    esperar(not fallos, f"{len(EJEMPLOS) - fallos}/{len(EJEMPLOS)} frases bien clasificadas")
+    coste = timeit.timeit(lambda: detectar("Hola, ¿me recuerdas qué tengo que hacer mañana por la tarde?"), number=5000) / 5000
+    print(f"  coste por mensaje: {coste * 1e6:.0f} µs")
+
+
+def preparar(client: TestClient, usuario: str) -> dict:
+    client.post("/auth/register", json={"username": usuario, "pin": "1234", "age": 80, "city": "Santiago"})
+    token = client.post("/auth/login", json={"username": usuario, "pin": "1234"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(CONTACTOS):
+        client.post("/emergency/contacts/", json={"name": f"Contacto {i}", "phone_number": f"+5690000000{i}"}, headers=headers)
+    return headers
+
+
+def esperar_avisos(client: TestClient, headers: dict) -> dict:
+    """Estado del aviso de la última emergencia, cuando ya no quedan SMS pendientes."""
+    limite = time.monotonic() + 15
+    while time.monotonic() < limite:
+        emergencias = client.get("/emergency/", headers=headers).json()
+        estado = (emergencias[0]["notification_status"] or {}) if emergencias else {}
+        if estado.get("estado") not in (None, "enviando"):
+            return estado
+        time.sleep(0.02)
+    return {}
+
+
+def latencia(client: TestClient, rapida: bool) -> tuple[float, float]:
+    settings.EMERGENCY_FAST_LANE = rapida
+    headers = preparar(client, f"caida{int(rapida)}")
+    inicio = time.perf_counter()
+    # Mensajes distintos: la caché del LLM no debe ahorrarse la llamada
+    lugar = "el baño" if rapida else "la cocina"
+    client.post("/chat/", json={"message": f"¡Ayuda, me caí en {lugar}!"}, headers=headers)
+    respuesta_ms = (time.perf_counter() - inicio) * 1000
+    estado = esperar_avisos(client, headers)
+    ultimo_sms = max((c.get("latencia_ms", float("inf")) for c in estado.get("contactos", {}).values()), default=float("inf"))
+    return respuesta_ms, ultimo_sms
+
+
+def main() -> int:
+    detector()
+    with TestClient(app) as client:
+        print(f"\nDel mensaje al último SMS ({CONTACTOS} contactos, LLM {LATENCIA_LLM} ms, Twilio {LATENCIA_TWILIO} ms):")
+        resultados = {rapida: latencia(client, rapida) for rapida in (False, True)}
+        for rapida, (respuesta_ms, sms_ms) in resultados.items():
+            print(f"  {'vía rápida' if rapida else 'tras el LLM':<12} respuesta del chat {respuesta_ms:7.0f} ms   último SMS {sms_ms:7.0f} ms")
+        esperar(resultados[True][1] < settings.EMERGENCY_FAST_LANE_HOLD_SECONDS * 1000, "con la vía rápida los SMS salen al confirmar el LLM, sin agotar la retención")
+        esperar(resultados[True][1] < resultados[False][1], "la vía rápida avisa antes")
+
+        retencion, lento, original = 0.5, 2000, settings.EMERGENCY_FAST_LANE_HOLD_SECONDS
+        settings.EMERGENCY_FAST_LANE_HOLD_SECONDS = retencion
+        config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{lento}")
+        respuesta_ms, sms_ms = latencia(client, True)
+        print(f"  LLM {lento} ms, retención {retencion * 1000:.0f} ms: respuesta del chat {respuesta_ms:7.0f} ms   último SMS {sms_ms:7.0f} ms")
+        esperar(sms_ms < lento, "con el LLM lento los SMS salen al vencer la retención")
+        config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{LATENCIA_LLM}")
+        settings.EMERGENCY_FAST_LANE_HOLD_SECONDS = original
+
+        print("\nVeredicto del LLM:")
+        settings.EMERGENCY_FAST_LANE = True
+        headers = preparar(client, "veredicto")
+        respuesta = client.post("/chat/", json={"message": "¡Auxilio! me caí"}, headers=headers).json()
+        estado = esperar_avisos(client, headers)
+        esperar(estado.get("verificacion") == "confirmada" and respuesta["respuesta"].startswith("¡Alerta"), "el LLM confirma una caída")
+        emergencias = len(client.get("/emergency/", headers=headers).json())
+        esperar(emergencias == 1, f"sin emergencias duplicadas ({emergencias})")
+
+        # El LLM simulado clasifica este mensaje como SALUD
+        enviados = config.calls["twilio"]
+        respuesta = client.post("/chat/", json={"message": "Me duele el pecho, no puedo respirar"}, headers=headers).json()
+        estado = esperar_avisos(client, headers)
+        esperar(estado.get("verificacion") == "descartada" and estado.get("estado") == "cancelado", f"el LLM descarta la alerta ({estado.get('estado')})")
+        time.sleep(settings.EMERGENCY_FAST_LANE_HOLD_SECONDS / 4)
+        esperar(config.calls["twilio"] == enviados, f"no sale ningún SMS ({config.calls['twilio'] - enviados})")
+        esperar("avisé a tus contactos" not in respuesta["respuesta"], "la respuesta no dice que se avisó a los contactos")
+        metricas = client.get("/metrics").text
+        esperar('emergency_alert_seconds_count{via="rapida"}' in metricas, "/metrics expone la latencia de detección a alerta")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Mide cuánta memoria ocupa cada conexión inactiva al stream de eventos (GET /events/stream)
+y cuánto tarda un evento en llegar a todas las conexiones de un usuario.
+
+Levanta el backend con uvicorn en un proceso aparte (para medir solo su memoria), abre
+N conexiones SSE repartidas entre varios usuarios y compara la memoria residente (RSS)
+del servidor antes y después.
+
+Uso: python bench_event_stream.py [conexiones] [usuarios]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import subprocess
+
+import requests
+
+CONEXIONES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+USUARIOS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+PUERTO = 9033
+BASE_URL = f"http://127.0.0.1:{PUERTO}"
+ADMIN_KEY = os.environ.get("ADMIN_API_KEY", "bench")
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def iniciar_servidor() -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/bench.db",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        "REMINDER_SCHEDULER_ENABLED": "false",
+        "ADMIN_API_KEY": ADMIN_KEY,
+    }
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PUERTO), "--log-level", "warning",
+         "--backlog", "4096"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    for _ in range(200):
+        try:
+            requests.get(f"{BASE_URL}/health/status", timeout=0.5)
+            return servidor
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError("El servidor no arrancó")
+
+
+def crear_usuarios() -> list[str]:
+    tokens = []
+    for i in range(USUARIOS):
+        usuario = f"stream{i}"
+        requests.post(f"{BASE_URL}/auth/register", json={"username": usuario, "pin": "1234", "age": 80, "city": "Santiago"})
+        tokens.append(requests.post(f"{BASE_URL}/auth/login", json={"username": usuario, "pin": "1234"}).json()["access_token"])
+    return tokens
+
+
+async def conectar(token: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", PUERTO)
+    writer.write(f"GET /events/stream?token={token} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"conectado\n\n")
+    return reader, writer
+
+
+async def main() -> None:
+    servidor = iniciar_servidor()
+    try:
+        tokens = crear_usuarios()
+        time.sleep(0.5)
+        base_kb = rss_kb(servidor.pid)
+
+        conexiones = []
+        inicio = time.perf_counter()
+        for lote in range(0, CONEXIONES, 500):
+            conexiones += await asyncio.gather(*(
+                conectar(tokens[i % USUARIOS]) for i in range(lote, min(lote + 500, CONEXIONES))
+            ))
+        conexion_s = time.perf_counter() - inicio
+        await asyncio.sleep(1)
+        con_kb = rss_kb(servidor.pid)
+        stats = requests.get(f"{BASE_URL}/events/stats", headers={"X-Admin-Key": ADMIN_KEY}).json()
+
+        # Un evento para el usuario 0 debe llegar a todas sus conexiones
+        propias = [c for i, c in enumerate(conexiones) if i % USUARIOS == 0]
+        headers = {"Authorization": f"Bearer {tokens[0]}"}
+        inicio = time.perf_counter()
+        requests.post(f"{BASE_URL}/health/", json={"parameter": "pulso", "value": "72"}, headers=headers)
+        await asyncio.gather(*(reader.readuntil(b"event: health.created") for reader, _ in propias))
+        entrega_ms = (time.perf_counter() - inicio) * 1000
+
+        print(f"{CONEXIONES} conexiones SSE de {USUARIOS} usuarios (abiertas en {conexion_s:.1f} s)")
+        print(f"  stats del hub: {stats}")
+        print(f"  RSS servidor: {base_kb / 1024:.1f} MB -> {con_kb / 1024:.1f} MB")
+        print(f"  memoria por conexión inactiva: {(con_kb - base_kb) * 1024 / CONEXIONES / 1024:.1f} KB")
+        print(f"  evento -> {len(propias)} conexiones del usuario: {entrega_ms:.1f} ms (incluye el POST /health/)")
+
+        for _, writer in conexiones:
+            writer.close()
+    finally:
+        servidor.terminate()
+        try:
+            servidor.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
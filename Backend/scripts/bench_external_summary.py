@@ -0,0 +1,48 @@
+"""
+Compara la latencia de arranque de la pantalla de inicio:
+- antes: hasta cuatro peticiones secuenciales (clima, clima de respaldo, noticias, noticias de respaldo)
+- después: una sola petición a /external/summary
+
+Uso: python bench_external_summary.py [ciudad] [repeticiones]
+"""
+import os
+import sys
+import time
+import statistics
+import httpx
+
+BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000")
+
+
+def flujo_anterior(client: httpx.Client, city: str) -> None:
+    weather = client.get(f"{BASE_URL}/external/weather", params={"location": city}).json()
+    if not weather or not weather.get("city") or weather.get("city") == "Sin datos":
+        client.get(f"{BASE_URL}/external/weather", params={"location": "Chile"}).json()
+    news = client.get(f"{BASE_URL}/external/gnews", params={"query": "salud"}).json()
+    if not news or news[0].get("title") == "Sin noticias disponibles":
+        client.get(f"{BASE_URL}/external/gnews", params={"query": "noticias"}).json()
+
+
+def flujo_resumen(client: httpx.Client, city: str) -> None:
+    client.get(f"{BASE_URL}/external/summary", params={"city": city}).json()
+
+
+def medir(nombre: str, fn, city: str, repeticiones: int) -> None:
+    tiempos = []
+    for _ in range(repeticiones):
+        # Cliente nuevo en cada vuelta para simular un arranque en frío de la app
+        with httpx.Client(timeout=30) as client:
+            inicio = time.perf_counter()
+            fn(client, city)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    p95 = tiempos[max(0, int(len(tiempos) * 0.95) - 1)]
+    print(f"{nombre:<10} p50={statistics.median(tiempos):8.1f} ms  p95={p95:8.1f} ms  max={tiempos[-1]:8.1f} ms")
+
+
+if __name__ == "__main__":
+    city = sys.argv[1] if len(sys.argv) > 1 else "Santiago"
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"Midiendo contra {BASE_URL} (ciudad={city}, repeticiones={repeticiones})")
+    medir("anterior", flujo_anterior, city, repeticiones)
+    medir("summary", flujo_resumen, city, repeticiones)
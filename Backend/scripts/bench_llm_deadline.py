@@ -0,0 +1,139 @@
+"""
+Plazo del chat, circuit breaker del LLM y modo degradado, contra un OpenAI simulado lento.
+
+Con CHAT_DEADLINE_SECONDS corto y OpenAI tardando LENTO_MS en responder:
+
+1. Plazo: cada mensaje responde dentro del plazo (sin él esperaría la latencia completa) y
+   la llamada en curso se cancela, sin reintentos.
+2. Modo degradado: la respuesta sale de reglas locales; un recordatorio con fecha se guarda
+   igual y una pregunta por la agenda se contesta con los datos del usuario.
+3. Circuit breaker: tras CIRCUIT_FAILURE_THRESHOLD plazos agotados el circuito se abre y los
+   mensajes se responden al momento sin llamar a OpenAI; una emergencia se registra igual.
+4. Recuperación: cuando OpenAI vuelve, pasado CIRCUIT_RESET_SECONDS, responde el LLM de nuevo.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_llm_deadline.py [plazo_s] [latencia_lenta_ms]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+
+PLAZO = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+LENTO_MS = int(sys.argv[2]) if len(sys.argv) > 2 else 30000
+UMBRAL = 3
+REINICIO = 1.5
+PUERTO = 9049
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution("fixed:50")
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["CHAT_DEADLINE_SECONDS"] = str(PLAZO)
+os.environ["CIRCUIT_FAILURE_THRESHOLD"] = str(UMBRAL)
+os.environ["CIRCUIT_RESET_SECONDS"] = str(REINICIO)
+os.environ["LLM_LOCAL_BASE_URL"] = ""
+os.environ["LLM_ROUTES_FILE"] = ""
+# Sin la vía rápida, la emergencia se registra por la intención del modo degradado
+os.environ["EMERGENCY_FAST_LANE"] = "false"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["LOG_LEVELS"] = "app.services.llm_service=CRITICAL,app.services.resilience=CRITICAL"
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import llm_service
+
+errores = []
+secuencia = [0]
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+def chat(client: TestClient, headers: dict, mensaje: str) -> tuple[float, dict]:
+    # Un sufijo distinto cada vez para no responder desde la caché del LLM
+    secuencia[0] += 1
+    inicio = time.perf_counter()
+    respuesta = client.post("/chat/", json={"message": f"{mensaje} [{secuencia[0]}]"}, headers=headers)
+    duracion = time.perf_counter() - inicio
+    if respuesta.status_code != 200:
+        errores.append(f"{mensaje}: {respuesta.status_code}")
+        return duracion, {}
+    print(f"    {duracion * 1000:6.0f} ms  {mensaje[:45]!r} -> {respuesta.json()['respuesta'][:70]!r}")
+    return duracion, respuesta.json()
+
+
+def recordatorios(client: TestClient, headers: dict) -> list[str]:
+    # Los recordatorios del chat se escriben en segundo plano
+    for _ in range(50):
+        textos = [r["text"] for r in client.get("/reminders/", headers=headers).json()]
+        if any("hija" in t for t in textos):
+            break
+        time.sleep(0.05)
+    return textos
+
+
+def degradado(cuerpo: dict) -> bool:
+    return "problemas de conexión" in cuerpo.get("respuesta", "")
+
+
+def main() -> int:
+    circuito = llm_service._providers["openai"].breaker
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"username": "rosa", "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": "rosa", "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print("OpenAI normal:")
+        _, cuerpo = chat(client, headers, "Hola, ¿cómo estás?")
+        esperar(not degradado(cuerpo), "responde el LLM")
+
+        print(f"\nOpenAI lento ({LENTO_MS} ms), plazo {PLAZO * 1000:.0f} ms, circuito tras {UMBRAL} fallos:")
+        config.latency["openai"] = fake_services.LatencyDistribution(f"fixed:{LENTO_MS}")
+        llamadas = config.calls["openai"]
+        tiempos = []
+        for mensaje in ("Hola, ¿qué tal tu día?", "Recuérdame llamar a mi hija mañana a las 10", "Cuéntame algo bonito"):
+            duracion, cuerpo = chat(client, headers, mensaje)
+            tiempos.append(duracion)
+            esperar(degradado(cuerpo), "responde el modo degradado")
+        esperar(max(tiempos) <= PLAZO + 0.5, f"dentro del plazo (máx {max(tiempos) * 1000:.0f} ms; sin plazo serían {LENTO_MS} ms)")
+        esperar(any("hija" in t for t in recordatorios(client, headers)), "el recordatorio con fecha se guardó sin LLM")
+        esperar(config.calls["openai"] - llamadas == UMBRAL, f"una llamada cancelada por mensaje ({config.calls['openai'] - llamadas})")
+        esperar(circuito.state == circuito.OPEN, f"circuito abierto tras {UMBRAL} plazos agotados")
+
+        print("\nCon el circuito abierto:")
+        llamadas = config.calls["openai"]
+        duracion, cuerpo = chat(client, headers, "¿Qué tenía que hacer mañana?")
+        esperar("hija" in cuerpo.get("respuesta", ""), "una pregunta por la agenda se contesta con los recordatorios")
+        esperar(duracion < 0.3, f"responde al momento ({duracion * 1000:.0f} ms)")
+        duracion, cuerpo = chat(client, headers, "¡Ayuda, me caí en el baño!")
+        emergencias = client.get("/emergency/", headers=headers).json()
+        esperar(len(emergencias) == 1, "la emergencia se registra sin LLM")
+        esperar(cuerpo.get("respuesta", "").startswith("¡Alerta de emergencia activada!"), "y se confirma al usuario")
+        esperar(config.calls["openai"] == llamadas, "no se llama a OpenAI")
+
+        print(f"\nOpenAI se recupera (circuito semiabierto tras {REINICIO} s):")
+        config.latency["openai"] = fake_services.LatencyDistribution("fixed:50")
+        time.sleep(REINICIO)
+        _, cuerpo = chat(client, headers, "Muchas gracias por todo")
+        esperar(not degradado(cuerpo), "vuelve a responder el LLM")
+        esperar(circuito.state == circuito.CLOSED, "circuito cerrado")
+        motivos = {m: llm_service.DEGRADED.value(m) for m in ("timeout", "circuit_open", "error", "queue")}
+        print(f"\n  llm_degraded_responses_total: {motivos}")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Enrutado del LLM (app/services/llm_router.py) contra el LLM simulado y un "modelo local" simulado.
+
+Usa un fichero de rutas con plazos cortos (LLM_ROUTES_FILE) y comprueba:
+
+1. Elección: cada tipo de mensaje llega al LLM con el modelo y max_tokens de su ruta.
+2. Presupuesto y respaldo, en cuatro escenarios de OpenAI: normal, lento (más que el plazo
+   de cada intento), caído (responde 503) e intermitente (la mitad de las llamadas fallan).
+   Con OpenAI lento o caído responde el modelo local y ningún turno pasa del presupuesto de
+   su ruta más el plazo del local.
+
+Al final muestra, por ruta, lo que expone /metrics: quién respondió, intentos por resultado,
+duración media, coste estimado y coincidencia de la intención esperada.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_llm_router.py [mensajes_por_escenario]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+from loadtest import percentile
+
+MENSAJES = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+PUERTO, PUERTO_LOCAL = 9048, 9148
+PLAZO = 0.3          # de cada intento remoto
+PRESUPUESTO = 0.5    # de cada ruta (deja sitio a un segundo intento más corto)
+PLAZO_LOCAL = 1.0
+
+RUTAS = {
+    "routes": [
+        {"name": "emergencia", "intents": ["EMERGENCIA"], "budget": PRESUPUESTO,
+         "chain": [{"model": "gpt-4o-mini", "max_tokens": 200, "timeout": PLAZO, "temperature": 0.3},
+                   {"model": "gpt-4o-mini", "max_tokens": 200, "timeout": PLAZO, "temperature": 0.3}]},
+        {"name": "breve", "intents": ["CONVERSACION_GENERAL"], "max_chars": 60, "budget": PRESUPUESTO,
+         "chain": [{"model": "gpt-4o-mini", "max_tokens": 150, "timeout": PLAZO}]},
+        {"name": "detallada", "intents": ["SALUD", "INFORMACION"], "min_chars": 120, "budget": PRESUPUESTO,
+         "chain": [{"model": "gpt-4o", "max_tokens": 600, "timeout": PLAZO},
+                   {"model": "gpt-4o-mini", "max_tokens": 600, "timeout": PLAZO}]},
+        {"name": "general", "budget": PRESUPUESTO,
+         "chain": [{"model": "gpt-4o-mini", "max_tokens": 400, "timeout": PLAZO},
+                   {"model": "gpt-4o-mini", "max_tokens": 400, "timeout": PLAZO}]},
+    ],
+}
+
+# (ruta esperada, modelo y max_tokens del primer intento, mensaje)
+MUESTRAS = [
+    ("breve", "gpt-4o-mini", 150, "Muchas gracias, eres un amor"),
+    ("general", "gpt-4o-mini", 400, "¿Qué es la fotosíntesis?"),
+    ("detallada", "gpt-4o", 600,
+     "Últimamente tengo la presión alta por las mañanas y me mareo un poco al levantarme, "
+     "¿qué me recomiendas para controlarla y cuándo debería ir al médico?"),
+    ("emergencia", "gpt-4o-mini", 200, "¡Ayuda, me caí en el baño!"),
+]
+
+config = fake_services.FakeConfig()
+config.latency["openai"] = fake_services.LatencyDistribution("fixed:50")
+config.latency["duckling"] = fake_services.LatencyDistribution("fixed:5")
+fake_services.run_in_background(config, port=PUERTO)
+local = fake_services.FakeConfig()
+local.latency["openai"] = fake_services.LatencyDistribution("fixed:150")
+fake_services.run_in_background(local, port=PUERTO_LOCAL)
+
+directorio = tempfile.mkdtemp()
+with open(os.path.join(directorio, "rutas.json"), "w", encoding="utf-8") as f:
+    json.dump(RUTAS, f)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{directorio}/bench.db"
+os.environ["LLM_ROUTES_FILE"] = os.path.join(directorio, "rutas.json")
+os.environ["LLM_LOCAL_BASE_URL"] = f"http://127.0.0.1:{PUERTO_LOCAL}/openai/v1"
+os.environ["LLM_LOCAL_MODEL"] = "llama-local"
+os.environ["LLM_LOCAL_TIMEOUT"] = str(PLAZO_LOCAL)
+# Aquí se mide la cadena; el circuit breaker lo prueba bench_llm_deadline.py
+os.environ["CIRCUIT_FAILURE_THRESHOLD"] = "1000000"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ["EMERGENCY_FAST_LANE"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Los escenarios provocan timeouts y errores a propósito
+os.environ["LOG_LEVELS"] = "app.services.llm_service=CRITICAL"
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import llm_router
+
+errores = []
+secuencia = [0]
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+def respondidos(quien: str) -> float:
+    return sum(llm_router.RESPONSES.value(r.name, quien) for r in llm_router.router.routes)
+
+
+def chat(client: TestClient, headers: dict, mensaje: str) -> float:
+    # Un sufijo distinto cada vez para no responder desde la caché del LLM
+    secuencia[0] += 1
+    inicio = time.perf_counter()
+    respuesta = client.post("/chat/", json={"message": f"{mensaje} ({secuencia[0]})"}, headers=headers)
+    if respuesta.status_code != 200:
+        errores.append(f"{mensaje}: {respuesta.status_code}")
+    return time.perf_counter() - inicio
+
+
+def escenario(client: TestClient, headers: dict, nombre: str, latencia: str, tasa_error: float) -> dict:
+    config.latency["openai"] = fake_services.LatencyDistribution(latencia)
+    config.error_rate["openai"] = tasa_error
+    antes = {quien: respondidos(quien) for quien in ("principal", "respaldo", "local", "ninguno")}
+    tiempos = sorted(chat(client, headers, MUESTRAS[i % len(MUESTRAS)][3]) for i in range(MENSAJES))
+    despues = {quien: respondidos(quien) - antes[quien] for quien in antes}
+    print(
+        f"  {nombre:<14} p50 {percentile(tiempos, 50) * 1000:6.0f} ms  p95 {percentile(tiempos, 95) * 1000:6.0f} ms  "
+        f"máx {tiempos[-1] * 1000:6.0f} ms  principal {despues['principal']:3.0f}  respaldo {despues['respaldo']:3.0f}  "
+        f"local {despues['local']:3.0f}  ninguno {despues['ninguno']:3.0f}"
+    )
+    return {"max": tiempos[-1], **despues}
+
+
+def main() -> int:
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"username": "rosa", "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": "rosa", "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print("Elección de ruta:")
+        for ruta, modelo, max_tokens, mensaje in MUESTRAS:
+            config.last_request.pop("openai", None)
+            chat(client, headers, mensaje)
+            enviado = config.last_request.get("openai", {})
+            esperar(
+                enviado.get("model") == modelo and enviado.get("max_tokens") == max_tokens,
+                f"{ruta:<10} -> {enviado.get('model')} con max_tokens {enviado.get('max_tokens')}: {mensaje[:40]}",
+            )
+
+        print(f"\nEscenarios ({MENSAJES} mensajes; plazo {PLAZO * 1000:.0f} ms por intento, presupuesto "
+              f"{PRESUPUESTO * 1000:.0f} ms, local {PLAZO_LOCAL * 1000:.0f} ms):")
+        limite = PRESUPUESTO + PLAZO_LOCAL + 0.3
+        normal = escenario(client, headers, "normal", "fixed:50", 0.0)
+        esperar(normal["principal"] == MENSAJES, "con OpenAI normal responde siempre el primer modelo")
+        lento = escenario(client, headers, "lento", "fixed:1500", 0.0)
+        esperar(lento["local"] == MENSAJES, "con OpenAI lento responde el modelo local")
+        esperar(lento["max"] <= limite, f"ningún turno pasa del presupuesto más el plazo del local ({limite * 1000:.0f} ms)")
+        caido = escenario(client, headers, "caído", "fixed:20", 1.0)
+        esperar(caido["local"] == MENSAJES, "con OpenAI caído responde el modelo local")
+        intermitente = escenario(client, headers, "intermitente", "fixed:50", 0.5)
+        esperar(intermitente["respaldo"] > 0 and intermitente["ninguno"] == 0, "con fallos sueltos responde el respaldo y nadie se queda sin respuesta")
+        config.error_rate["openai"] = 0.0
+
+        print("\nPor ruta (/metrics):")
+        print(f"  {'ruta':<11} {'principal':>9} {'respaldo':>8} {'local':>6} {'timeouts':>8} {'errores':>7} {'media ms':>8} {'coste USD':>10} {'intención ok':>12}")
+        for ruta in llm_router.router.routes:
+            intentos = {
+                resultado: sum(llm_router.ATTEMPTS.value(ruta.name, t.model, resultado) for t in {t.model: t for t in ruta.chain}.values())
+                for resultado in (llm_router.TIMEOUT, llm_router.ERROR)
+            }
+            suma, total = (llm_router.DURATION._values.get((ruta.name,)) or [None, 0.0, 0])[1:]
+            coste = sum(llm_router.COST.value(ruta.name, t.model) for t in {t.model: t for t in ruta.chain}.values())
+            coinciden = llm_router.INTENT_MATCH.value(ruta.name, "si")
+            evaluadas = coinciden + llm_router.INTENT_MATCH.value(ruta.name, "no")
+            print(
+                f"  {ruta.name:<11} {llm_router.RESPONSES.value(ruta.name, 'principal'):9.0f} {llm_router.RESPONSES.value(ruta.name, 'respaldo'):8.0f} "
+                f"{llm_router.RESPONSES.value(ruta.name, 'local'):6.0f} {intentos[llm_router.TIMEOUT]:8.0f} {intentos[llm_router.ERROR]:7.0f} "
+                f"{(suma / total * 1000 if total else 0):8.0f} {coste:10.6f} {(coinciden / evaluadas * 100 if evaluadas else 0):11.0f}%"
+            )
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
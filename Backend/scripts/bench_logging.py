@@ -0,0 +1,58 @@
+"""
+Compara lo que cuesta, en el hilo que atiende la petición, registrar un volcado grande
+(como la respuesta completa de GNews) con print() y con el logging encolado.
+
+El hilo de fondo escribe en stdout: redirige la salida para no medir la terminal.
+
+Uso: python bench_logging.py [repeticiones] > /dev/null
+"""
+import os
+import sys
+import time
+import logging
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+REPETICIONES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("LOG_PAYLOAD_SAMPLE_RATE", "0.01")
+
+from app.logging_config import configure_logging, shutdown_logging
+from app import logging_config
+
+# Respuesta de GNews de tamaño realista (~5 KB)
+PAYLOAD = {"totalArticles": 10, "articles": [
+    {"title": f"Noticia {i} sobre salud", "description": "x" * 300, "url": f"https://example.com/{i}", "source": {"name": "Diario"}}
+    for i in range(10)
+]}
+
+
+def medir(nombre: str, fn) -> None:
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        fn()
+    us = (time.perf_counter() - inicio) * 1e6 / REPETICIONES
+    print(f"  {nombre:<38}{us:>9.2f} µs/llamada", file=sys.stderr)
+
+
+def main() -> None:
+    configure_logging()
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.DEBUG)
+
+    print(f"{REPETICIONES} llamadas, volcado de {len(repr(PAYLOAD)) / 1024:.1f} KB", file=sys.stderr)
+    medir("print() del volcado", lambda: print(f"[GNewsService] Raw API Response: {PAYLOAD}"))
+    medir("logger.info encolado", lambda: logger.info("Respuesta de GNews", extra={"status": 200}))
+    medir("logger.debug con payload (muestreado)", lambda: logger.debug("Respuesta completa", extra={"payload": PAYLOAD}))
+    logger.setLevel(logging.INFO)
+    medir("logger.debug desactivado", lambda: logger.debug("Respuesta completa", extra={"payload": PAYLOAD}))
+
+    inicio = time.perf_counter()
+    shutdown_logging()  # espera a que el hilo de fondo vacíe la cola
+    print(f"  vaciado de la cola al cerrar: {(time.perf_counter() - inicio) * 1000:.0f} ms, "
+          f"descartados: {logging_config.queue_handler.dropped}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Mide el coste de la instrumentación de métricas y comprueba que queda dentro del presupuesto.
+
+- Coste por operación de Counter.inc, Histogram.observe y metrics.stage().
+- Sobrecoste del MetricsMiddleware por petición: la misma aplicación mínima (un router con
+  prefijo y una ruta con parámetro) llamada directamente por ASGI, con y sin middleware.
+- Tiempo de generar /metrics con muchas series.
+
+Sale con código 1 si el sobrecoste por petición supera el presupuesto.
+
+Uso: python bench_metrics.py [peticiones] [presupuesto_us]
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PETICIONES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+PRESUPUESTO_US = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+
+from fastapi import APIRouter, FastAPI
+from app.services import metrics
+
+
+def por_operacion(fn, repeticiones: int = 200000) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) * 1e6 / repeticiones
+
+
+def crear_app(con_metricas: bool) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/bench")
+    if con_metricas:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+async def llamar(app, n: int) -> float:
+    """Microsegundos por petición llamando a la app ASGI sin servidor ni red."""
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": f"/bench/items/{i}", "raw_path": f"/bench/items/{i}".encode(), "root_path": "",
+            "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - inicio) * 1e6 / n
+
+
+async def main() -> int:
+    counter = metrics.Counter("bench_total", "Contador de prueba.", ("a",))
+    histogram = metrics.Histogram("bench_seconds", "Histograma de prueba.", ("a",))
+
+    def con_stage():
+        with metrics.stage("bench"):
+            pass
+
+    print("Coste por operación:")
+    print(f"  Counter.inc:       {por_operacion(lambda: counter.inc('x')):.2f} µs")
+    print(f"  Histogram.observe: {por_operacion(lambda: histogram.observe(0.042, 'x')):.2f} µs")
+    print(f"  metrics.stage():   {por_operacion(con_stage):.2f} µs")
+
+    sin, con = crear_app(False), crear_app(True)
+    await llamar(sin, 500)
+    await llamar(con, 500)  # calentamiento (construcción de la pila de middlewares)
+    # Alternar varias rondas y quedarse con la mejor de cada una reduce el ruido
+    tiempos_sin, tiempos_con = [], []
+    for _ in range(5):
+        tiempos_sin.append(await llamar(sin, PETICIONES // 5))
+        tiempos_con.append(await llamar(con, PETICIONES // 5))
+    base, medido = min(tiempos_sin), min(tiempos_con)
+    sobrecoste = medido - base
+    print(f"\nPetición ASGI ({PETICIONES} peticiones):")
+    print(f"  sin métricas: {base:.1f} µs   con métricas: {medido:.1f} µs")
+    print(f"  sobrecoste:   {sobrecoste:.1f} µs/petición ({sobrecoste / base * 100:.1f} %), presupuesto {PRESUPUESTO_US:.0f} µs")
+
+    # Muchas series: 50 rutas x 3 estados + 20 etapas
+    for i in range(50):
+        for status_code in ("200", "404", "500"):
+            metrics.HTTP_REQUESTS.inc("GET", f"/ruta/{i}", status_code)
+        metrics.HTTP_DURATION.observe(0.01, "GET", f"/ruta/{i}")
+    for i in range(20):
+        metrics.STAGE_DURATION.observe(0.01, f"etapa{i}")
+    inicio = time.perf_counter()
+    texto = metrics.registry.render()
+    render_ms = (time.perf_counter() - inicio) * 1000
+    print(f"\nGET /metrics: {len(texto.splitlines())} líneas, {len(texto) / 1024:.0f} KB, {render_ms:.1f} ms")
+
+    if sobrecoste > PRESUPUESTO_US:
+        print("\nFALLO: el sobrecoste supera el presupuesto")
+        return 1
+    print("\nOK: dentro del presupuesto")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
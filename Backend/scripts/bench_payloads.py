@@ -0,0 +1,177 @@
+"""
+Tamaño de las respuestas y CPU de serialización (app/services/serialization.py).
+
+1. Tamaños: bytes de GET /health/ y /reminders/ con REGISTROS elementos, de /chat/ y de
+   /health/etags, sin comprimir y con gzip (COMPRESSION_MIN_BYTES, COMPRESSION_LEVEL), y de
+   `fechas_detectadas` con la respuesta completa de Duckling frente al resumen que se devuelve.
+2. Comprobaciones: gzip devuelve el mismo JSON, las respuestas pequeñas no se comprimen, el
+   chat devuelve solo los campos de `FechaDetectada` y el recordatorio se guarda igual.
+3. CPU: microsegundos por respuesta serializando el listado de salud (jsonable_encoder + json,
+   como FastAPI sin su vía rápida, frente a `dump_json` de pydantic) y un diccionario sin
+   esquema (json frente a `FastJSONResponse`, con orjson si está instalado), y lo que cuesta
+   comprimir el listado con cada nivel de gzip.
+
+Duckling se simula con una respuesta como la real para "el lunes a las 10" (tres alternativas
+en "values"); en producción las hay de más de una fecha y con intervalos.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_payloads.py [registros] [repeticiones]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+
+REGISTROS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+REPETICIONES = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+PUERTO = 9050
+
+
+def _lunes(semanas: int) -> str:
+    hoy = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+    fecha = hoy + timedelta(days=(7 - hoy.weekday()) % 7 or 7, weeks=semanas)
+    return fecha.strftime("%Y-%m-%dT%H:%M:%S.000-04:00")
+
+
+DUCKLING = [{
+    "body": "el lunes a las 10",
+    "start": 14,
+    "end": 31,
+    "dim": "time",
+    "latent": False,
+    "value": {
+        "value": _lunes(0),
+        "grain": "hour",
+        "type": "value",
+        "values": [{"value": _lunes(i), "grain": "hour", "type": "value"} for i in range(3)],
+    },
+}]
+
+config = fake_services.FakeConfig()
+config.payloads["duckling"] = DUCKLING
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+os.environ.setdefault("ADMIN_API_KEY", "bench")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.models.schemas import FechaDetectada
+from app.services import duckling_service, serialization
+from app.api.endpoints.health import _HEALTH_LIST
+from app.services.database import SessionLocal, HealthRecord
+
+errores = []
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+def tamanos(client: TestClient, metodo: str, ruta: str, headers: dict, **kwargs) -> tuple[int, int, bool]:
+    """Bytes sin comprimir y en el cable con gzip, y si el cuerpo descomprimido es el mismo."""
+    plano = client.request(metodo, ruta, headers={**headers, "Accept-Encoding": "identity"}, **kwargs)
+    comprimido = client.request(metodo, ruta, headers={**headers, "Accept-Encoding": "gzip"}, **kwargs)
+    if plano.status_code != 200 or comprimido.status_code != 200:
+        errores.append(f"{metodo} {ruta}: {plano.status_code}/{comprimido.status_code}")
+    return len(plano.content), comprimido.num_bytes_downloaded, comprimido.json() == plano.json()
+
+
+def microsegundos(funcion, *args) -> float:
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        funcion(*args)
+    return (time.perf_counter() - inicio) / REPETICIONES * 1e6
+
+
+def main() -> int:
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"username": "rosa", "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": "rosa", "pin": "1234"}).json()["access_token"]
+        # /health/etags es de administración: la cabecera sobra en el resto de rutas
+        headers = {"Authorization": f"Bearer {token}", "X-Admin-Key": os.environ["ADMIN_API_KEY"]}
+        inicio = datetime.now() - timedelta(days=REGISTROS)
+        with SessionLocal() as db:
+            for i in range(REGISTROS):
+                parametro, valor = ("presion", f"{120 + i % 30}/{80 + i % 10}") if i % 2 else ("glucosa", f"{90 + i % 60} mg/dL")
+                db.add(HealthRecord(user_id="rosa", parameter=parametro, value=valor, timestamp=inicio + timedelta(days=i)))
+            db.commit()
+        for i in range(REGISTROS):
+            client.post("/reminders/", json={"text": f"Tomar la pastilla de la presión ({i})", "datetime": (inicio + timedelta(days=i)).isoformat()}, headers=headers)
+
+        print(f"Tamaños (gzip a partir de {settings.COMPRESSION_MIN_BYTES} bytes, nivel {settings.COMPRESSION_LEVEL}):")
+        print(f"  {'respuesta':<28} {'sin comprimir':>13} {'gzip':>8} {'ahorro':>7}")
+        iguales = True
+        for nombre, metodo, ruta, kwargs in (
+            (f"GET /health/ ({REGISTROS})", "GET", "/health/", {}),
+            (f"GET /reminders/ ({REGISTROS})", "GET", "/reminders/", {}),
+            ("GET /health/etags", "GET", "/health/etags", {}),
+            ("POST /chat/ (con fecha)", "POST", "/chat/", {"json": {"message": "Recuérdame ir al médico el lunes a las 10"}}),
+        ):
+            plano, cable, igual = tamanos(client, metodo, ruta, headers, **kwargs)
+            iguales = iguales and igual
+            print(f"  {nombre:<28} {plano:13d} {cable:8d} {(1 - cable / plano) * 100:6.0f}%")
+        esperar(iguales, "el JSON descomprimido es el mismo que sin gzip")
+        pequena = client.get("/livez", headers={"Accept-Encoding": "gzip"})
+        esperar("content-encoding" not in pequena.headers, "las respuestas pequeñas no se comprimen")
+        listado = client.get("/health/", headers={**headers, "Accept-Encoding": "gzip"})
+        esperar(listado.headers.get("content-encoding") == "gzip" and "ETag" in listado.headers, "el listado sale comprimido y con su ETag")
+        esperar(client.get("/health/", headers={**headers, "If-None-Match": listado.headers["ETag"]}).status_code == 304, "el ETag sigue valiendo con gzip")
+
+        print("\nfechas_detectadas:")
+        cuerpo = client.post("/chat/", json={"message": "Recuérdame llamar a Carmen el lunes a las 10"}, headers=headers).json()
+        fechas = cuerpo["fechas_detectadas"]
+        completo, resumen = len(serialization.dumps(DUCKLING)), len(serialization.dumps(fechas))
+        print(f"  respuesta de Duckling {completo} bytes, devuelto {resumen} bytes ({(1 - resumen / completo) * 100:.0f}% menos)")
+        esperar(len(fechas) == 1 and set(fechas[0]) == set(FechaDetectada.model_fields), "solo los campos de FechaDetectada")
+        esperar(fechas[0]["value"] == DUCKLING[0]["value"]["value"] and fechas[0]["body"] == DUCKLING[0]["body"], "con el valor elegido por Duckling")
+        for _ in range(50):
+            textos = [r["text"] for r in client.get("/reminders/", headers=headers).json()]
+            if any("Carmen" in t for t in textos):
+                break
+            time.sleep(0.05)
+        esperar(any("Carmen" in t for t in textos), "el recordatorio del chat se guarda con la fecha completa")
+
+    print(f"\nCPU por respuesta ({REPETICIONES} repeticiones; orjson {'instalado' if serialization.orjson else 'no instalado'}):")
+    with SessionLocal() as db:
+        filas = db.query(HealthRecord).filter(HealthRecord.user_id == "rosa").all()
+    modelos = _HEALTH_LIST.validate_python(filas, from_attributes=True)
+    diccionarios = jsonable_encoder(modelos)
+    estado = {"respuesta": "x" * 300, "fechas_detectadas": duckling_service.summarize(DUCKLING), "emocion": "Neutra", "proveedores": {f"p{i}": {"estado": "closed", "fallos": i} for i in range(20)}}
+    jsonable = microsegundos(lambda: JSONResponse(content=None).render(jsonable_encoder(modelos)))
+    rapido = microsegundos(_HEALTH_LIST.dump_json, modelos)
+    print(f"  listado de salud ({len(filas)}): jsonable_encoder + json {jsonable:8.1f} µs   dump_json {rapido:8.1f} µs   ({jsonable / rapido:.1f}x)")
+    esperar(rapido < jsonable, "dump_json es más rápido que jsonable_encoder + json")
+    base = microsegundos(JSONResponse(content=None).render, estado)
+    nuevo = microsegundos(serialization.FastJSONResponse(content=None).render, estado)
+    print(f"  diccionario sin esquema:  JSONResponse {base:8.1f} µs   FastJSONResponse {nuevo:8.1f} µs   ({base / nuevo:.1f}x)")
+    iguales = json.loads(JSONResponse(content=None).render(diccionarios)) == json.loads(serialization.dumps(diccionarios))
+    esperar(iguales, "FastJSONResponse produce el mismo JSON que JSONResponse")
+
+    cuerpo = _HEALTH_LIST.dump_json(modelos)
+    print(f"  gzip del listado ({len(cuerpo)} bytes):")
+    for nivel in (1, 6, 9):
+        tamano = len(gzip.compress(cuerpo, compresslevel=nivel))
+        print(f"    nivel {nivel}: {microsegundos(gzip.compress, cuerpo, nivel):8.1f} µs  {tamano:7d} bytes")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
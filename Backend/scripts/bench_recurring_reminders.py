@@ -0,0 +1,133 @@
+"""
+Compara el coste de guardar y consultar recordatorios recurrentes:
+- materializados: una fila por ocurrencia (lo que hacía falta antes),
+- con regla RRULE: una fila por recordatorio y solo las excepciones (completadas/omitidas).
+
+Se simulan USUARIOS usuarios con RECORDATORIOS recordatorios diarios durante DIAS días
+y se mide el tamaño en disco (SQLite) y el tiempo de consultar una ventana de 7 días.
+
+Antes comprueba que una regla con INTERVAL=0 (que repite la misma fecha para siempre) no
+entra por el chat ni por la API y que, si ya está guardada, buscar sus ocurrencias termina.
+
+Uso: python bench_recurring_reminders.py [usuarios] [recordatorios] [dias]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+DB_DIR = tempfile.mkdtemp()
+
+
+def motor(nombre: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{DB_DIR}/{nombre}.db"
+
+
+def tamano(nombre: str) -> float:
+    return os.path.getsize(f"{DB_DIR}/{nombre}.db") / 1024 / 1024
+
+
+def reglas_invalidas():
+    from app.services import recurrence
+
+    for texto in ("tomar agua cada 0 horas", "regar las plantas cada 0 dias"):
+        assert recurrence.detectar_recurrencia(texto) is None, texto
+    assert recurrence.detectar_recurrencia("cada 8 horas") == "FREQ=HOURLY;INTERVAL=8"
+    for regla in ("FREQ=DAILY;INTERVAL=0", "FREQ=HOURLY;INTERVAL=0"):
+        try:
+            recurrence.validar_rrule(regla)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{regla} no debe aceptarse")
+
+    # Una regla ya guardada: la búsqueda termina sin ocurrencias en vez de colgarse
+    t0 = time.perf_counter()
+    inicio = datetime(2026, 1, 1, 8)
+    assert recurrence.siguiente_ocurrencia(inicio, "FREQ=HOURLY;INTERVAL=0", datetime(2026, 1, 2), inclusive=True) is None
+    assert recurrence.ocurrencias(inicio, "FREQ=DAILY;INTERVAL=0", datetime(2026, 1, 2), datetime(2026, 1, 9)) == []
+    # Una regla válida pero muy densa se corta en MAX_SEARCH_ITERATIONS
+    recurrence.siguiente_ocurrencia(datetime(2000, 1, 1), "FREQ=MINUTELY", datetime(2026, 1, 1))
+    print(f"Reglas con INTERVAL=0 rechazadas; búsquedas acotadas en {time.perf_counter() - t0:.2f} s\n")
+
+
+def main(usuarios: int, recordatorios: int, dias: int):
+    motor("recurrentes")
+    reglas_invalidas()
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.services import database, reminder_service
+
+    inicio_serie = datetime(2026, 1, 1, 11, 0)
+    ventana = (datetime(2026, 6, 1), datetime(2026, 6, 8))
+
+    # --- Con regla RRULE ---
+    database.create_tables()
+    db = database.SessionLocal()
+    t0 = time.perf_counter()
+    for u in range(usuarios):
+        for r in range(recordatorios):
+            reminder = database.Reminder(
+                user_id=f"user{u}", text=f"Medicamento {r}", datetime="2026-01-01T08:00:00",
+                rrule="FREQ=DAILY", starts_at=inicio_serie + timedelta(hours=r), due_at=inicio_serie,
+            )
+            db.add(reminder)
+            db.flush()
+            # ~10 % de ocurrencias con estado (completadas u omitidas)
+            for d in random.sample(range(dias), dias // 10):
+                db.add(database.ReminderOccurrenceState(
+                    reminder_id=reminder.id,
+                    occurrence_at=reminder.starts_at + timedelta(days=d),
+                    status=random.choice(["completada", "omitida"]),
+                ))
+    db.commit()
+    alta_rrule = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for u in range(50):
+        reminder_service.get_user_reminders(db, f"user{u % usuarios}", *ventana)
+    consulta_rrule = (time.perf_counter() - t0) / 50 * 1000
+    filas_rrule = db.query(database.Reminder).count() + db.query(database.ReminderOccurrenceState).count()
+    db.close()
+
+    # --- Materializado: una fila por ocurrencia ---
+    engine = create_engine(f"sqlite:///{DB_DIR}/materializado.db")
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    t0 = time.perf_counter()
+    for u in range(usuarios):
+        filas = []
+        for r in range(recordatorios):
+            for d in range(dias):
+                fecha = inicio_serie + timedelta(hours=r, days=d)
+                filas.append(database.Reminder(
+                    user_id=f"user{u}", text=f"Medicamento {r}", datetime=fecha.isoformat(),
+                    starts_at=fecha, due_at=fecha,
+                ))
+        db.add_all(filas)
+        db.flush()
+    db.commit()
+    alta_mat = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for u in range(50):
+        db.query(database.Reminder).filter(
+            database.Reminder.user_id == f"user{u % usuarios}",
+            database.Reminder.starts_at.between(*ventana),
+        ).order_by(database.Reminder.starts_at).all()
+    consulta_mat = (time.perf_counter() - t0) / 50 * 1000
+    filas_mat = db.query(database.Reminder).count()
+    db.close()
+
+    print(f"{usuarios} usuarios x {recordatorios} recordatorios diarios x {dias} días")
+    print(f"{'':<14}{'filas':>10}{'disco (MB)':>12}{'alta (s)':>10}{'ventana 7d (ms)':>17}")
+    print(f"{'RRULE':<14}{filas_rrule:>10,}{tamano('recurrentes'):>12.2f}{alta_rrule:>10.2f}{consulta_rrule:>17.2f}")
+    print(f"{'materializado':<14}{filas_mat:>10,}{tamano('materializado'):>12.2f}{alta_mat:>10.2f}{consulta_mat:>17.2f}")
+
+
+if __name__ == "__main__":
+    usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    recordatorios = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    dias = int(sys.argv[3]) if len(sys.argv) > 3 else 365
+    main(usuarios, recordatorios, dias)
@@ -0,0 +1,89 @@
+"""
+Mide la precisión del planificador de recordatorios con 1M de recordatorios pendientes.
+
+Se cargan N recordatorios en el heap (la mayoría repartidos en las próximas 24 h y una
+muestra que vence en los próximos segundos) y se mide:
+- el coste de programarlos y de reprogramar una parte,
+- la memoria usada por el heap,
+- el retraso de disparo (p50/p95/p99/máx) de la muestra que vence durante la prueba.
+
+La reclamación en la base de datos se sustituye por una en memoria para medir solo el planificador.
+
+Uso: python bench_reminder_scheduler.py [pendientes] [muestra]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import resource
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.services.reminder_scheduler import ReminderScheduler, DueReminder, ReminderNotifier
+
+
+class InMemoryScheduler(ReminderScheduler):
+    def _refill(self) -> None:
+        self._horizon = datetime.utcnow() + self.window
+
+    def _claim(self, reminder_id: int, due_ts: float) -> DueReminder | None:
+        return DueReminder(id=reminder_id, user_id="bench", text="", due_at=datetime.utcfromtimestamp(due_ts))
+
+
+class SilentNotifier(ReminderNotifier):
+    async def notify(self, reminder: DueReminder) -> None:
+        pass
+
+
+def percentil(valores: list[float], p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def main(pendientes: int, muestra: int):
+    sched = InMemoryScheduler(window=timedelta(hours=24))
+    sched.notifiers = [SilentNotifier()]
+    sched._refill()
+    ahora = datetime.utcnow()
+
+    rss_antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    for i in range(pendientes - muestra):
+        sched.schedule(i, ahora + timedelta(seconds=random.uniform(60, 24 * 3600)))
+    alta = time.perf_counter() - inicio
+    rss_despues = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Programados {pendientes - muestra:,} recordatorios en {alta:.2f} s ({(pendientes - muestra) / alta:,.0f}/s)")
+    print(f"Memoria adicional (RSS máx.): {(rss_despues - rss_antes) / 1024:.1f} MB")
+
+    inicio = time.perf_counter()
+    cambios = min(100_000, pendientes - muestra)
+    for i in random.sample(range(pendientes - muestra), cambios):
+        sched.schedule(i, ahora + timedelta(seconds=random.uniform(60, 24 * 3600)))
+    print(f"Reprogramados {cambios:,} recordatorios en {time.perf_counter() - inicio:.2f} s")
+
+    # La muestra se programa al final para que venza durante la prueba
+    ahora = datetime.utcnow()
+    for i in range(pendientes - muestra, pendientes):
+        sched.schedule(i, ahora + timedelta(seconds=random.uniform(2, 7)))
+
+    sched.start()
+    await asyncio.sleep(9)
+    await sched.stop()
+
+    retrasos = sched.lateness_ms if sched.fired <= 1000 else sched.lateness_ms[-1000:]
+    print(f"\nDisparados {sched.fired:,} de {muestra:,} (pendientes restantes: {sched.pending:,})")
+    if retrasos:
+        print(
+            f"Retraso de disparo (últimos {len(retrasos)}): p50={percentil(retrasos, 0.5):.2f} ms  "
+            f"p95={percentil(retrasos, 0.95):.2f} ms  p99={percentil(retrasos, 0.99):.2f} ms  "
+            f"máx={max(retrasos):.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    pendientes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    muestra = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    asyncio.run(main(pendientes, muestra))
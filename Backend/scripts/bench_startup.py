@@ -0,0 +1,81 @@
+"""
+Mide el arranque en frío de la API: cada ronda es un proceso nuevo de Python.
+
+- import:   importar app.main (módulos, routers, configuración).
+- arranque: fase de inicio del lifespan (migración si MIGRATE_ON_STARTUP, workers).
+- lista:    desde el inicio del proceso hasta que /readyz responde 200 (pools calentados).
+- primer chat / segundo chat: latencia de dos mensajes seguidos recién arrancada.
+
+Los proveedores externos son los de fake_services.py y la base de datos un SQLite temporal.
+
+Uso: python bench_startup.py [rondas]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+RONDAS = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != "--hijo" else 5
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def hijo() -> None:
+    """Una ronda: se ejecuta en un proceso nuevo e imprime sus tiempos en JSON."""
+    inicio = time.perf_counter()
+    import app.main
+    tiempos = {"import": time.perf_counter() - inicio}
+    from fastapi.testclient import TestClient
+
+    t = time.perf_counter()
+    with TestClient(app.main.app) as client:
+        tiempos["arranque"] = time.perf_counter() - t
+        while client.get("/readyz").status_code != 200:
+            time.sleep(0.005)
+        tiempos["lista"] = time.perf_counter() - inicio
+
+        client.post("/auth/register", json={"username": "frio", "pin": "1234", "age": 70, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": "frio", "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for nombre, mensaje in (("primer chat", "Hola, ¿cómo estás?"), ("segundo chat", "Cuéntame algo")):
+            t = time.perf_counter()
+            client.post("/chat/", json={"message": mensaje}, headers=headers)
+            tiempos[nombre] = time.perf_counter() - t
+    print(json.dumps(tiempos))
+
+
+def main() -> None:
+    import fake_services
+    fake_services.run_in_background(fake_services.FakeConfig(), port=9041)
+
+    resultados = []
+    for _ in range(RONDAS):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                **fake_services.env_for("http://127.0.0.1:9041"),
+                "DATABASE_URL": f"sqlite:///{tmp}/arranque.db",
+                "OPENAI_API_KEY": "bench",
+                "LOG_LEVEL": "WARNING",
+                "PYTHONPATH": BACKEND,
+            }
+            salida = subprocess.run(
+                [sys.executable, __file__, "--hijo"], env=env, cwd=BACKEND,
+                capture_output=True, text=True, check=True,
+            ).stdout
+            resultados.append(json.loads(salida.strip().splitlines()[-1]))
+
+    print(f"Arranque en frío ({RONDAS} procesos), mediana y máximo:")
+    for fase in resultados[0]:
+        valores = sorted(r[fase] * 1000 for r in resultados)
+        print(f"  {fase:<14}{valores[len(valores) // 2]:>8.0f} ms{valores[-1]:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    if "--hijo" in sys.argv:
+        hijo()
+    else:
+        main()
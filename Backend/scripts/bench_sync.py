@@ -0,0 +1,127 @@
+"""
+Compara la recarga completa de las cuatro listas (recordatorios, salud, contactos y
+emergencias) con la sincronización incremental (GET /sync) para un usuario con mucho
+historial: bytes transferidos, consultas SQL y tiempo por petición. Además aplica los
+cambios a una réplica local, como haría la app, y comprueba que coincide con el servidor.
+
+Uso: python bench_sync.py [filas_por_coleccion] [cambios]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FILAS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CAMBIOS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ["SYNC_SAFETY_SECONDS"] = "0"
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.database import SessionLocal, engine, Emergency
+from app.services import reminder_service, health_service, emergency_service
+from app.models.emergency_schemas import EmergencyContactCreate
+
+consultas = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def contar(*args):
+    global consultas
+    consultas += 1
+
+
+LISTAS = {
+    "reminders": "/reminders/",
+    "health": "/health/",
+    "emergency_contacts": "/emergency/contacts/",
+    "emergencies": "/emergency/",
+}
+
+
+def medir(client, peticiones):
+    """Ejecuta las peticiones y devuelve (ms, bytes, consultas, respuestas)."""
+    global consultas
+    consultas, bytes_total, respuestas = 0, 0, []
+    inicio = time.perf_counter()
+    for ruta, params in peticiones:
+        r = client.get(ruta, params=params)
+        bytes_total += len(r.content)
+        respuestas.append(r.json())
+    return (time.perf_counter() - inicio) * 1000, bytes_total, consultas, respuestas
+
+
+def sincronizar(client, replica, cursor):
+    """Aplica GET /sync (todas las páginas) a la réplica local."""
+    ms = bytes_total = queries = paginas = 0
+    while True:
+        t, b, q, (cambios,) = medir(client, [("/sync", {"cursor": cursor} if cursor else {})])
+        ms, bytes_total, queries, paginas = ms + t, bytes_total + b, queries + q, paginas + 1
+        if cambios["reset"]:
+            for coleccion in LISTAS:
+                replica[coleccion].clear()
+        for coleccion in LISTAS:
+            for record_id in cambios[coleccion]["deleted"]:
+                replica[coleccion].pop(record_id, None)
+            for fila in cambios[coleccion]["upserts"]:
+                replica[coleccion][fila["id"]] = fila
+        cursor = cambios["cursor"]
+        if not cambios["has_more"]:
+            return cursor, (ms, bytes_total, queries, paginas)
+
+
+def main():
+    with TestClient(app) as client:
+        usuario = "sync"
+        client.post("/auth/register", json={"username": usuario, "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": usuario, "pin": "1234"}).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        db = SessionLocal()
+        for i in range(FILAS):
+            reminder_service.add_reminder(db, usuario, f"Recordatorio {i}", f"2030-01-{i % 28 + 1:02d}T08:00:00")
+            health_service.save_health_data(db, usuario, "pulso", str(60 + i % 40))
+            emergency_service.create_emergency_contact(db, usuario, EmergencyContactCreate(name=f"Contacto {i}", phone_number=f"+569{i:08d}"))
+            db.add(Emergency(user_id=usuario, tipo_emergencia="Caída", mensaje_opcional="", timestamp=f"2030-01-01T00:00:{i % 60:02d}"))
+        db.commit()
+        db.close()
+
+        replica = {coleccion: {} for coleccion in LISTAS}
+        cursor, inicial = sincronizar(client, replica, None)
+
+        # Algunos cambios de la app: altas, modificaciones y borrados
+        recordatorios = list(replica["reminders"])
+        for i in range(CAMBIOS):
+            client.post("/reminders/", json={"text": f"Nuevo {i}", "datetime": "2030-02-01T08:00:00"})
+            client.put(f"/reminders/{recordatorios[i]}", json={"text": f"Editado {i}", "datetime": "2030-03-01T08:00:00"})
+            client.delete(f"/reminders/{recordatorios[-1 - i]}")
+            client.post("/health/", json={"parameter": "presion", "value": "120/80"})
+
+        completa = medir(client, [(ruta, {}) for ruta in LISTAS.values()])
+        cursor, delta = sincronizar(client, replica, cursor)
+        _, vacia = sincronizar(client, replica, cursor)
+
+        print(f"{FILAS} filas por colección, {CAMBIOS} rondas de cambios (alta, edición y borrado)")
+        print(f"{'modo':<28}{'ms':>9}{'bytes':>11}{'consultas':>11}")
+        print(f"{'sync inicial (' + str(inicial[3]) + ' páginas)':<28}{inicial[0]:>9.1f}{inicial[1]:>11}{inicial[2]:>11}")
+        print(f"{'recarga de las 4 listas':<28}{completa[0]:>9.1f}{completa[1]:>11}{completa[2]:>11}")
+        print(f"{'sync incremental':<28}{delta[0]:>9.1f}{delta[1]:>11}{delta[2]:>11}")
+        print(f"{'sync sin cambios':<28}{vacia[0]:>9.1f}{vacia[1]:>11}{vacia[2]:>11}")
+
+        # La réplica debe coincidir con lo que devuelven las listas
+        coincide = all(
+            {fila["id"] for fila in lista} == set(replica[coleccion])
+            for coleccion, lista in zip(LISTAS, completa[3])
+        )
+        editados = all(replica["reminders"][recordatorios[i]]["text"] == f"Editado {i}" for i in range(CAMBIOS))
+        print("Réplica local igual al servidor:", coincide and editados)
+
+
+if __name__ == "__main__":
+    main()
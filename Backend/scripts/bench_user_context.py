@@ -0,0 +1,135 @@
+"""
+Datos del usuario en el prompt del LLM (app/services/user_context.py), con el LLM simulado.
+
+1. Inyección: una pregunta sobre recordatorios lleva los próximos recordatorios en el prompt,
+   una sobre salud las últimas mediciones y una charla no lleva nada.
+2. Mantenimiento incremental: tras crear un recordatorio o una medición (por la API o desde
+   el chat) la siguiente pregunta los ve sin volver a consultar la base de datos; editar o
+   borrar recarga la foto.
+3. Coste: consultas a recordatorios y salud por turno frente a consultarlas en cada turno,
+   y caracteres que añade al prompt.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python bench_user_context.py [turnos]
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_services
+
+TURNOS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+PUERTO = 9047
+
+config = fake_services.FakeConfig()
+fake_services.run_in_background(config, port=PUERTO)
+os.environ.update(fake_services.env_for(f"http://127.0.0.1:{PUERTO}"))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CHAT_USER_RATE_PER_MINUTE"] = "0"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.services.database import engine
+from app.services.user_context import store
+
+errores = []
+# Cargas de la foto y SELECT a recordatorios/salud (las respuestas de la API también leen)
+consultas = {"cargas": 0, "datos": 0}
+
+
+def esperar(condicion: bool, descripcion: str) -> None:
+    print(f"  {'ok   ' if condicion else 'FALLO'} {descripcion}")
+    if not condicion:
+        errores.append(descripcion)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _consulta(conn, cursor, statement, parameters, context, executemany):
+    texto = statement.lstrip().upper()
+    if texto.startswith("SELECT") and ("FROM REMINDERS" in texto or "FROM HEALTH_RECORDS" in texto):
+        consultas["datos"] += 1
+
+
+_load = store.load
+
+
+def _contar_carga(user_id):
+    consultas["cargas"] += 1
+    return _load(user_id)
+
+
+store.load = _contar_carga
+
+
+def contexto_enviado() -> str:
+    """El mensaje de sistema con los datos del usuario de la última llamada al LLM, o ""."""
+    mensajes = config.last_request.get("openai", {}).get("messages", [])
+    return next((m["content"] for m in mensajes if m["role"] == "system" and m["content"].startswith("Datos del usuario")), "")
+
+
+def preguntar(client: TestClient, headers: dict, mensaje: str) -> str:
+    config.last_request.pop("openai", None)
+    respuesta = client.post("/chat/", json={"message": mensaje}, headers=headers)
+    if respuesta.status_code != 200:
+        errores.append(f"{mensaje}: {respuesta.status_code}")
+    return contexto_enviado()
+
+
+def main() -> int:
+    manana = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"username": "rosa", "pin": "1234", "age": 80, "city": "Santiago"})
+        token = client.post("/auth/login", json={"username": "rosa", "pin": "1234"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/reminders/", json={"text": "Cita con el cardiólogo", "datetime": manana.isoformat()}, headers=headers)
+        client.post("/reminders/", json={"text": "Tomar la pastilla de la presión", "datetime": manana.replace(hour=8).isoformat(), "rrule": "FREQ=DAILY"}, headers=headers)
+        client.post("/health/", json={"parameter": "glucosa", "value": "180 mg/dL"}, headers=headers)
+        client.post("/health/", json={"parameter": "glucosa", "value": "110 mg/dL"}, headers=headers)
+        client.post("/health/", json={"parameter": "presion", "value": "130/85"}, headers=headers)
+
+        print("Inyección:")
+        contexto = preguntar(client, headers, "¿Qué tenía que hacer mañana?")
+        esperar("Cita con el cardiólogo" in contexto and "pastilla" in contexto and "glucosa" not in contexto, "recordatorios (y solo recordatorios) en una pregunta sobre la agenda")
+        contexto = preguntar(client, headers, "¿Cómo ha estado mi azúcar?")
+        esperar("110 mg/dL" in contexto and "180 mg/dL" not in contexto and "cardiólogo" not in contexto, "la última medición de cada parámetro en una pregunta de salud")
+        contexto = preguntar(client, headers, "Hola, cuéntame un chiste")
+        esperar(contexto == "", "nada en una charla")
+        print(f"  ejemplo:\n    " + preguntar(client, headers, "¿Qué tengo pendiente? ¿y cómo va mi presión?").replace("\n", "\n    "))
+
+        print("\nMantenimiento incremental:")
+        consultas["cargas"] = 0
+        nuevo = client.post("/reminders/", json={"text": "Llamar a Carmen", "datetime": manana.replace(hour=9).isoformat()}, headers=headers).json()
+        client.post("/health/", json={"parameter": "glucosa", "value": "95 mg/dL"}, headers=headers)
+        contexto = preguntar(client, headers, "¿Qué tengo que hacer mañana y cómo está mi glucosa?")
+        esperar("Llamar a Carmen" in contexto and "95 mg/dL" in contexto, "lo recién creado por la API aparece en el prompt")
+        esperar(consultas["cargas"] == 0, f"sin volver a cargar la foto ({consultas['cargas']} cargas)")
+        client.post("/chat/", json={"message": "Recuérdame regar las plantas mañana"}, headers=headers)
+        contexto = preguntar(client, headers, "¿Qué tenía que hacer mañana?")
+        esperar("regar las plantas" in contexto, "un recordatorio creado desde el chat (escritura diferida) también")
+        client.delete(f"/reminders/{nuevo['id']}", headers=headers)
+        contexto = preguntar(client, headers, "¿Qué tenía que hacer mañana?")
+        esperar("Llamar a Carmen" not in contexto, "borrar un recordatorio lo quita del prompt")
+
+        print(f"\nCoste ({TURNOS} preguntas sobre agenda y salud):")
+        store.clear()
+        consultas.update(cargas=0, datos=0)
+        tamanos = []
+        for i in range(TURNOS):
+            tamanos.append(len(preguntar(client, headers, f"¿Qué tengo que hacer mañana? ¿cómo va mi presión? ({i})")))
+        por_turno = consultas["datos"] / TURNOS
+        print(f"  consultas a recordatorios/salud por turno: {por_turno:.2f} (consultando en cada turno serían 2)")
+        print(f"  caracteres añadidos al prompt: {sum(tamanos) / len(tamanos):.0f} de media")
+        esperar(consultas["cargas"] == 1, f"solo la primera pregunta carga la foto ({consultas['cargas']} cargas)")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Servidor en memoria compatible con el protocolo de Redis (RESP2), para probar la caché
+compartida sin instalar Redis.
+
+Comandos: PING, AUTH, SELECT, GET, SET (con EX/PX/NX), DEL, INCR, EXISTS, TTL, DBSIZE,
+FLUSHALL y QUIT. Con --latency se añade un retardo fijo (ms) a cada comando.
+
+    python fake_redis.py --port 6390
+    CACHE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0 uvicorn app.main:app
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+
+
+class FakeRedis:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.data: dict[bytes, tuple[float | None, bytes]] = {}
+        self.commands = 0
+        self.server: asyncio.AbstractServer | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    # --- Datos ---
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: list[bytes]):
+        self.commands += 1
+        command = args[0].upper()
+        if command == b"PING":
+            return "PONG"
+        if command in (b"AUTH", b"SELECT", b"QUIT"):
+            return "OK"
+        if command == b"GET":
+            return self._get(args[1])
+        if command == b"SET":
+            key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+            expires_at = None
+            if b"EX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            self.data[key] = (expires_at, value)
+            return "OK"
+        if command == b"DEL":
+            return sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+        if command == b"EXISTS":
+            return sum(1 for key in args[1:] if self._get(key) is not None)
+        if command == b"INCR":
+            current = int(self._get(args[1]) or 0) + 1
+            expires_at = self.data.get(args[1], (None, b""))[0]
+            self.data[args[1]] = (expires_at, str(current).encode())
+            return current
+        if command == b"TTL":
+            if self._get(args[1]) is None:
+                return -2
+            expires_at = self.data[args[1]][0]
+            return -1 if expires_at is None else int(expires_at - time.monotonic())
+        if command == b"DBSIZE":
+            return len(self.data)
+        if command == b"FLUSHALL":
+            self.data.clear()
+            return "OK"
+        return Exception(f"ERR unknown command '{command.decode()}'")
+
+    # --- Protocolo ---
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    args = line.split()  # comandos en línea (redis-cli, telnet)
+                else:
+                    args = []
+                    for _ in range(int(line[1:-2])):
+                        length = int((await reader.readline())[1:-2])
+                        args.append((await reader.readexactly(length + 2))[:-2])
+                if not args:
+                    continue
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(self._encode(self.execute(args)))
+                await writer.drain()
+                if args[0].upper() == b"QUIT":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # cliente desconectado o servidor detenido
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, host, port)
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # stop()
+
+    def stop(self) -> None:
+        """Cierra el servidor (simula una caída de Redis). Se puede llamar desde otro hilo."""
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+
+def run_in_background(host: str = "127.0.0.1", port: int = 6390, latency_ms: float = 0.0) -> FakeRedis:
+    """Arranca el servidor en un hilo y espera a que acepte conexiones."""
+    fake = FakeRedis(latency_ms)
+    threading.Thread(target=lambda: asyncio.run(fake.serve(host, port)), daemon=True).start()
+    while fake.server is None or not fake.server.is_serving():
+        time.sleep(0.01)
+    return fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency", type=float, default=0.0, help="Retardo por comando en ms")
+    args = parser.parse_args()
+    print(f"Redis simulado en redis://{args.host}:{args.port}/0")
+    asyncio.run(FakeRedis(args.latency).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""
+Servidores simulados de OpenAI, Duckling, WeatherAPI, GNews y Twilio para trabajar sin red.
+
+Todos los proveedores se sirven desde una sola app en el mismo puerto, cada uno bajo su prefijo:
+    /openai/v1/chat/completions
+    /duckling/parse
+    /weatherapi/v1/current.json
+    /gnews/api/v4/search
+    /twilio/2010-04-01/Accounts/{sid}/Messages.json
+
+Cada proveedor admite una distribución de latencia, una tasa de errores y respuestas fijas:
+    python fake_services.py --port 9000 \\
+        --latency openai=lognormal:400:0.5 --latency duckling=uniform:5:20 \\
+        --error-rate weatherapi=0.1 --payloads mis_respuestas.json
+
+Distribuciones de latencia (en ms): none, fixed:MS, uniform:MIN:MAX, normal:MEDIA:DESVIACION,
+lognormal:MEDIANA:SIGMA.
+
+Con --print-env se muestran las variables de entorno para que el backend use los simulados.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+PROVIDERS = ("openai", "duckling", "weatherapi", "gnews", "twilio")
+
+
+class LatencyDistribution:
+    """Genera latencias simuladas (en segundos) a partir de una especificación de texto."""
+
+    def __init__(self, spec: str = "none"):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("none", "fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Distribución de latencia desconocida: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            ms = random.gauss(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            # mediana en ms y sigma del logaritmo
+            ms = random.lognormvariate(math.log(self.params[0]), self.params[1])
+        else:
+            ms = 0.0
+        return max(ms, 0.0) / 1000
+
+
+class FakeConfig:
+    """Latencia, tasa de errores y respuestas fijas de cada proveedor simulado."""
+
+    def __init__(self):
+        self.latency = {p: LatencyDistribution() for p in PROVIDERS}
+        self.error_rate = {p: 0.0 for p in PROVIDERS}
+        self.payloads: dict[str, object] = {}
+        self.calls = {p: 0 for p in PROVIDERS}
+        self.errors = {p: 0 for p in PROVIDERS}
+        # Llamadas que el backend cortó (cancelación por plazo) antes de recibir la respuesta
+        self.disconnects = {p: 0 for p in PROVIDERS}
+        # Último cuerpo recibido por proveedor (para inspeccionar el prompt en los benchmarks)
+        self.last_request: dict[str, object] = {}
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def _clasificar(mensaje: str) -> dict:
+    """Clasificación simple por palabras clave para que el LLM simulado devuelva intenciones variadas."""
+    texto = _normalizar(mensaje)
+    if any(p in texto for p in ("ayuda", "me cai", "ambulancia", "emergencia", "me siento muy mal")):
+        return {"intencion": "EMERGENCIA", "emocion": "Urgencia", "respuesta": "Tranquilo, estoy aquí. ¿Quieres que avise a alguien?"}
+    if any(p in texto for p in ("recuerdame", "recordar", "recordatorio", "tengo que", "cita")):
+        return {"intencion": "RECORDATORIO", "emocion": "Neutra", "respuesta": "Perfecto, guardaré ese recordatorio."}
+    if any(p in texto for p in ("presion", "azucar", "me duele", "glucosa", "pulso")):
+        return {"intencion": "SALUD", "emocion": "Preocupacion", "respuesta": "Gracias por contarme, lo registraré."}
+    if any(p in texto for p in ("clima", "tiempo", "noticia", "que es", "cual es")):
+        return {"intencion": "INFORMACION", "emocion": "Neutra", "respuesta": "Aquí tienes la información que pediste."}
+    return {"intencion": "CONVERSACION_GENERAL", "emocion": "Positiva", "respuesta": "¡Qué gusto conversar contigo! ¿En qué te ayudo?"}
+
+
+def create_app(config: FakeConfig | None = None) -> FastAPI:
+    config = config or FakeConfig()
+    app = FastAPI(title="Servicios simulados")
+    app.state.config = config
+
+    async def simular(provider: str):
+        """Aplica la latencia configurada y decide si la llamada debe fallar."""
+        config.calls[provider] += 1
+        await asyncio.sleep(config.latency[provider].sample())
+        if random.random() < config.error_rate[provider]:
+            config.errors[provider] += 1
+            return JSONResponse(status_code=503, content={"error": f"{provider} simulado no disponible"})
+        return None
+
+    @app.get("/stats")
+    def stats():
+        return {
+            "calls": config.calls,
+            "errors": config.errors,
+            "disconnects": config.disconnects,
+            "latency": {p: d.spec for p, d in config.latency.items()},
+            "error_rate": config.error_rate,
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        if (error := await simular("openai")) is not None:
+            return error
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            # El backend canceló la llamada por plazo mientras se simulaba la latencia
+            config.disconnects["openai"] += 1
+            return JSONResponse(status_code=499, content={"error": "cliente desconectado"})
+        config.last_request["openai"] = body
+        mensajes = body.get("messages", [])
+        ultimo_usuario = next((m["content"] for m in reversed(mensajes) if m.get("role") == "user"), "")
+        contenido = config.payloads.get("openai") or _clasificar(ultimo_usuario)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in mensajes) // 4
+        respuesta = json.dumps(contenido, ensure_ascii=False)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": respuesta},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(respuesta) // 4,
+                "total_tokens": prompt_tokens + len(respuesta) // 4,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+
+    @app.post("/duckling/parse")
+    async def duckling_parse(request: Request):
+        if (error := await simular("duckling")) is not None:
+            return error
+        if "duckling" in config.payloads:
+            return config.payloads["duckling"]
+        form = await request.form()
+        texto = str(form.get("text", ""))
+        normalizado = _normalizar(texto)
+        if not any(p in normalizado for p in ("manana", "hoy", "a las", "lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo", "todos los dias")):
+            return []
+        fecha = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+        valor = fecha.strftime("%Y-%m-%dT%H:%M:%S.000-04:00")
+        return [{
+            "body": texto,
+            "start": 0,
+            "end": len(texto),
+            "dim": "time",
+            "latent": False,
+            "value": {
+                "value": valor,
+                "grain": "hour",
+                "type": "value",
+                "values": [{"value": valor, "grain": "hour", "type": "value"}],
+            },
+        }]
+
+    @app.get("/weatherapi/v1/current.json")
+    async def weather_current(q: str = "Chile", lang: str = "es", key: str = ""):
+        if (error := await simular("weatherapi")) is not None:
+            return error
+        if "weatherapi" in config.payloads:
+            return config.payloads["weatherapi"]
+        return {
+            "location": {"name": q.title(), "country": "Chile"},
+            "current": {
+                "temp_c": 18.0,
+                "condition": {"text": "Soleado", "icon": "//cdn.weatherapi.com/weather/64x64/day/113.png"},
+            },
+        }
+
+    @app.get("/gnews/api/v4/search")
+    async def gnews_search(q: str = "", lang: str = "es", max: int = 5, token: str = ""):
+        if (error := await simular("gnews")) is not None:
+            return error
+        if "gnews" in config.payloads:
+            return config.payloads["gnews"]
+        return {
+            "totalArticles": max,
+            "articles": [
+                {"title": f"Noticia simulada {i + 1} sobre {q}", "url": f"https://example.com/{q}/{i + 1}"}
+                for i in range(max)
+            ],
+        }
+
+    @app.post("/twilio/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def twilio_messages(account_sid: str, request: Request):
+        if (error := await simular("twilio")) is not None:
+            return error
+        form = await request.form()
+        ahora = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S +0000")
+        return JSONResponse(status_code=201, content={
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": account_sid,
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "body": form.get("Body"),
+            "status": "queued",
+            "num_segments": "1",
+            "direction": "outbound-api",
+            "date_created": ahora,
+            "date_updated": ahora,
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages.json",
+        })
+
+    return app
+
+
+def env_for(base_url: str) -> dict:
+    """Variables de entorno para que el backend use los servicios simulados."""
+    return {
+        "OPENAI_BASE_URL": f"{base_url}/openai/v1",
+        "OPENAI_API_KEY": "fake-openai-key",
+        "DUCKLING_BASE_URL": f"{base_url}/duckling",
+        "WEATHER_API_URL": f"{base_url}/weatherapi/v1",
+        "GNEWS_API_URL": f"{base_url}/gnews/api/v4",
+        "TWILIO_API_URL": f"{base_url}/twilio",
+        "TWILIO_ACCOUNT_SID": "ACfake",
+        "TWILIO_AUTH_TOKEN": "fake-token",
+        "TWILIO_PHONE_NUMBER": "+15005550006",
+    }
+
+
+def run_in_background(config: FakeConfig | None = None, host: str = "127.0.0.1", port: int = 9000) -> uvicorn.Server:
+    """Arranca los servicios simulados en un hilo (útil desde otros scripts) y espera a que estén listos."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _parse_pairs(values: list[str]) -> dict[str, str]:
+    pairs = {}
+    for value in values:
+        provider, _, spec = value.partition("=")
+        if provider not in PROVIDERS:
+            raise SystemExit(f"Proveedor desconocido: {provider}. Opciones: {', '.join(PROVIDERS)}")
+        pairs[provider] = spec
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", action="append", default=[], help="proveedor=distribución, p. ej. openai=lognormal:400:0.5")
+    parser.add_argument("--error-rate", action="append", default=[], help="proveedor=tasa, p. ej. gnews=0.1")
+    parser.add_argument("--payloads", help="JSON con respuestas fijas por proveedor")
+    parser.add_argument("--seed", type=int, help="Semilla para resultados reproducibles")
+    parser.add_argument("--print-env", action="store_true", help="Muestra las variables de entorno para el backend y sale")
+    args = parser.parse_args()
+
+    base_url = f"http://{args.host}:{args.port}"
+    if args.print_env:
+        for key, value in env_for(base_url).items():
+            print(f"{key}={value}")
+        return
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = FakeConfig()
+    for provider, spec in _parse_pairs(args.latency).items():
+        config.latency[provider] = LatencyDistribution(spec)
+    for provider, rate in _parse_pairs(args.error_rate).items():
+        config.error_rate[provider] = float(rate)
+    if args.payloads:
+        with open(args.payloads, encoding="utf-8") as f:
+            config.payloads = json.load(f)
+
+    print(f"Servicios simulados en {base_url}. Variables para el backend:")
+    for key, value in env_for(base_url).items():
+        print(f"  {key}={value}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
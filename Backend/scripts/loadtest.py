@@ -0,0 +1,318 @@
+"""
+Suite de carga reproducible del backend con percentiles por endpoint y control de regresiones.
+
+La app se ejecuta en el mismo proceso (httpx + ASGITransport, sin servidor ni red) y los
+proveedores externos (OpenAI, Duckling, WeatherAPI, GNews, Twilio) se sustituyen por
+scripts/fake_services.py con la latencia que se indique. Cada escenario se lanza con
+`--concurrency` clientes a la vez y se mide su rendimiento (peticiones/s) y p50/p95/p99.
+
+Escenarios: registro y login, un turno de chat por intención, CRUD de recordatorios y de
+salud, y el resumen externo.
+
+    python loadtest.py --save-baseline                # guarda la línea base
+    python loadtest.py                                # compara con la línea base (sale con 1 si empeora)
+    python loadtest.py --requests 400 --concurrency 20 --threshold 0.3 --latency openai=fixed:50
+
+Una regresión es un p95 más alto que `línea base * (1 + threshold)` o un rendimiento más
+bajo que `línea base * (1 - threshold)`. Las líneas base dependen de la máquina: guárdalas y
+compáralas siempre en el mismo entorno.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPTS_DIR, '..')))
+sys.path.append(SCRIPTS_DIR)
+
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, "baselines", "loadtest.json")
+FAKE_PORT = 9038
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Clientes simultáneos por escenario")
+    parser.add_argument("--users", type=int, default=10, help="Usuarios registrados para los escenarios autenticados")
+    parser.add_argument("--scenario", action="append", default=[], help="Ejecutar solo estos escenarios (se puede repetir)")
+    parser.add_argument("--latency", action="append", default=[], help="Latencia de un proveedor simulado: openai=fixed:50")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichero JSON de la línea base")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Empeoramiento tolerado (0.25 = 25 %%)")
+    parser.add_argument("--output", help="Guardar también los resultados de esta ejecución en un JSON")
+    parser.add_argument("--seed", type=int, default=1234)
+    return parser.parse_args()
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Percentil por rango más cercano."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, app, args):
+        import httpx
+
+        self.args = args
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+        self.tokens: list[str] = []
+        self.reminder_ids: dict[str, list[int]] = {}
+        self.health_ids: dict[str, list[int]] = {}
+        self.counter = 0
+
+    # --- Utilidades ---
+
+    def _user(self, i: int) -> tuple[str, dict]:
+        token = self.tokens[i % len(self.tokens)]
+        return token, {"Authorization": f"Bearer {token}"}
+
+    def _unique(self) -> int:
+        # Mensajes distintos en cada petición: la caché del LLM no debe falsear el chat
+        self.counter += 1
+        return self.counter
+
+    async def run(self, name: str, request_fn, n: int | None = None) -> dict:
+        """Ejecuta `request_fn(i)` n veces con la concurrencia configurada."""
+        n = n or self.args.requests
+        latencies, errors = [], 0
+        queue = iter(range(n))
+
+        async def worker():
+            nonlocal errors
+            for i in queue:
+                started = time.perf_counter()
+                try:
+                    response = await request_fn(i)
+                    ok = response.status_code < 400
+                except Exception:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(self.args.concurrency, n))))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            "requests": n,
+            "errors": errors,
+            "throughput_rps": round(n / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+    # --- Escenarios ---
+
+    async def auth_register(self, i: int):
+        return await self.client.post("/auth/register", json={"username": f"carga{i}_{self._unique()}", "pin": "1234", "age": 75, "city": "Santiago"})
+
+    async def auth_login(self, i: int):
+        return await self.client.post("/auth/login", json={"username": f"usuario{i % self.args.users}", "pin": "1234"})
+
+    def chat(self, message: str):
+        async def turn(i: int):
+            _, headers = self._user(i)
+            return await self.client.post("/chat/", json={"message": f"{message} ({self._unique()})"}, headers=headers)
+        return turn
+
+    async def reminders_create(self, i: int):
+        token, headers = self._user(i)
+        fecha = (datetime(2031, 1, 1) + timedelta(hours=i)).isoformat()
+        response = await self.client.post("/reminders/", json={"text": f"Pastilla {i}", "datetime": fecha}, headers=headers)
+        if response.status_code < 400:
+            self.reminder_ids.setdefault(token, []).append(response.json()["id"])
+        return response
+
+    async def reminders_list(self, i: int):
+        _, headers = self._user(i)
+        return await self.client.get("/reminders/", headers=headers)
+
+    async def reminders_update(self, i: int):
+        token, headers = self._user(i)
+        reminder_id = random.choice(self.reminder_ids[token])
+        return await self.client.put(f"/reminders/{reminder_id}", json={"text": f"Editado {i}", "datetime": "2031-06-01T09:00:00"}, headers=headers)
+
+    async def reminders_delete(self, i: int):
+        token, headers = self._user(i)
+        return await self.client.delete(f"/reminders/{self.reminder_ids[token].pop()}", headers=headers)
+
+    async def health_create(self, i: int):
+        token, headers = self._user(i)
+        response = await self.client.post("/health/", json={"parameter": "presion", "value": f"{110 + i % 30}/80"}, headers=headers)
+        if response.status_code < 400:
+            self.health_ids.setdefault(token, []).append(response.json()["id"])
+        return response
+
+    async def health_list(self, i: int):
+        _, headers = self._user(i)
+        return await self.client.get("/health/", headers=headers)
+
+    async def health_update(self, i: int):
+        token, headers = self._user(i)
+        record_id = random.choice(self.health_ids[token])
+        return await self.client.put(f"/health/{record_id}", json={"parameter": "presion", "value": "120/80"}, headers=headers)
+
+    async def health_delete(self, i: int):
+        token, headers = self._user(i)
+        return await self.client.delete(f"/health/{self.health_ids[token].pop()}", headers=headers)
+
+    async def external_summary(self, i: int):
+        return await self.client.get("/external/summary", params={"city": random.choice(["Santiago", "Valparaíso", "Concepción"])})
+
+    def scenarios(self) -> list[tuple[str, object, int | None]]:
+        # El hash del PIN es caro a propósito: menos peticiones de registro y login
+        auth_n = max(self.args.concurrency, self.args.requests // 5)
+        # Cada CRUD borra a lo sumo lo que se creó
+        return [
+            ("auth.register", self.auth_register, auth_n),
+            ("auth.login", self.auth_login, auth_n),
+            ("chat.conversacion", self.chat("Hola, ¿cómo estás hoy?"), None),
+            ("chat.recordatorio", self.chat("Recuérdame tomar las pastillas mañana a las 8"), None),
+            ("chat.salud", self.chat("Mi presión hoy es 130/85"), None),
+            ("chat.informacion", self.chat("¿Qué clima hace hoy?"), None),
+            ("chat.emergencia", self.chat("¡Ayuda, me caí!"), max(self.args.concurrency, self.args.requests // 5)),
+            ("reminders.create", self.reminders_create, None),
+            ("reminders.list", self.reminders_list, None),
+            ("reminders.update", self.reminders_update, None),
+            ("reminders.delete", self.reminders_delete, self.args.requests // 2),
+            ("health.create", self.health_create, None),
+            ("health.list", self.health_list, None),
+            ("health.update", self.health_update, None),
+            ("health.delete", self.health_delete, self.args.requests // 2),
+            ("external.summary", self.external_summary, None),
+        ]
+
+    async def setup_users(self) -> None:
+        for i in range(self.args.users):
+            username = f"usuario{i}"
+            await self.client.post("/auth/register", json={"username": username, "pin": "1234", "age": 80, "city": "Santiago"})
+            response = await self.client.post("/auth/login", json={"username": username, "pin": "1234"})
+            self.tokens.append(response.json()["access_token"])
+            _, headers = self._user(i)
+            await self.client.post("/emergency/contacts/", json={"name": "Familiar", "phone_number": f"+5691234{i:04d}"}, headers=headers)
+        # Datos iniciales para que cada escenario se pueda ejecutar por separado (--scenario)
+        per_user = -(-self.args.requests // 2 // self.args.users)
+        for j in range(per_user * self.args.users):
+            await self.reminders_create(j)
+            await self.health_create(j)
+
+
+async def lifespan(app, phase: str, state: dict) -> None:
+    """Lanza los eventos de arranque/parada de la app ASGI (ASGITransport no lo hace)."""
+    if phase == "startup":
+        state["receive"], state["send"] = asyncio.Queue(), asyncio.Queue()
+        state["task"] = asyncio.create_task(
+            app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, state["receive"].get, state["send"].put)
+        )
+    await state["receive"].put({"type": f"lifespan.{phase}"})
+    message = await state["send"].get()
+    if message["type"] != f"lifespan.{phase}.complete":
+        raise RuntimeError(f"Fallo en lifespan.{phase}: {message}")
+    if phase == "shutdown":
+        await state["task"]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms > {base['p95_ms']} ms (+{threshold:.0%})")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: {current['throughput_rps']} req/s < {base['throughput_rps']} req/s (-{threshold:.0%})")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errores (línea base: {base['errors']})")
+    return regressions
+
+
+async def main() -> int:
+    args = parse_args()
+    random.seed(args.seed)
+
+    import fake_services
+
+    config = fake_services.FakeConfig()
+    for provider, spec in fake_services._parse_pairs(args.latency).items():
+        config.latency[provider] = fake_services.LatencyDistribution(spec)
+    fake_server = fake_services.run_in_background(config, port=FAKE_PORT)
+
+    # La configuración del backend se lee al importar: antes hay que preparar el entorno
+    os.environ.update(fake_services.env_for(f"http://127.0.0.1:{FAKE_PORT}"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/loadtest.db"
+    os.environ["REMINDER_SCHEDULER_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Se mide el rendimiento, no la admisión: sin límites de ritmo del chat
+    os.environ.setdefault("CHAT_USER_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("CHAT_GLOBAL_RATE_PER_SECOND", "0")
+    from app.main import app
+
+    state: dict = {}
+    await lifespan(app, "startup", state)
+    test = LoadTest(app, args)
+    results = {}
+    try:
+        await test.setup_users()
+        print(f"{args.requests} peticiones por escenario, concurrencia {args.concurrency}, {args.users} usuarios")
+        print(f"{'escenario':<20}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errores':>9}")
+        for name, request_fn, n in test.scenarios():
+            if args.scenario and name not in args.scenario:
+                continue
+            result = await test.run(name, request_fn, n)
+            results[name] = result
+            print(f"{name:<20}{result['throughput_rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}{result['errors']:>9}")
+    finally:
+        await test.client.aclose()
+        await lifespan(app, "shutdown", state)
+        fake_server.should_exit = True
+
+    report = {
+        "generated_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "parameters": {k: getattr(args, k) for k in ("requests", "concurrency", "users", "latency")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSin línea base en {args.baseline}: ejecuta con --save-baseline para crearla")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != report["parameters"]:
+        print(f"\nAviso: parámetros distintos de la línea base ({baseline.get('parameters')})")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print("\nREGRESIONES:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print(f"\nSin regresiones respecto a la línea base (umbral {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,6 +1,7 @@
+import os
 import requests
 
-url = "http://localhost:8001/parse"
+url = os.getenv("DUCKLING_BASE_URL", "http://localhost:8001").rstrip("/") + "/parse"
 text = "Tengo una cita el viernes a las 10"
 
 response = requests.post(
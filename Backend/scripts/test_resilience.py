@@ -0,0 +1,159 @@
+"""
+Prueba la capa de resiliencia contra un servidor local que inyecta fallos.
+
+El servidor imita a WeatherAPI y puede responder bien, lento (más que el timeout)
+o con error 500. Se comprueba que:
+- las llamadas lentas se cortan en el plazo configurado,
+- el circuito se abre tras varios fallos y responde al instante con el último clima bueno,
+- tras el tiempo de espera pasa a half-open y se cierra con una llamada exitosa,
+- una llamada de prueba cancelada (plazo de quien llama) libera su hueco y no deja el
+  circuito semiabierto para siempre.
+
+Uso: python test_resilience.py
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.weather_service import WeatherAPIService
+from app.services.resilience import CircuitBreaker, Provider
+
+# Modo actual del servidor: "ok", "slow" o "error"
+modo = {"valor": "ok"}
+peticiones = {"total": 0}
+
+
+class FaultyWeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            self._responder()
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente ya cortó por timeout
+            pass
+
+    def _responder(self):
+        peticiones["total"] += 1
+        if modo["valor"] == "slow":
+            time.sleep(1.0)
+        if modo["valor"] == "error":
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"boom")
+            return
+        body = json.dumps({
+            "location": {"name": "Santiago", "country": "Chile"},
+            "current": {"temp_c": 18.0, "condition": {"text": "Soleado", "icon": ""}},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultyWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def probar_cancelacion():
+    proveedor = Provider("prueba_cancelacion", timeout=5, failure_threshold=1, reset_timeout=0.2)
+
+    async def falla():
+        raise RuntimeError("boom")
+
+    async def lenta():
+        await asyncio.sleep(5)
+        return "ok"
+
+    async def rapida():
+        return "ok"
+
+    await proveedor.acall(falla)
+    assert proveedor.breaker.state == CircuitBreaker.OPEN
+    await asyncio.sleep(0.25)
+    assert proveedor.breaker.state == CircuitBreaker.HALF_OPEN
+    # El plazo de quien llama cancela la llamada de prueba a mitad
+    try:
+        await asyncio.wait_for(proveedor.acall(lenta), 0.05)
+    except asyncio.TimeoutError:
+        pass
+    assert proveedor.breaker.state == CircuitBreaker.HALF_OPEN
+    assert await proveedor.acall(rapida) == "ok", "El hueco de prueba debe quedar libre"
+    assert proveedor.breaker.state == CircuitBreaker.CLOSED
+
+    # Lo mismo para quien llama por su cuenta con allow() (llm_service)
+    await proveedor.acall(falla)
+    await asyncio.sleep(0.25)
+    assert proveedor.allow()
+    proveedor.release()
+    assert proveedor.allow(), "release() debe devolver el hueco de prueba"
+
+
+def main():
+    server = iniciar_servidor()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/current.json"
+    servicio = WeatherAPIService("fake-key", base_url=url)
+    servicio.provider.timeout = 0.3
+    servicio.provider.breaker.failure_threshold = 3
+    servicio.provider.breaker.reset_timeout = 1.0
+
+    print("\n--- Proveedor sano ---")
+    clima = servicio.get_weather("Santiago")
+    print(clima)
+    assert clima and clima["city"] == "Santiago"
+    assert servicio.provider.breaker.state == CircuitBreaker.CLOSED
+
+    print("\n--- Proveedor lento: las llamadas se cortan en el plazo ---")
+    modo["valor"] = "slow"
+    for _ in range(3):
+        inicio = time.perf_counter()
+        clima = servicio.get_weather("Santiago")
+        transcurrido = time.perf_counter() - inicio
+        print(f"{transcurrido * 1000:.0f} ms -> {clima}")
+        assert transcurrido < 0.9, "La llamada no respetó el timeout"
+        assert clima and clima["city"] == "Santiago", "Debe servirse el último clima bueno"
+    assert servicio.provider.breaker.state == CircuitBreaker.OPEN
+
+    print("\n--- Circuito abierto: respuesta inmediata sin tocar la red ---")
+    antes = peticiones["total"]
+    inicio = time.perf_counter()
+    clima = servicio.get_weather("Santiago")
+    print(f"{(time.perf_counter() - inicio) * 1000:.2f} ms -> {clima}")
+    assert peticiones["total"] == antes
+    assert servicio.get_weather("Ciudad sin caché") is None
+
+    print("\n--- Half-open con error: el circuito vuelve a abrirse ---")
+    modo["valor"] = "error"
+    time.sleep(1.1)
+    assert servicio.provider.breaker.state == CircuitBreaker.HALF_OPEN
+    servicio.get_weather("Santiago")
+    assert servicio.provider.breaker.state == CircuitBreaker.OPEN
+
+    print("\n--- Half-open con éxito: el circuito se cierra ---")
+    modo["valor"] = "ok"
+    time.sleep(1.1)
+    clima = servicio.get_weather("Santiago")
+    assert clima and clima["city"] == "Santiago"
+    assert servicio.provider.breaker.state == CircuitBreaker.CLOSED
+
+    print("\n--- Half-open con la llamada de prueba cancelada: se puede volver a probar ---")
+    asyncio.run(probar_cancelacion())
+
+    print("\n--- Estado del proveedor ---")
+    print(json.dumps(servicio.provider.snapshot(), indent=2))
+    server.shutdown()
+    print("\n✅ Capa de resiliencia verificada")
+
+
+if __name__ == "__main__":
+    main()
@@ -41,54 +41,24 @@ export function useExternalSummaries(city: string | null) {
       //   setLoading(false);
       //   return;
       // }
-      let weatherData = null;
-      let newsData: NewsSummary[] = [];
       try {
+        // Un solo viaje de ida y vuelta: el backend obtiene clima y noticias en paralelo
+        // y aplica los respaldos (ciudad por defecto, noticias generales).
         const location = city || 'Chile';
-        const weatherRes = await fetch(`${API_BASE}/external/weather?location=${encodeURIComponent(location)}`);
-        weatherData = await weatherRes.json();
-        if (!weatherData || !weatherData.city) {
-          const fallbackRes = await fetch(`${API_BASE}/external/weather?location=Chile`);
-          weatherData = await fallbackRes.json();
-        }
+        const summaryRes = await fetch(`${API_BASE}/external/summary?city=${encodeURIComponent(location)}`);
+        const summary = await summaryRes.json();
+        const weatherData: WeatherSummary | null = summary?.weather ?? null;
+        const newsData: NewsSummary[] = Array.isArray(summary?.news) ? summary.news.slice(0, 5) : [];
         if (weatherData && weatherData.city) {
           setWeather(weatherData);
           await AsyncStorage.setItem('weather', JSON.stringify(weatherData));
         }
-      } catch (e) {
-        console.error("Error fetching weather data:", e);
-      }
-      try {
-        const newsRes = await fetch(`${API_BASE}/external/gnews?query=salud`);
-        const rawNews = await newsRes.json();
-        console.log('Raw News API Response:', rawNews); // Log raw response
-        if (Array.isArray(rawNews) && rawNews.length > 0 && rawNews[0].title === "Sin noticias disponibles") {
-          newsData = []; // It's the placeholder, so treat as empty
-        } else if (Array.isArray(rawNews)) {
-          newsData = rawNews.slice(0, 5);
-        } else {
-          newsData = [];
-        }
-        console.log('Processed News Data (before setNews):', newsData); // Log processed data
-        if (!newsData.length) {
-          const fallbackNewsRes = await fetch(`${API_BASE}/external/gnews?query=noticias`);
-          const fallbackNews = await fallbackNewsRes.json();
-          console.log('Raw Fallback News API Response:', fallbackNews); // Log raw fallback response
-          if (Array.isArray(fallbackNews) && fallbackNews.length > 0 && fallbackNews[0].title === "Sin noticias disponibles") {
-            newsData = []; // It's the placeholder, so treat as empty
-          } else if (Array.isArray(fallbackNews)) {
-            newsData = fallbackNews.slice(0, 5);
-          } else {
-            newsData = [];
-          }
-          console.log('Processed Fallback News Data (before setNews):', newsData); // Log processed fallback data
-        }
         if (newsData.length) {
           setNews(newsData);
           await AsyncStorage.setItem('news', JSON.stringify(newsData));
         }
       } catch (e) {
-        console.error("Error fetching news data:", e);
+        console.error("Error fetching external summary:", e);
       }
       await AsyncStorage.setItem('external_cache_timestamp', Date.now().toString());
       setLoading(false);